@@ -1,20 +1,366 @@
+from __future__ import annotations
+
+import asyncio
+import collections
+import configparser
+import fnmatch
+import functools
+import hashlib
 import json
 import logging
+import lzma
 import os
 import platform
+import queue
+import random
+import shutil
+import sqlite3
+import struct
+import sys
+import tempfile
+import threading
 import time
+import urllib.request
+import weakref
+import zlib
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from enum import Enum
-from typing import Union, NoReturn, Optional
+from collections.abc import Iterable, Mapping, Sequence
+from typing import TYPE_CHECKING, Callable, Union, NoReturn, Optional
+
+if TYPE_CHECKING:
+    import selenium.webdriver.chrome.options as c_op
+    import selenium.webdriver.chrome.webdriver as c_wd
+    import selenium.webdriver.firefox.options as f_op
+    import selenium.webdriver.firefox.webdriver as f_wd
+
+try:
+    import fcntl
+except ImportError:
+    # NOTE: Not available on Windows, files are copied instead of reflinked there.
+    fcntl = None
+
+
+# Selenium takes a while to import, so it's only imported once a browser is actually needed.
+def _webdriver():
+    import selenium.webdriver
+    return selenium.webdriver
+
+
+def _selenium_exceptions():
+    import selenium.common.exceptions
+    return selenium.common.exceptions
+
+
+# Shared prelude for all IDB scripts executed with execute_async_script.
+# It resolves the WebDriver callback exactly once, either with {result: ...} or {error: ...}.
+_JS_IDB_HELPERS = '''
+var done = arguments[arguments.length - 1];
+var finished = false;
+function finish(result) {
+    if (!finished) {
+        finished = true;
+        done(result);
+    }
+}
+function openUserStore(mode, callback) {
+    var request;
+    try {
+        request = indexedDB.open("wawc");
+    } catch (e) {
+        finish({error: "Could not open the IDB wawc: " + e});
+        return;
+    }
+    request.onupgradeneeded = function (event) {
+        // the database did not exist before, so don't let this call create it
+        event.target.transaction.abort();
+        finish({error: "The IDB wawc does not exist."});
+    };
+    request.onerror = function () {
+        finish({error: "Could not open the IDB wawc: " + request.error});
+    };
+    request.onsuccess = function (event) {
+        var db = event.target.result;
+        if (!db.objectStoreNames.contains("user")) {
+            db.close();
+            finish({error: "The object store user does not exist in the IDB wawc."});
+            return;
+        }
+        var transaction = db.transaction("user", mode);
+        transaction.onabort = function () {
+            db.close();
+            finish({error: "The IDB transaction was aborted: " + transaction.error});
+        };
+        try {
+            callback(transaction, transaction.objectStore("user"), db);
+        } catch (e) {
+            finish({error: "The IDB operation failed: " + e});
+            // without the abort the transaction would commit whatever was done before the error
+            try {
+                transaction.abort();
+            } catch (ignored) {
+                // the transaction already finished
+            }
+            db.close();
+        }
+    };
+}
+'''
+
+_JS_IDB_GET_USER = _JS_IDB_HELPERS + '''
+openUserStore("readonly", function (transaction, objectStore, db) {
+    var getAllRequest = objectStore.getAll();
+    transaction.oncomplete = function () {
+        db.close();
+        finish({result: getAllRequest.result});
+    };
+});
+'''
+
+# Records are staged in the page in chunks first, so no single WebDriver call has to carry the whole session.
+_JS_IDB_STAGE_RECORDS = '''
+if (arguments[1] || document.waRestore === undefined) {
+    document.waRestore = [];
+}
+var records = arguments[0];
+for (var i = 0; i < records.length; i++) {
+    document.waRestore.push(records[i]);
+}
+return document.waRestore.length;
+'''
+
+# Replaces the user store with the staged records in one transaction, so it's either fully written or not at all.
+_JS_IDB_RESTORE_USER = _JS_IDB_HELPERS + '''
+var expectedCount = arguments[0];
+var records = document.waRestore || [];
+document.waRestore = undefined;
+if (records.length !== expectedCount) {
+    finish({error: "Only " + records.length + " of " + expectedCount + " records were staged."});
+    return;
+}
+openUserStore("readwrite", function (transaction, objectStore, db) {
+    objectStore.clear();
+    for (var i = 0; i < records.length; i++) {
+        objectStore.put(records[i]);
+    }
+    transaction.oncomplete = function () {
+        db.close();
+        finish({result: records.length});
+    };
+});
+'''
+
+_JS_IDB_HAS_LOGIN = _JS_IDB_HELPERS + '''
+openUserStore("readonly", function (transaction, objectStore, db) {
+    // only the keys are needed to detect the login, the values stay in the page
+    var keysRequest = objectStore.getAllKeys();
+    transaction.oncomplete = function () {
+        db.close();
+        var loggedIn = false;
+        for (var i = 0; i < keysRequest.result.length; i++) {
+            if (String(keysRequest.result[i]).indexOf("WASecretBundle") !== -1) {
+                loggedIn = true;
+                break;
+            }
+        }
+        finish({result: loggedIn});
+    };
+});
+'''
+
+_JS_GET_LOCAL_STORAGE = '''
+var waSession = {};
+var waLs = window.localStorage;
+var keys = arguments[0];
+if (keys === null) {
+    for (var i = 0; i < waLs.length; i++) {
+        waSession[waLs.key(i)] = waLs.getItem(waLs.key(i));
+    }
+} else {
+    for (var j = 0; j < keys.length; j++) {
+        var value = waLs.getItem(keys[j]);
+        if (value !== null) {
+            waSession[keys[j]] = value;
+        }
+    }
+}
+return waSession;
+'''
+
+_JS_SET_LOCAL_STORAGE = '''
+var waSession = arguments[0];
+var written = 0;
+for (var key in waSession) {
+    if (Object.prototype.hasOwnProperty.call(waSession, key)) {
+        window.localStorage.setItem(key, waSession[key]);
+        written++;
+    }
+}
+return written;
+'''
+
+_JS_RESET_WA_STORAGE = '''
+var done = arguments[arguments.length - 1];
+try {
+    window.localStorage.clear();
+} catch (e) {
+    // pages without an origin (like about:blank) have no localStorage
+}
+if (!window.indexedDB) {
+    done(true);
+    return;
+}
+var request;
+try {
+    request = indexedDB.open("wawc");
+} catch (e) {
+    done(true);
+    return;
+}
+request.onupgradeneeded = function (event) {
+    event.target.transaction.abort();
+    done(true);
+};
+request.onerror = function () {
+    done(true);
+};
+request.onsuccess = function (event) {
+    var db = event.target.result;
+    var storeNames = Array.prototype.slice.call(db.objectStoreNames);
+    if (storeNames.length === 0) {
+        db.close();
+        done(true);
+        return;
+    }
+    var transaction = db.transaction(storeNames, "readwrite");
+    for (var i = 0; i < storeNames.length; i++) {
+        transaction.objectStore(storeNames[i]).clear();
+    }
+    transaction.oncomplete = function () {
+        db.close();
+        done(true);
+    };
+    transaction.onabort = function () {
+        db.close();
+        done(false);
+    };
+};
+'''
 
-import selenium.webdriver.chrome.options as c_op
-import selenium.webdriver.chrome.webdriver as c_wd
-import selenium.webdriver.firefox.options as f_op
-import selenium.webdriver.firefox.webdriver as f_wd
-from selenium import webdriver
-from selenium.common.exceptions import WebDriverException
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.support.ui import WebDriverWait
+# Resolves as soon as WhatsApp Web is usable, or is clearly not going to be (QR code shown, session removed).
+# The checks run once right away, after every DOM change reported by a MutationObserver and on a fallback interval,
+# the result names the strategy that fired.
+_JS_WAIT_FOR_READY = '''
+var done = arguments[arguments.length - 1];
+var config = arguments[0];
+var started = Date.now();
+var finished = false;
+var observer = null;
+var checkPending = false;
+var timers = [];
+function finish(ready, strategy, detail) {
+    if (finished) {
+        return;
+    }
+    finished = true;
+    if (observer !== null) {
+        observer.disconnect();
+    }
+    for (var i = 0; i < timers.length; i++) {
+        clearTimeout(timers[i]);
+        clearInterval(timers[i]);
+    }
+    done({result: {ready: ready, strategy: strategy, detail: detail, elapsed: (Date.now() - started) / 1000}});
+}
+function isVisible(element) {
+    return !!(element.offsetWidth || element.offsetHeight || element.getClientRects().length);
+}
+function findVisible(selectors) {
+    for (var i = 0; i < selectors.length; i++) {
+        var element = null;
+        try {
+            element = document.querySelector(selectors[i]);
+        } catch (e) {
+            // an invalid selector must not stop the other strategies
+        }
+        if (element !== null && isVisible(element)) {
+            return selectors[i];
+        }
+    }
+    return null;
+}
+function readStorage(keys) {
+    var values = {};
+    for (var i = 0; i < keys.length; i++) {
+        try {
+            values[keys[i]] = window.localStorage.getItem(keys[i]);
+        } catch (e) {
+            values[keys[i]] = null;
+        }
+    }
+    return values;
+}
+var initialValues = readStorage(config.readyStorageKeys);
+var initialLogin = readStorage(config.loggedOutStorageKeys);
+var loginKeys = config.loggedOutStorageKeys.filter(function (key) {
+    return initialLogin[key] !== null;
+});
+function check(strategy) {
+    if (finished) {
+        return;
+    }
+    var selector = findVisible(config.loggedOutSelectors);
+    if (selector !== null) {
+        finish(false, "qr_code", selector);
+        return;
+    }
+    selector = findVisible(config.readySelectors);
+    if (selector !== null) {
+        finish(true, strategy, selector);
+        return;
+    }
+    var values = readStorage(config.readyStorageKeys);
+    for (var key in values) {
+        if (values[key] !== null && values[key] !== initialValues[key]) {
+            finish(true, "storage", key);
+            return;
+        }
+    }
+    if (loginKeys.length > 0) {
+        var login = readStorage(loginKeys);
+        var loggedOut = loginKeys.every(function (loginKey) {
+            return login[loginKey] === null;
+        });
+        if (loggedOut) {
+            finish(false, "logged_out", loginKeys.join(","));
+        }
+    }
+}
+check("selector");
+if (!finished && config.useMutationObserver && window.MutationObserver) {
+    observer = new MutationObserver(function () {
+        // WhatsApp Web changes the DOM a lot while starting, so the checks run at most once per task
+        if (!checkPending) {
+            checkPending = true;
+            timers.push(setTimeout(function () {
+                checkPending = false;
+                check("mutation");
+            }, 0));
+        }
+    });
+    observer.observe(document.documentElement || document, {
+        childList: true, subtree: true, attributes: true, attributeFilter: ["class", "style", "hidden"]
+    });
+}
+if (!finished) {
+    timers.push(setInterval(function () {
+        check("selector");
+    }, config.pollInterval * 1000));
+    timers.push(setTimeout(function () {
+        finish(false, "timeout", null);
+    }, config.timeout * 1000));
+}
+'''
 
 
 class Browser(Enum):
@@ -22,19 +368,1586 @@ class Browser(Enum):
     FIREFOX = 2
 
 
+class LaunchProfile(Enum):
+    DEFAULT = 1
+    LEAN = 2
+
+
+# Launch settings of LaunchProfile.LEAN, everything WhatsApp Web needs (IDB, localStorage, service workers,
+# websockets) stays enabled.
+_LEAN_CHROME_ARGUMENTS = (
+    '--disable-gpu',
+    '--disable-extensions',
+    '--disable-background-networking',
+    '--disable-component-update',
+    '--disable-default-apps',
+    '--disable-sync',
+    '--disable-translate',
+    '--disable-features=MediaRouter,OptimizationHints,Translate,AutofillServerCommunication',
+    '--disable-dev-shm-usage',
+    '--no-first-run',
+    '--no-default-browser-check',
+    '--mute-audio',
+    '--blink-settings=imagesEnabled=false',
+    '--disk-cache-size=1048576',
+    '--media-cache-size=1048576',
+    '--renderer-process-limit=2',
+)
+_LEAN_CHROME_PREFS = {
+    'profile.managed_default_content_settings.images': 2,
+    'profile.default_content_setting_values.notifications': 2,
+    'profile.default_content_setting_values.media_stream': 2,
+    'profile.default_content_setting_values.geolocation': 2,
+}
+# profile pictures, media downloads and fonts, blocked with the DevTools protocol
+_LEAN_BLOCKED_URLS = [
+    '*://pps.whatsapp.net/*',
+    '*://mmg.whatsapp.net/*',
+    '*://media*.whatsapp.net/*',
+    '*.mp4', '*.webm', '*.ogg', '*.opus', '*.mp3',
+    '*.jpg', '*.jpeg', '*.png', '*.gif', '*.webp',
+    '*.woff', '*.woff2', '*.ttf',
+]
+_LEAN_FIREFOX_PREFS = {
+    'permissions.default.image': 2,
+    'media.autoplay.default': 5,
+    'media.hardware-video-decoding.enabled': False,
+    'layers.acceleration.disabled': True,
+    'gfx.canvas.accelerated': False,
+    'browser.cache.disk.enable': False,
+    'browser.cache.memory.capacity': 16384,
+    'browser.sessionhistory.max_entries': 2,
+    'browser.sessionhistory.max_total_viewers': 0,
+    'browser.sessionstore.resume_from_crash': False,
+    'browser.shell.checkDefaultBrowser': False,
+    'browser.safebrowsing.malware.enabled': False,
+    'browser.safebrowsing.phishing.enabled': False,
+    'browser.safebrowsing.downloads.enabled': False,
+    'dom.ipc.processCount': 1,
+    'dom.webnotifications.enabled': False,
+    'fission.autostart': False,
+    'extensions.update.enabled': False,
+    'app.update.enabled': False,
+    'app.normandy.enabled': False,
+    'datareporting.healthreport.uploadEnabled': False,
+    'datareporting.policy.dataSubmissionEnabled': False,
+    'toolkit.telemetry.enabled': False,
+    'network.prefetch-next': False,
+    'network.dns.disablePrefetch': True,
+    'network.http.speculative-parallel-limit': 0,
+}
+
+
+def _get_memory_dir() -> Optional[str]:
+    # tmpfs directory for throwaway browser profiles, None falls back to the default temp dir
+    if os.path.isdir('/dev/shm') and os.access('/dev/shm', os.W_OK):
+        return '/dev/shm'
+    return None
+
+
+def _get_process_tree_rss(pid: int) -> Optional[int]:
+    # Sums the resident memory of a process and all of its children using /proc (Linux only).
+    if not os.path.isdir('/proc/%s' % pid):
+        return None
+    children = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open('/proc/%s/stat' % entry, 'r') as stat_file:
+                # the process name can contain spaces, the fields after it are separated by spaces
+                parent_pid = int(stat_file.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(parent_pid, []).append(int(entry))
+
+    page_size = os.sysconf('SC_PAGE_SIZE')
+    rss_bytes = 0
+    pending = [pid]
+    while pending:
+        current_pid = pending.pop()
+        pending.extend(children.get(current_pid, []))
+        try:
+            with open('/proc/%s/statm' % current_pid, 'r') as statm_file:
+                rss_bytes += int(statm_file.read().split()[1]) * page_size
+        except (OSError, IndexError, ValueError):
+            continue
+    return rss_bytes
+
+
+def _read_varint(data: bytes, pos: int) -> tuple[int, int]:
+    result = 0
+    shift = 0
+    while True:
+        if pos >= len(data):
+            raise ValueError('Truncated varint.')
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7f) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+
+
+def _snappy_decompress(data: bytes) -> bytes:
+    length, pos = _read_varint(data, 0)
+    out = bytearray()
+    while pos < len(data):
+        tag = data[pos]
+        pos += 1
+        element_type = tag & 3
+        if element_type == 0:
+            literal_len = tag >> 2
+            if literal_len >= 60:
+                extra_bytes = literal_len - 59
+                literal_len = int.from_bytes(data[pos:pos + extra_bytes], 'little')
+                pos += extra_bytes
+            literal_len += 1
+            out += data[pos:pos + literal_len]
+            pos += literal_len
+            continue
+        if element_type == 1:
+            copy_len = ((tag >> 2) & 7) + 4
+            offset = ((tag >> 5) << 8) | data[pos]
+            pos += 1
+        elif element_type == 2:
+            copy_len = (tag >> 2) + 1
+            offset = int.from_bytes(data[pos:pos + 2], 'little')
+            pos += 2
+        else:
+            copy_len = (tag >> 2) + 1
+            offset = int.from_bytes(data[pos:pos + 4], 'little')
+            pos += 4
+        if offset == 0 or offset > len(out):
+            raise ValueError('Invalid snappy copy offset.')
+        start = len(out) - offset
+        if offset >= copy_len:
+            out += out[start:start + copy_len]
+        else:
+            for i in range(copy_len):
+                out.append(out[start + i])
+    if len(out) != length:
+        raise ValueError('Snappy data has an unexpected length.')
+    return bytes(out)
+
+
+class _LevelDbReader:
+    # Minimal read-only LevelDB parser, only used to read the IndexedDB of a browser profile from disk.
+    __LOG_BLOCK_SIZE = 32768
+    __TABLE_MAGIC = 0xdb4775248b80fb57
+
+    def __init__(self, db_dir: str):
+        self.__db_dir = db_dir
+
+    @staticmethod
+    def __read_block(table: bytes, offset: int, size: int) -> bytes:
+        block = table[offset:offset + size]
+        compression = table[offset + size]
+        if compression == 1:
+            return _snappy_decompress(block)
+        if compression != 0:
+            raise ValueError('Unsupported LevelDB block compression: %s' % compression)
+        return block
+
+    @staticmethod
+    def __iter_block(block: bytes):
+        restart_count = int.from_bytes(block[-4:], 'little')
+        end = len(block) - 4 - restart_count * 4
+        pos = 0
+        key = b''
+        while pos < end:
+            shared, pos = _read_varint(block, pos)
+            non_shared, pos = _read_varint(block, pos)
+            value_len, pos = _read_varint(block, pos)
+            key = key[:shared] + block[pos:pos + non_shared]
+            pos += non_shared
+            yield key, block[pos:pos + value_len]
+            pos += value_len
+
+    def __iter_table(self, table: bytes):
+        if len(table) < 48 or int.from_bytes(table[-8:], 'little') != self.__TABLE_MAGIC:
+            raise ValueError('Not a LevelDB table file.')
+        footer = table[-48:]
+        _, pos = _read_varint(footer, 0)
+        _, pos = _read_varint(footer, pos)
+        index_offset, pos = _read_varint(footer, pos)
+        index_size, pos = _read_varint(footer, pos)
+        for _, handle in self.__iter_block(self.__read_block(table, index_offset, index_size)):
+            block_offset, pos = _read_varint(handle, 0)
+            block_size, pos = _read_varint(handle, pos)
+            for internal_key, value in self.__iter_block(self.__read_block(table, block_offset, block_size)):
+                trailer = int.from_bytes(internal_key[-8:], 'little')
+                yield internal_key[:-8], trailer >> 8, trailer & 0xff, value
+
+    def __iter_log(self, log: bytes):
+        record = b''
+        block_start = 0
+        while block_start < len(log):
+            pos = block_start
+            block_end = min(block_start + self.__LOG_BLOCK_SIZE, len(log))
+            while pos + 7 <= block_end:
+                length = int.from_bytes(log[pos + 4:pos + 6], 'little')
+                record_type = log[pos + 6]
+                fragment = log[pos + 7:pos + 7 + length]
+                pos += 7 + length
+                if record_type == 0:
+                    break
+                if record_type in (1, 2):
+                    record = fragment
+                else:
+                    record += fragment
+                if record_type in (1, 4):
+                    yield from self.__iter_write_batch(record)
+                    record = b''
+            block_start += self.__LOG_BLOCK_SIZE
+
+    @staticmethod
+    def __iter_write_batch(batch: bytes):
+        if len(batch) < 12:
+            return
+        sequence = int.from_bytes(batch[:8], 'little')
+        pos = 12
+        while pos < len(batch):
+            record_type = batch[pos]
+            key_len, pos = _read_varint(batch, pos + 1)
+            key = batch[pos:pos + key_len]
+            pos += key_len
+            value = b''
+            if record_type == 1:
+                value_len, pos = _read_varint(batch, pos)
+                value = batch[pos:pos + value_len]
+                pos += value_len
+            yield key, sequence, record_type, value
+            sequence += 1
+
+    def read_all(self) -> dict[bytes, bytes]:
+        newest: dict[bytes, tuple[int, int, bytes]] = {}
+        for file_name in os.listdir(self.__db_dir):
+            file_path = os.path.join(self.__db_dir, file_name)
+            if file_name.endswith('.ldb') or file_name.endswith('.sst'):
+                parser = self.__iter_table
+            elif file_name.endswith('.log'):
+                parser = self.__iter_log
+            else:
+                continue
+            with open(file_path, 'rb') as file:
+                content = file.read()
+            for key, sequence, record_type, value in parser(content):
+                if key not in newest or newest[key][0] < sequence:
+                    newest[key] = (sequence, record_type, value)
+        return {key: value for key, (_, record_type, value) in newest.items() if record_type == 1}
+
+
+class _V8Deserializer:
+    # Decodes the subset of the V8/Blink serialization format used for the records of the wawc user store.
+    def __init__(self, data: bytes):
+        self.__data = data
+        self.__pos = 0
+        self.__objects = []
+
+    def __read_byte(self) -> int:
+        byte = self.__data[self.__pos]
+        self.__pos += 1
+        return byte
+
+    def __read_varint(self) -> int:
+        value, self.__pos = _read_varint(self.__data, self.__pos)
+        return value
+
+    def __read_bytes(self, length: int) -> bytes:
+        chunk = self.__data[self.__pos:self.__pos + length]
+        self.__pos += length
+        return chunk
+
+    def __read_properties(self, obj, end_tag: int) -> NoReturn:
+        while True:
+            while self.__data[self.__pos] == 0:
+                self.__pos += 1
+            if self.__data[self.__pos] == end_tag:
+                self.__pos += 1
+                return
+            key = self.read_value()
+            obj[key if isinstance(obj, dict) else int(key)] = self.read_value()
+
+    def read_value(self):
+        tag = self.__read_byte()
+        if tag == 0xff:
+            self.__read_varint()
+            return self.read_value()
+        if tag == 0xfe:
+            # Blink trailer offset (uint64 offset + uint32 size)
+            self.__pos += 12
+            return self.read_value()
+        if tag == 0:
+            return self.read_value()
+        tag = chr(tag)
+        if tag in ('_', '-'):
+            return None
+        if tag == '0':
+            return None
+        if tag == 'T':
+            return True
+        if tag == 'F':
+            return False
+        if tag == 'I':
+            value = self.__read_varint()
+            return (value >> 1) ^ -(value & 1)
+        if tag == 'U':
+            return self.__read_varint()
+        if tag == 'N':
+            return struct.unpack('<d', self.__read_bytes(8))[0]
+        if tag == '"':
+            return self.__read_bytes(self.__read_varint()).decode('latin-1')
+        if tag == 'c':
+            return self.__read_bytes(self.__read_varint()).decode('utf-16-le')
+        if tag == 'S':
+            return self.__read_bytes(self.__read_varint()).decode('utf-8')
+        if tag == 'o':
+            obj = {}
+            self.__objects.append(obj)
+            self.__read_properties(obj, ord('{'))
+            self.__read_varint()
+            return obj
+        if tag in ('A', 'a'):
+            length = self.__read_varint()
+            array = [None] * length
+            self.__objects.append(array)
+            if tag == 'A':
+                for i in range(length):
+                    array[i] = self.read_value()
+            properties = {}
+            self.__read_properties(properties, ord('$' if tag == 'A' else '@'))
+            for key, value in properties.items():
+                if isinstance(key, (int, float)) and 0 <= int(key) < length:
+                    array[int(key)] = value
+            self.__read_varint()
+            self.__read_varint()
+            return array
+        if tag == '^':
+            return self.__objects[self.__read_varint()]
+        if tag == 'D':
+            value = struct.unpack('<d', self.__read_bytes(8))[0]
+            self.__objects.append(value)
+            return value
+        if tag == 'B':
+            buffer = list(self.__read_bytes(self.__read_varint()))
+            self.__objects.append(buffer)
+            if self.__pos < len(self.__data) and self.__data[self.__pos] == ord('V'):
+                self.__pos += 1
+                self.__read_byte()
+                offset = self.__read_varint()
+                length = self.__read_varint()
+                buffer = buffer[offset:offset + length]
+            return buffer
+        raise ValueError('Unsupported V8 serialization tag: %r' % tag)
+
+
+class _StructuredCloneReader:
+    # Decodes the subset of the SpiderMonkey structured clone format used for the records of the wawc user store.
+    __FLOAT_MAX = 0xfff00000
+    __HEADER = 0xfff10000
+    __NULL = 0xffff0000
+    __UNDEFINED = 0xffff0001
+    __BOOLEAN = 0xffff0002
+    __INT32 = 0xffff0003
+    __STRING = 0xffff0004
+    __DATE_OBJECT = 0xffff0005
+    __ARRAY_OBJECT = 0xffff0007
+    __OBJECT_OBJECT = 0xffff0008
+    __BACK_REFERENCE_OBJECT = 0xffff000d
+    __END_OF_KEYS = 0xffff0013
+
+    def __init__(self, data: bytes):
+        self.__data = data
+        self.__pos = 0
+        self.__objects = []
+
+    def __read_pair(self) -> tuple[int, int]:
+        data = int.from_bytes(self.__data[self.__pos:self.__pos + 4], 'little')
+        tag = int.from_bytes(self.__data[self.__pos + 4:self.__pos + 8], 'little')
+        self.__pos += 8
+        return tag, data
+
+    def __read_string(self, data: int) -> str:
+        length = data & 0x7fffffff
+        if data & 0x80000000:
+            raw_len = length
+            value = self.__data[self.__pos:self.__pos + raw_len].decode('latin-1')
+        else:
+            raw_len = length * 2
+            value = self.__data[self.__pos:self.__pos + raw_len].decode('utf-16-le')
+        self.__pos += (raw_len + 7) & ~7
+        return value
+
+    def __read_properties(self, obj) -> NoReturn:
+        while True:
+            tag, data = self.__read_pair()
+            if tag == self.__END_OF_KEYS:
+                return
+            key = self.__read_tagged(tag, data)
+            value = self.read_value()
+            if isinstance(obj, list):
+                while len(obj) <= key:
+                    obj.append(None)
+            obj[key] = value
+
+    def __read_tagged(self, tag: int, data: int):
+        if tag < self.__FLOAT_MAX:
+            return struct.unpack('<d', self.__data[self.__pos - 8:self.__pos])[0]
+        if tag == self.__HEADER:
+            return self.read_value()
+        if tag in (self.__NULL, self.__UNDEFINED):
+            return None
+        if tag == self.__BOOLEAN:
+            return bool(data)
+        if tag == self.__INT32:
+            return data - (1 << 32) if data & 0x80000000 else data
+        if tag == self.__STRING:
+            return self.__read_string(data)
+        if tag == self.__DATE_OBJECT:
+            self.__pos += 8
+            value = struct.unpack('<d', self.__data[self.__pos - 8:self.__pos])[0]
+            self.__objects.append(value)
+            return value
+        if tag == self.__OBJECT_OBJECT:
+            obj = {}
+            self.__objects.append(obj)
+            self.__read_properties(obj)
+            return obj
+        if tag == self.__ARRAY_OBJECT:
+            array = []
+            self.__objects.append(array)
+            self.__read_properties(array)
+            while len(array) < data:
+                array.append(None)
+            return array
+        if tag == self.__BACK_REFERENCE_OBJECT:
+            return self.__objects[data]
+        raise ValueError('Unsupported structured clone tag: %s' % hex(tag))
+
+    def read_value(self):
+        return self.__read_tagged(*self.__read_pair())
+
+
+class SessionFileFormat(Enum):
+    JSON = 1
+    COMPACT = 2
+
+
+# Compact session files: a header (magic, format version, compression, record count)
+# followed by length-prefixed records, which are compressed as one stream if requested.
+_COMPACT_MAGIC = b'WAWS'
+_COMPACT_VERSION = 1
+_COMPACT_HEADER = struct.Struct('>4sBBI')
+_COMPACT_LENGTH = struct.Struct('>I')
+_COMPACT_COMPRESSION = {None: 0, 'zlib': 1, 'lzma': 2}
+_COMPACT_FLAG_JSON_VALUE = 1
+_COMPACT_FLAG_JSON_ENTRY = 2
+_COMPACT_CHUNK_SIZE = 65536
+
+
+def _encode_compact_record(entry) -> bytes:
+    if isinstance(entry, dict) and entry.keys() == {'key', 'value'} and isinstance(entry['key'], str):
+        flags = 0
+        key = entry['key'].encode('utf-8')
+        if isinstance(entry['value'], str):
+            value = entry['value'].encode('utf-8')
+        else:
+            flags |= _COMPACT_FLAG_JSON_VALUE
+            value = json.dumps(entry['value'], separators=(',', ':')).encode('utf-8')
+    else:
+        # NOTE: Entries which don't look like IDB user objects are kept as they are.
+        flags = _COMPACT_FLAG_JSON_ENTRY
+        key = b''
+        value = json.dumps(entry, separators=(',', ':')).encode('utf-8')
+    return b''.join((bytes((flags,)), _COMPACT_LENGTH.pack(len(key)), key, _COMPACT_LENGTH.pack(len(value)), value))
+
+
+def _new_compressor(compression: Optional[str]):
+    if compression == 'zlib':
+        return zlib.compressobj(9)
+    elif compression == 'lzma':
+        return lzma.LZMACompressor()
+    return None
+
+
+def _new_decompressor(compression: int):
+    if compression == _COMPACT_COMPRESSION['zlib']:
+        return zlib.decompressobj()
+    elif compression == _COMPACT_COMPRESSION['lzma']:
+        return lzma.LZMADecompressor()
+    elif compression == _COMPACT_COMPRESSION[None]:
+        return None
+    raise ValueError('Unknown compression in session file: %s' % compression)
+
+
+def _write_compact_session(file, wa_profile_obj: list[dict[str, str]], compression: Optional[str] = None) -> NoReturn:
+    if compression not in _COMPACT_COMPRESSION:
+        raise ValueError('Unknown compression: %s. Use one of: %s' % (compression, list(_COMPACT_COMPRESSION)))
+    file.write(_COMPACT_HEADER.pack(_COMPACT_MAGIC, _COMPACT_VERSION, _COMPACT_COMPRESSION[compression],
+                                    len(wa_profile_obj)))
+    compressor = _new_compressor(compression)
+    for entry in wa_profile_obj:
+        record = _encode_compact_record(entry)
+        file.write(compressor.compress(record) if compressor else record)
+    if compressor:
+        file.write(compressor.flush())
+
+
+class _CompactRecordStream:
+    __file = None
+    __decompressor = None
+
+    def __init__(self, file, decompressor):
+        self.__file = file
+        self.__decompressor = decompressor
+        self.__buffer = bytearray()
+
+    def read(self, size: int) -> bytes:
+        while len(self.__buffer) < size:
+            chunk = self.__file.read(_COMPACT_CHUNK_SIZE)
+            if not chunk:
+                if self.__decompressor is not None and not self.__decompressor.eof:
+                    raise ValueError('The compressed session file is truncated.')
+                break
+            if self.__decompressor is not None:
+                try:
+                    chunk = self.__decompressor.decompress(chunk)
+                except (zlib.error, lzma.LZMAError, EOFError) as e:
+                    raise ValueError('Invalid compact session file: %s' % e) from None
+            self.__buffer += chunk
+        if len(self.__buffer) < size:
+            raise ValueError('The session file is truncated.')
+        data = bytes(self.__buffer[:size])
+        del self.__buffer[:size]
+        return data
+
+    def check_end(self) -> NoReturn:
+        # the records can be complete before the end of the compressed stream was read
+        if self.__decompressor is None:
+            return
+        while not self.__decompressor.eof:
+            chunk = self.__file.read(_COMPACT_CHUNK_SIZE)
+            if not chunk:
+                raise ValueError('The compressed session file is truncated.')
+            try:
+                self.__decompressor.decompress(chunk)
+            except (zlib.error, lzma.LZMAError, EOFError) as e:
+                raise ValueError('Invalid compact session file: %s' % e) from None
+
+
+def _iter_compact_session(file):
+    try:
+        magic, version, compression, record_count = _COMPACT_HEADER.unpack(file.read(_COMPACT_HEADER.size))
+    except struct.error as e:
+        raise ValueError('Invalid compact session file: %s' % e) from None
+    if magic != _COMPACT_MAGIC:
+        raise ValueError('Not a compact session file.')
+    if version > _COMPACT_VERSION:
+        raise ValueError('Unsupported compact session file version: %s' % version)
+    stream = _CompactRecordStream(file, _new_decompressor(compression))
+    for _ in range(record_count):
+        flags = stream.read(1)[0]
+        key = stream.read(_COMPACT_LENGTH.unpack(stream.read(_COMPACT_LENGTH.size))[0]).decode('utf-8')
+        value = stream.read(_COMPACT_LENGTH.unpack(stream.read(_COMPACT_LENGTH.size))[0]).decode('utf-8')
+        if flags & _COMPACT_FLAG_JSON_ENTRY:
+            yield json.loads(value)
+        elif flags & _COMPACT_FLAG_JSON_VALUE:
+            yield {'key': key, 'value': json.loads(value)}
+        else:
+            yield {'key': key, 'value': value}
+    stream.check_end()
+
+
+def _read_compact_header(file_path: str) -> Optional[tuple[int, Optional[str], int]]:
+    with open(file_path, 'rb') as file:
+        header = file.read(_COMPACT_HEADER.size)
+    if len(header) < _COMPACT_HEADER.size or header[:len(_COMPACT_MAGIC)] != _COMPACT_MAGIC:
+        return None
+    _, version, compression, record_count = _COMPACT_HEADER.unpack(header)
+    compression_names = {value: name for name, value in _COMPACT_COMPRESSION.items()}
+    return version, compression_names.get(compression), record_count
+
+
+# Every write-back of a refreshed session appends one JSON line with the changed and removed keys
+# to "<session file>.delta" until the delta log gets compacted into the session file again.
+_DELTA_SUFFIX = '.delta'
+
+
+def _read_delta_log(file_path: str) -> tuple[dict[str, str], set[str], int]:
+    changed_entries: dict[str, str] = {}
+    removed_keys: set[str] = set()
+    delta_count = 0
+    delta_path = file_path + _DELTA_SUFFIX
+    if not os.path.isfile(delta_path):
+        return changed_entries, removed_keys, delta_count
+    with open(delta_path, 'r') as file:
+        for line in file:
+            if not line.strip():
+                continue
+            try:
+                delta = json.loads(line)
+            except ValueError:
+                # NOTE: A crash while appending can only damage the last line, which is ignored then.
+                break
+            for key, value in delta.get('set', {}).items():
+                changed_entries[key] = value
+                removed_keys.discard(key)
+            for key in delta.get('removed', []):
+                changed_entries.pop(key, None)
+                removed_keys.add(key)
+            delta_count += 1
+    return changed_entries, removed_keys, delta_count
+
+
+def _apply_delta(wa_profile_records, changed_entries: dict[str, str], removed_keys: set[str]):
+    pending_entries = dict(changed_entries)
+    for entry in wa_profile_records:
+        key = entry.get('key') if isinstance(entry, dict) else None
+        if key in removed_keys:
+            continue
+        if key in pending_entries:
+            yield {'key': key, 'value': pending_entries.pop(key)}
+        else:
+            yield entry
+    for key, value in pending_entries.items():
+        yield {'key': key, 'value': value}
+
+
+class OfflineSessionReader:
+    CHROME_IDB_DIR = 'https_web.whatsapp.com_0.indexeddb.leveldb'
+    FIREFOX_ORIGIN_DIR = 'https+++web.whatsapp.com'
+    __DB_NAME = 'wawc'
+    __STORE_NAME = 'user'
+
+    @staticmethod
+    def __decode_chrome_key_prefix(key: bytes) -> tuple[tuple[int, int, int], int]:
+        first_byte = key[0]
+        lengths = (((first_byte >> 5) & 7) + 1, ((first_byte >> 2) & 7) + 1, (first_byte & 3) + 1)
+        pos = 1
+        ids = []
+        for length in lengths:
+            ids.append(int.from_bytes(key[pos:pos + length], 'little'))
+            pos += length
+        return (ids[0], ids[1], ids[2]), pos
+
+    @staticmethod
+    def __decode_chrome_string_with_length(key: bytes, pos: int) -> tuple[str, int]:
+        length, pos = _read_varint(key, pos)
+        return key[pos:pos + length * 2].decode('utf-16-be'), pos + length * 2
+
+    @staticmethod
+    def __decode_chrome_value(value: bytes):
+        _, pos = _read_varint(value, 0)
+        value = value[pos:]
+        if value[:2] == b'\xff\x11':
+            # values that need processing before they can be deserialized (Blink pseudo version 17)
+            if value[2] == 2:
+                value = _snappy_decompress(value[3:])
+            else:
+                raise ValueError('IDB values stored as blobs are not supported.')
+        return _V8Deserializer(value).read_value()
+
+    @staticmethod
+    def find_chrome_idb_dir(profile_dir: str) -> Optional[str]:
+        for idb_dir in (os.path.join(profile_dir, 'IndexedDB', OfflineSessionReader.CHROME_IDB_DIR),
+                        os.path.join(profile_dir, 'Default', 'IndexedDB', OfflineSessionReader.CHROME_IDB_DIR)):
+            if os.path.isdir(idb_dir):
+                return idb_dir
+        return None
+
+    @staticmethod
+    def find_firefox_idb_files(profile_dir: str) -> list[str]:
+        idb_dir = os.path.join(profile_dir, 'storage', 'default', OfflineSessionReader.FIREFOX_ORIGIN_DIR, 'idb')
+        if not os.path.isdir(idb_dir):
+            return []
+        return sorted(os.path.join(idb_dir, file_name) for file_name in os.listdir(idb_dir)
+                      if file_name.endswith('.sqlite'))
+
+    @staticmethod
+    def read_chrome_idb(idb_dir: str) -> list[dict[str, str]]:
+        entries = _LevelDbReader(idb_dir).read_all()
+
+        database_id = None
+        for key, value in entries.items():
+            if not key or OfflineSessionReader.__decode_chrome_key_prefix(key)[0] != (0, 0, 0):
+                continue
+            _, pos = OfflineSessionReader.__decode_chrome_key_prefix(key)
+            if key[pos:pos + 1] != b'\xc9':
+                continue
+            _, pos = OfflineSessionReader.__decode_chrome_string_with_length(key, pos + 1)
+            database_name, _ = OfflineSessionReader.__decode_chrome_string_with_length(key, pos)
+            if database_name == OfflineSessionReader.__DB_NAME:
+                database_id = int.from_bytes(value, 'little')
+                break
+        if database_id is None:
+            raise LookupError('The IDB wawc was not found in: %s' % idb_dir)
+
+        object_store_id = None
+        for key, value in entries.items():
+            if not key or OfflineSessionReader.__decode_chrome_key_prefix(key)[0] != (database_id, 0, 0):
+                continue
+            _, pos = OfflineSessionReader.__decode_chrome_key_prefix(key)
+            if key[pos:pos + 1] != b'\x32':
+                continue
+            store_id, pos = _read_varint(key, pos + 1)
+            if key[pos:] == b'\x00' and value.decode('utf-16-be') == OfflineSessionReader.__STORE_NAME:
+                object_store_id = store_id
+                break
+        if object_store_id is None:
+            raise LookupError('The object store user was not found in the IDB wawc.')
+
+        records = []
+        for key, value in entries.items():
+            if not key or OfflineSessionReader.__decode_chrome_key_prefix(key)[0] != (database_id, object_store_id, 1):
+                continue
+            records.append(OfflineSessionReader.__decode_chrome_value(value))
+        records.sort(key=lambda record: str(record.get('key', '')) if isinstance(record, dict) else '')
+        return records
+
+    @staticmethod
+    def read_firefox_idb(sqlite_file: str) -> list[dict[str, str]]:
+        connection = sqlite3.connect('file:%s?mode=ro' % urllib.request.pathname2url(sqlite_file), uri=True)
+        try:
+            row = connection.execute('SELECT name FROM database').fetchone()
+            if row is None or row[0] != OfflineSessionReader.__DB_NAME:
+                raise LookupError('The IDB wawc was not found in: %s' % sqlite_file)
+            row = connection.execute('SELECT id FROM object_store WHERE name = ?',
+                                     (OfflineSessionReader.__STORE_NAME,)).fetchone()
+            if row is None:
+                raise LookupError('The object store user was not found in the IDB wawc.')
+            records = []
+            for (data,) in connection.execute('SELECT data FROM object_data WHERE object_store_id = ? ORDER BY key',
+                                              (row[0],)):
+                try:
+                    data = _snappy_decompress(data)
+                except (ValueError, IndexError):
+                    # NOTE: Older Firefox versions did not compress the structured clone data.
+                    pass
+                records.append(_StructuredCloneReader(data).read_value())
+            return records
+        finally:
+            connection.close()
+
+    @staticmethod
+    def get_idb_fingerprint(browser: Browser, profile_dir: str) -> Optional[tuple]:
+        try:
+            if browser == Browser.CHROME:
+                idb_dir = OfflineSessionReader.find_chrome_idb_dir(profile_dir)
+                if idb_dir is None:
+                    return None
+                idb_files = [os.path.join(idb_dir, file_name) for file_name in sorted(os.listdir(idb_dir))]
+            elif browser == Browser.FIREFOX:
+                idb_files = []
+                for sqlite_file in OfflineSessionReader.find_firefox_idb_files(profile_dir):
+                    idb_files.append(sqlite_file)
+                    if os.path.isfile(sqlite_file + '-wal'):
+                        idb_files.append(sqlite_file + '-wal')
+                if not idb_files:
+                    return None
+            else:
+                raise ValueError('The specified browser is invalid.')
+            fingerprint = []
+            for idb_file in idb_files:
+                file_stat = os.stat(idb_file)
+                fingerprint.append((os.path.basename(idb_file), file_stat.st_size, file_stat.st_mtime_ns))
+            return tuple(fingerprint)
+        except OSError:
+            # NOTE: Files can disappear while the browser compacts the IDB, the state is unknown in that case.
+            return None
+
+    @staticmethod
+    def read_profile(browser: Browser, profile_dir: str) -> list[dict[str, str]]:
+        if browser == Browser.CHROME:
+            idb_dir = OfflineSessionReader.find_chrome_idb_dir(profile_dir)
+            if idb_dir is None:
+                raise FileNotFoundError('No WhatsApp Web IDB found in profile: %s' % profile_dir)
+            return OfflineSessionReader.read_chrome_idb(idb_dir)
+        elif browser == Browser.FIREFOX:
+            for sqlite_file in OfflineSessionReader.find_firefox_idb_files(profile_dir):
+                try:
+                    return OfflineSessionReader.read_firefox_idb(sqlite_file)
+                except LookupError:
+                    continue
+            raise FileNotFoundError('No WhatsApp Web IDB found in profile: %s' % profile_dir)
+        raise ValueError('The specified browser is invalid.')
+
+
+_FICLONE = 0x40049409
+
+
+def _clone_file(source_path: str, target_path: str) -> bool:
+    # copy-on-write copy (FICLONE), only supported by some file systems like btrfs and xfs
+    if fcntl is None:
+        return False
+    with open(source_path, 'rb') as source_file, open(target_path, 'wb') as target_file:
+        try:
+            fcntl.ioctl(target_file.fileno(), _FICLONE, source_file.fileno())
+            return True
+        except OSError:
+            pass
+    os.remove(target_path)
+    return False
+
+
+class ProfileSnapshot:
+    __MAX_ATTEMPTS = 3
+    # LevelDB never changes table files after writing them, so they can be shared with the original profile
+    __IMMUTABLE_SUFFIXES = ('.ldb', '.sst')
+    __SKIPPED_FILES = ('LOCK', '.parentlock', 'parent.lock', 'lock')
+    __browser: Browser
+    __profile_dir: str
+    __base_dir: Optional[str]
+    __snapshot_dir: Optional[str]
+    __stats: dict[str, int]
+    log: logging.Logger
+
+    def __init__(self, browser: Browser, profile_dir: str, base_dir: Optional[str] = None,
+                 log: Optional[logging.Logger] = None):
+        self.__browser = browser
+        self.__profile_dir = os.path.normpath(profile_dir)
+        self.__base_dir = base_dir
+        self.__snapshot_dir = None
+        self.__stats = {'hardlinks': 0, 'reflinks': 0, 'copies': 0, 'bytes': 0}
+        self.log = log if log else logging.getLogger('WaWebSession:ProfileSnapshot')
+
+    def __enter__(self) -> str:
+        return self.create()
+
+    def __exit__(self, exc_type, exc_value, traceback) -> bool:
+        self.remove()
+        return False
+
+    @staticmethod
+    def __get_dir_state(source_dir: str) -> dict[str, tuple[int, int]]:
+        dir_state = {}
+        for dir_path, _, file_names in os.walk(source_dir):
+            for file_name in file_names:
+                file_path = os.path.join(dir_path, file_name)
+                try:
+                    file_stat = os.stat(file_path)
+                except FileNotFoundError:
+                    continue
+                dir_state[os.path.relpath(file_path, source_dir)] = (file_stat.st_size, file_stat.st_mtime_ns)
+        return dir_state
+
+    def __get_copy_dirs(self) -> list[tuple[str, str]]:
+        copy_dirs = []
+        if self.__browser == Browser.CHROME:
+            idb_dir = OfflineSessionReader.find_chrome_idb_dir(self.__profile_dir)
+            if idb_dir is not None:
+                # NOTE: The snapshot is always used as the user-data-dir, so everything is moved to the Default profile.
+                copy_dirs.append((idb_dir, os.path.join('Default', 'IndexedDB', os.path.basename(idb_dir))))
+                local_storage_dir = os.path.join(os.path.dirname(os.path.dirname(idb_dir)), 'Local Storage', 'leveldb')
+                if os.path.isdir(local_storage_dir):
+                    copy_dirs.append((local_storage_dir, os.path.join('Default', 'Local Storage', 'leveldb')))
+        elif self.__browser == Browser.FIREFOX:
+            origin_dir = os.path.join('storage', 'default', OfflineSessionReader.FIREFOX_ORIGIN_DIR)
+            if os.path.isdir(os.path.join(self.__profile_dir, origin_dir)):
+                copy_dirs.append((os.path.join(self.__profile_dir, origin_dir), origin_dir))
+        else:
+            raise ValueError('The specified browser is invalid.')
+        return copy_dirs
+
+    def __copy_file(self, source_path: str, target_path: str) -> NoReturn:
+        if source_path.endswith(self.__IMMUTABLE_SUFFIXES):
+            try:
+                os.link(source_path, target_path)
+                self.__stats['hardlinks'] += 1
+                return
+            except OSError:
+                pass
+        if _clone_file(source_path, target_path):
+            self.__stats['reflinks'] += 1
+        else:
+            shutil.copyfile(source_path, target_path)
+            self.__stats['copies'] += 1
+        self.__stats['bytes'] += os.path.getsize(target_path)
+
+    def __copy_dir(self, source_dir: str, target_dir: str) -> bool:
+        source_state = self.__get_dir_state(source_dir)
+        for relative_path in sorted(source_state):
+            if os.path.basename(relative_path) in self.__SKIPPED_FILES:
+                continue
+            target_path = os.path.join(target_dir, relative_path)
+            os.makedirs(os.path.dirname(target_path), exist_ok=True)
+            try:
+                self.__copy_file(os.path.join(source_dir, relative_path), target_path)
+            except FileNotFoundError:
+                # NOTE: The browser removed the file while copying (e.g. a LevelDB compaction).
+                return False
+        return self.__get_dir_state(source_dir) == source_state
+
+    def create(self) -> str:
+        if self.__snapshot_dir is not None:
+            return self.__snapshot_dir
+        if not os.path.isdir(self.__profile_dir):
+            raise FileNotFoundError('The profile directory does not exist: %s' % self.__profile_dir)
+        if self.__base_dir is not None:
+            os.makedirs(self.__base_dir, exist_ok=True)
+        self.__snapshot_dir = tempfile.mkdtemp(prefix='wawebsession-', dir=self.__base_dir)
+        try:
+            for source_dir, relative_target_dir in self.__get_copy_dirs():
+                target_dir = os.path.join(self.__snapshot_dir, relative_target_dir)
+                for attempt in range(1, self.__MAX_ATTEMPTS + 1):
+                    if self.__copy_dir(source_dir, target_dir):
+                        break
+                    self.log.debug('%s changed while copying it, retrying... [ATTEMPT: %s]', source_dir, attempt)
+                    shutil.rmtree(target_dir, ignore_errors=True)
+                else:
+                    # NOTE: The browser keeps writing, the last copy is still usable as LevelDB and SQLite recover
+                    #  from unfinished writes.
+                    self.__copy_dir(source_dir, target_dir)
+                    self.log.warning('%s kept changing, the snapshot might miss the latest writes.', source_dir)
+        except BaseException:
+            self.remove()
+            raise
+        self.log.debug('Created profile snapshot: %s [%s]', self.__snapshot_dir, self.__stats)
+        return self.__snapshot_dir
+
+    def remove(self) -> NoReturn:
+        if self.__snapshot_dir is not None:
+            shutil.rmtree(self.__snapshot_dir, ignore_errors=True)
+            self.__snapshot_dir = None
+
+    def get_snapshot_dir(self) -> Optional[str]:
+        return self.__snapshot_dir
+
+    def get_stats(self) -> dict[str, int]:
+        return dict(self.__stats)
+
+
+class ProfileCatalog:
+    __FIREFOX_INI = 'profiles.ini'
+    __CHROME_LOCAL_STATE = 'Local State'
+    __browser: Browser
+    __user_dir: str
+    __profiles: list[dict]
+    __list_signature: Optional[tuple]
+    __whatsapp_cache: dict[str, tuple]
+    __lock: threading.Lock
+    log: logging.Logger
+
+    def __init__(self, browser: Browser, user_dir: str, log: Optional[logging.Logger] = None):
+        self.__browser = browser
+        self.__user_dir = os.path.normpath(user_dir)
+        self.__profiles = []
+        self.__list_signature = None
+        self.__whatsapp_cache = {}
+        self.__lock = threading.Lock()
+        self.log = log if log else logging.getLogger('WaWebSession:ProfileCatalog')
+
+    @staticmethod
+    def __get_mtime(path: Optional[str]) -> Optional[int]:
+        if path is None:
+            return None
+        try:
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+
+    def __find_config_file(self) -> Optional[str]:
+        if self.__browser == Browser.CHROME:
+            candidates = [os.path.join(self.__user_dir, self.__CHROME_LOCAL_STATE)]
+        else:
+            # NOTE: On Windows the profiles.ini is stored next to the Profiles directory.
+            candidates = [os.path.join(self.__user_dir, self.__FIREFOX_INI),
+                          os.path.join(os.path.dirname(self.__user_dir), self.__FIREFOX_INI)]
+        for candidate in candidates:
+            if os.path.isfile(candidate):
+                return candidate
+        return None
+
+    def __get_profile_name(self, profile_path: str) -> str:
+        profile_name = os.path.relpath(profile_path, self.__user_dir)
+        if profile_name == os.curdir:
+            return ''
+        if profile_name.startswith(os.pardir):
+            # NOTE: Profiles outside the user dir are kept as absolute paths, os.path.join() keeps them as they are.
+            return profile_path
+        return profile_name
+
+    def __read_firefox_ini(self, ini_path: str) -> list[dict]:
+        parser = configparser.RawConfigParser(strict=False)
+        parser.optionxform = str
+        parser.read(ini_path, encoding='utf-8')
+        profiles = []
+        for section in parser.sections():
+            if not section.startswith('Profile') or not parser.has_option(section, 'Path'):
+                continue
+            profile_path = parser.get(section, 'Path')
+            if parser.get(section, 'IsRelative', fallback='1') == '1':
+                profile_path = os.path.join(os.path.dirname(ini_path), profile_path)
+            profile_path = os.path.normpath(profile_path)
+            if os.path.isdir(profile_path):
+                profiles.append({
+                    'name': self.__get_profile_name(profile_path),
+                    'path': profile_path,
+                    'display_name': parser.get(section, 'Name', fallback=None),
+                })
+        return profiles
+
+    def __read_chrome_local_state(self, local_state_path: str) -> list[dict]:
+        with open(local_state_path, 'r', encoding='utf-8') as local_state_file:
+            info_cache = json.load(local_state_file).get('profile', {}).get('info_cache', {})
+        profiles = []
+        for profile_dir, profile_info in sorted(info_cache.items()):
+            if profile_dir == 'System Profile':
+                continue
+            # NOTE: The default profile is opened by pointing the user-data-dir at the user dir itself.
+            profile_name = '' if profile_dir == 'Default' else profile_dir
+            profile_path = os.path.join(self.__user_dir, profile_name) if profile_name else self.__user_dir
+            if os.path.isdir(os.path.join(self.__user_dir, profile_dir)):
+                profiles.append({
+                    'name': profile_name,
+                    'path': os.path.normpath(profile_path),
+                    'display_name': profile_info.get('name') if isinstance(profile_info, dict) else None,
+                })
+        return profiles
+
+    def __scan_user_dir(self) -> list[dict]:
+        profiles = []
+        if self.__browser == Browser.CHROME:
+            profiles.append({'name': '', 'path': self.__user_dir, 'display_name': None})
+        for profile_dir in sorted(os.listdir(self.__user_dir)):
+            profile_path = os.path.join(self.__user_dir, profile_dir)
+            if self.__browser == Browser.CHROME:
+                if 'profile' in profile_dir.lower() and profile_dir != 'System Profile':
+                    profiles.append({'name': profile_dir, 'path': profile_path, 'display_name': None})
+            elif not profile_dir.endswith('.default') and os.path.isdir(profile_path):
+                profiles.append({'name': profile_dir, 'path': profile_path, 'display_name': None})
+        return profiles
+
+    def __read_profiles(self, config_file: Optional[str]) -> list[dict]:
+        if config_file is not None:
+            try:
+                if self.__browser == Browser.CHROME:
+                    return self.__read_chrome_local_state(config_file)
+                return self.__read_firefox_ini(config_file)
+            except (OSError, ValueError, AttributeError, configparser.Error) as e:
+                self.log.warning('Could not parse %s, scanning the user dir instead: %s', config_file, e)
+        return self.__scan_user_dir()
+
+    def __get_whatsapp_signature(self, profile_path: str) -> tuple:
+        if self.__browser == Browser.CHROME:
+            return (self.__get_mtime(os.path.join(profile_path, 'IndexedDB')),
+                    self.__get_mtime(os.path.join(profile_path, 'Default', 'IndexedDB')))
+        return self.__get_mtime(os.path.join(profile_path, 'storage', 'default')),
+
+    def __has_whatsapp(self, profile_path: str) -> bool:
+        signature = self.__get_whatsapp_signature(profile_path)
+        cached = self.__whatsapp_cache.get(profile_path)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+        if self.__browser == Browser.CHROME:
+            has_whatsapp = OfflineSessionReader.find_chrome_idb_dir(profile_path) is not None
+        else:
+            has_whatsapp = len(OfflineSessionReader.find_firefox_idb_files(profile_path)) > 0
+        self.__whatsapp_cache[profile_path] = (signature, has_whatsapp)
+        return has_whatsapp
+
+    def invalidate(self) -> NoReturn:
+        with self.__lock:
+            self.__list_signature = None
+            self.__whatsapp_cache = {}
+
+    def get_profiles(self) -> list[dict]:
+        with self.__lock:
+            config_file = self.__find_config_file()
+            # NOTE: Raises like os.listdir() did if the browser has never been started.
+            list_signature = (os.stat(self.__user_dir).st_mtime_ns, config_file, self.__get_mtime(config_file))
+            if list_signature != self.__list_signature:
+                self.log.debug('Reading browser profiles... [CONFIG: %s]', config_file)
+                self.__profiles = self.__read_profiles(config_file)
+                self.__list_signature = list_signature
+            return [dict(profile, has_whatsapp=self.__has_whatsapp(profile['path'])) for profile in self.__profiles]
+
+    def get_profile_names(self, whatsapp_only: bool = False) -> list[str]:
+        return [profile['name'] for profile in self.get_profiles() if profile['has_whatsapp'] or not whatsapp_only]
+
+
+class SessionCache:
+    __ttl: Optional[float]
+    __max_bytes: int
+    __entries: collections.OrderedDict
+    __total_bytes: int
+    __stats: dict[str, int]
+    __lock: threading.Lock
+
+    def __init__(self, ttl: Optional[float] = 300, max_bytes: int = 64 * 1024 * 1024):
+        if ttl is not None and ttl <= 0:
+            raise ValueError('ttl has to be a positive number or None.')
+        if not isinstance(max_bytes, int) or max_bytes < 1:
+            raise ValueError('max_bytes has to be a positive integer.')
+        self.__ttl = ttl
+        self.__max_bytes = max_bytes
+        self.__entries = collections.OrderedDict()
+        self.__total_bytes = 0
+        self.__stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+        self.__lock = threading.Lock()
+
+    @staticmethod
+    def __make_key(browser: Union[Browser, str], profile_name: str) -> tuple[str, str]:
+        return browser.name.lower() if isinstance(browser, Browser) else str(browser).lower(), profile_name
+
+    def __drop(self, key: tuple[str, str]) -> NoReturn:
+        entry = self.__entries.pop(key)
+        self.__total_bytes -= entry['bytes']
+
+    def get(self, browser: Union[Browser, str], profile_name: str,
+            fingerprint: Optional[tuple]) -> Optional[list[dict[str, str]]]:
+        key = self.__make_key(browser, profile_name)
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is not None and (fingerprint is None or entry['fingerprint'] != fingerprint or
+                                      (self.__ttl is not None and time.monotonic() - entry['stored_at'] > self.__ttl)):
+                self.__drop(key)
+                entry = None
+            if entry is None:
+                self.__stats['misses'] += 1
+                return None
+            self.__entries.move_to_end(key)
+            self.__stats['hits'] += 1
+            wa_profile_obj = entry['session'].as_list()
+        # NOTE: The records are copied, so callers can't change the cached session.
+        return [dict(idb_entry) for idb_entry in wa_profile_obj]
+
+    def put(self, browser: Union[Browser, str], profile_name: str, fingerprint: Optional[tuple],
+            wa_profile_obj: list[dict[str, str]]) -> bool:
+        if fingerprint is None:
+            return False
+        session = SessionObject([dict(idb_entry) for idb_entry in wa_profile_obj])
+        entry_bytes = session.get_footprint()['total_bytes']
+        key = self.__make_key(browser, profile_name)
+        with self.__lock:
+            if key in self.__entries:
+                self.__drop(key)
+            if entry_bytes > self.__max_bytes:
+                return False
+            while self.__total_bytes + entry_bytes > self.__max_bytes:
+                self.__drop(next(iter(self.__entries)))
+                self.__stats['evictions'] += 1
+            self.__entries[key] = {'fingerprint': fingerprint, 'stored_at': time.monotonic(),
+                                   'bytes': entry_bytes, 'session': session}
+            self.__total_bytes += entry_bytes
+        return True
+
+    def invalidate(self, browser: Optional[Union[Browser, str]] = None,
+                   profile_name: Optional[str] = None) -> int:
+        with self.__lock:
+            if browser is None and profile_name is None:
+                removed = len(self.__entries)
+                self.__entries.clear()
+                self.__total_bytes = 0
+                return removed
+            browser_name = self.__make_key(browser, '')[0] if browser is not None else None
+            keys = [key for key in self.__entries
+                    if (browser_name is None or key[0] == browser_name) and
+                    (profile_name is None or key[1] == profile_name)]
+            for key in keys:
+                self.__drop(key)
+            return len(keys)
+
+    def get_stats(self) -> dict[str, int]:
+        with self.__lock:
+            return dict(self.__stats, entries=len(self.__entries), bytes=self.__total_bytes)
+
+    def __len__(self) -> int:
+        return len(self.__entries)
+
+
+class _NullPhase:
+    # Returned instead of a real phase while metrics are disabled, so instrumentation costs nothing.
+    def __enter__(self) -> '_NullPhase':
+        return self
+
+    def __exit__(self, *args) -> bool:
+        return False
+
+    def add_payload(self, payload) -> NoReturn:
+        pass
+
+
+_NULL_PHASE = _NullPhase()
+
+
+class _MetricsPhase:
+    def __init__(self, metrics: 'SessionMetrics', name: str):
+        self.__metrics = metrics
+        self.__name = name
+        self.__payload = None
+        self.__started = 0.0
+        self.__driver_calls = 0
+
+    def __enter__(self) -> '_MetricsPhase':
+        self.__driver_calls = self.__metrics.get_thread_driver_calls()
+        self.__started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> bool:
+        seconds = time.perf_counter() - self.__started
+        payload_bytes = None
+        if self.__payload is not None:
+            payload_bytes = len(json.dumps(self.__payload, separators=(',', ':')))
+        self.__metrics.record_phase(self.__name, seconds, payload_bytes,
+                                    self.__metrics.get_thread_driver_calls() - self.__driver_calls,
+                                    exc_type is not None)
+        return False
+
+    def add_payload(self, payload) -> NoReturn:
+        # the size is only calculated when the phase ends
+        if isinstance(payload, SessionObject):
+            payload = payload.as_list()
+        self.__payload = payload
+
+
+class SessionMetrics:
+    __callbacks: list[Callable[[dict], NoReturn]]
+    __phases: dict[str, dict]
+    __driver_calls: int
+    __browser_rss: dict[str, int]
+    __lock: threading.Lock
+    __thread_state: threading.local
+
+    def __init__(self, callback: Optional[Callable[[dict], NoReturn]] = None):
+        self.__callbacks = [callback] if callback else []
+        self.__lock = threading.Lock()
+        self.__thread_state = threading.local()
+        self.reset()
+
+    def add_callback(self, callback: Callable[[dict], NoReturn]) -> NoReturn:
+        self.__callbacks.append(callback)
+
+    def reset(self) -> NoReturn:
+        with self.__lock:
+            self.__phases = {}
+            self.__driver_calls = 0
+            self.__browser_rss = {'count': 0, 'bytes_last': 0, 'bytes_max': 0, 'bytes_total': 0}
+
+    def phase(self, name: str) -> _MetricsPhase:
+        return _MetricsPhase(self, name)
+
+    def count_driver_call(self) -> NoReturn:
+        self.__thread_state.driver_calls = getattr(self.__thread_state, 'driver_calls', 0) + 1
+        with self.__lock:
+            self.__driver_calls += 1
+
+    def get_thread_driver_calls(self) -> int:
+        return getattr(self.__thread_state, 'driver_calls', 0)
+
+    def record_phase(self, name: str, seconds: float, payload_bytes: Optional[int] = None, driver_calls: int = 0,
+                     failed: bool = False) -> NoReturn:
+        with self.__lock:
+            phase = self.__phases.setdefault(name, {'count': 0, 'errors': 0, 'seconds_total': 0.0,
+                                                    'seconds_max': 0.0, 'seconds_last': 0.0, 'payload_bytes_total': 0,
+                                                    'driver_calls_total': 0})
+            phase['count'] += 1
+            phase['errors'] += int(failed)
+            phase['seconds_total'] += seconds
+            phase['seconds_max'] = max(phase['seconds_max'], seconds)
+            phase['seconds_last'] = seconds
+            phase['payload_bytes_total'] += payload_bytes or 0
+            phase['driver_calls_total'] += driver_calls
+        event = {'phase': name, 'seconds': seconds, 'payload_bytes': payload_bytes, 'driver_calls': driver_calls,
+                 'failed': failed, 'timestamp': time.time()}
+        for callback in self.__callbacks:
+            callback(event)
+
+    def record_rss(self, rss_bytes: int) -> NoReturn:
+        with self.__lock:
+            self.__browser_rss['count'] += 1
+            self.__browser_rss['bytes_last'] = rss_bytes
+            self.__browser_rss['bytes_max'] = max(self.__browser_rss['bytes_max'], rss_bytes)
+            self.__browser_rss['bytes_total'] += rss_bytes
+        event = {'browser_rss_bytes': rss_bytes, 'timestamp': time.time()}
+        for callback in self.__callbacks:
+            callback(event)
+
+    def snapshot(self) -> dict:
+        with self.__lock:
+            return {'driver_calls_total': self.__driver_calls,
+                    'browser_rss': dict(self.__browser_rss),
+                    'phases': {name: dict(phase) for name, phase in self.__phases.items()}}
+
+    def to_json(self) -> str:
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self, prefix: str = 'wawebsession') -> str:
+        snapshot = self.snapshot()
+        lines = ['# HELP %s_driver_calls_total WebDriver round trips.' % prefix,
+                 '# TYPE %s_driver_calls_total counter' % prefix,
+                 '%s_driver_calls_total %s' % (prefix, snapshot['driver_calls_total'])]
+        for field, metric_suffix, metric_type, help_text in (
+                ('count', 'runs_total', 'counter', 'Number of times a phase ran.'),
+                ('errors', 'errors_total', 'counter', 'Number of times a phase failed.'),
+                ('seconds_total', 'seconds_total', 'counter', 'Seconds spent in a phase.'),
+                ('seconds_max', 'seconds_max', 'gauge', 'Longest duration of a phase in seconds.'),
+                ('payload_bytes_total', 'payload_bytes_total', 'counter', 'Bytes of session data handled by a phase.'),
+                ('driver_calls_total', 'driver_calls_total', 'counter', 'WebDriver round trips made by a phase.')):
+            metric_name = '%s_phase_%s' % (prefix, metric_suffix)
+            lines.append('# HELP %s %s' % (metric_name, help_text))
+            lines.append('# TYPE %s %s' % (metric_name, metric_type))
+            for phase_name, phase in sorted(snapshot['phases'].items()):
+                lines.append('%s{phase="%s"} %s' % (metric_name, phase_name, phase[field]))
+        if snapshot['browser_rss']['count']:
+            for field, help_text in (('bytes_last', 'Resident memory of the last measured browser.'),
+                                     ('bytes_max', 'Highest resident memory of a browser.')):
+                metric_name = '%s_browser_rss_%s' % (prefix, field)
+                lines.append('# HELP %s %s' % (metric_name, help_text))
+                lines.append('# TYPE %s gauge' % metric_name)
+                lines.append('%s %s' % (metric_name, snapshot['browser_rss'][field]))
+        return '\n'.join(lines) + '\n'
+
+
+class _InstrumentedDriver:
+    # Counts the WebDriver round trips of a driver while metrics are enabled.
+    __ROUND_TRIPS = frozenset((
+        'execute_script', 'execute_async_script', 'execute_cdp_cmd', 'get', 'refresh', 'quit', 'close',
+        'find_element', 'find_elements', 'set_script_timeout', 'current_url', 'current_window_handle',
+        'window_handles', 'switch_to',
+    ))
+
+    def __init__(self, driver: Union[c_wd.WebDriver, f_wd.WebDriver], metrics: SessionMetrics):
+        self.__dict__['_InstrumentedDriver__wrapped_driver'] = driver
+        self.__dict__['_InstrumentedDriver__metrics'] = metrics
+
+    def __getattr__(self, name: str):
+        if name in self.__ROUND_TRIPS:
+            self.__metrics.count_driver_call()
+        return getattr(self.__wrapped_driver, name)
+
+    def __setattr__(self, name: str, value) -> NoReturn:
+        setattr(self.__wrapped_driver, name, value)
+
+    @staticmethod
+    def unwrap(driver):
+        if isinstance(driver, _InstrumentedDriver):
+            return driver.__wrapped_driver
+        return driver
+
+
+class DriverPool:
+    __launcher: Callable[[], Union[c_wd.WebDriver, f_wd.WebDriver]]
+    __size: int
+    __max_uses: int
+    __idle_drivers: queue.LifoQueue
+    __use_count: dict[int, int]
+    __lock: threading.Lock
+    __slots: threading.Semaphore
+    __closed = False
+    log: logging.Logger
+
+    def __init__(self, launcher: Callable[[], Union[c_wd.WebDriver, f_wd.WebDriver]], size: int = 1,
+                 max_uses: int = 10, log: Optional[logging.Logger] = None):
+        if not isinstance(size, int) or size < 1:
+            raise ValueError('The pool size has to be a positive integer.')
+        if not isinstance(max_uses, int) or max_uses < 1:
+            raise ValueError('max_uses has to be a positive integer.')
+        self.__launcher = launcher
+        self.__size = size
+        self.__max_uses = max_uses
+        self.__idle_drivers = queue.LifoQueue()
+        self.__use_count = {}
+        self.__lock = threading.Lock()
+        self.__slots = threading.Semaphore(size)
+        self.log = log if log else logging.getLogger('WaWebSession:DriverPool')
+
+    @staticmethod
+    def __is_healthy(driver: Union[c_wd.WebDriver, f_wd.WebDriver]) -> bool:
+        try:
+            _ = driver.current_window_handle
+            return driver.execute_script('return 1;') == 1
+        except _selenium_exceptions().WebDriverException:
+            return False
+
+    def __discard(self, driver: Union[c_wd.WebDriver, f_wd.WebDriver]) -> NoReturn:
+        with self.__lock:
+            self.__use_count.pop(id(driver), None)
+        try:
+            driver.quit()
+        except _selenium_exceptions().WebDriverException:
+            pass
+
+    def __launch(self) -> Union[c_wd.WebDriver, f_wd.WebDriver]:
+        self.log.debug('Launching pooled browser...')
+        driver = self.__launcher()
+        with self.__lock:
+            self.__use_count[id(driver)] = 0
+        return driver
+
+    def __reset(self, driver: Union[c_wd.WebDriver, f_wd.WebDriver]) -> bool:
+        try:
+            driver.set_script_timeout(10)
+            cleared = driver.execute_async_script(_JS_RESET_WA_STORAGE)
+            driver.get('about:blank')
+            return bool(cleared)
+        except _selenium_exceptions().WebDriverException:
+            return False
+
+    def warm_up(self) -> NoReturn:
+        while True:
+            with self.__lock:
+                if self.__closed or len(self.__use_count) >= self.__size:
+                    break
+            self.__idle_drivers.put(self.__launch())
+        self.log.debug('Driver pool is ready. [SIZE: %s]', self.__size)
+
+    def acquire(self, timeout: Optional[float] = None) -> Union[c_wd.WebDriver, f_wd.WebDriver]:
+        if self.__closed:
+            raise RuntimeError('The driver pool has already been shut down.')
+        if not self.__slots.acquire(timeout=timeout):
+            raise TimeoutError('No pooled browser became available within %s seconds.' % timeout)
+        try:
+            while True:
+                try:
+                    driver = self.__idle_drivers.get_nowait()
+                except queue.Empty:
+                    return self.__launch()
+                if self.__is_healthy(driver):
+                    return driver
+                self.log.debug('Pooled browser failed the health check, replacing it...')
+                self.__discard(driver)
+        except BaseException:
+            self.__slots.release()
+            raise
+
+    def release(self, driver: Union[c_wd.WebDriver, f_wd.WebDriver], healthy: bool = True) -> NoReturn:
+        try:
+            with self.__lock:
+                uses = self.__use_count.get(id(driver), 0) + 1
+                self.__use_count[id(driver)] = uses
+            if self.__closed or not healthy or uses >= self.__max_uses:
+                self.log.debug('Recycling pooled browser... [USES: %s]', uses)
+                self.__discard(driver)
+            elif not self.__reset(driver):
+                self.log.debug('Pooled browser could not be reset, recycling it...')
+                self.__discard(driver)
+            else:
+                self.__idle_drivers.put(driver)
+        finally:
+            self.__slots.release()
+
+    def shutdown(self) -> NoReturn:
+        self.__closed = True
+        self.log.debug('Shutting down driver pool...')
+        while True:
+            try:
+                self.__discard(self.__idle_drivers.get_nowait())
+            except queue.Empty:
+                break
+
+
+class ReadinessDetector:
+    # the chat list, with the selector used by older versions of this module as the last resort
+    DEFAULT_READY_SELECTORS = (
+        '#pane-side',
+        '[data-testid="chat-list"]',
+        '[aria-label="Chat list"]',
+        'div._2DPZK:nth-child(3)',
+    )
+    # the QR code is only shown if WhatsApp Web did not accept the session
+    DEFAULT_LOGGED_OUT_SELECTORS = (
+        'canvas[aria-label="Scan me!"]',
+        '[data-testid="qrcode"]',
+        'div[data-ref] canvas',
+    )
+    DEFAULT_LOGGED_OUT_STORAGE_KEYS = ('WASecretBundle', 'last-wid-md', 'last-wid')
+    __ready_selectors: list[str]
+    __logged_out_selectors: list[str]
+    __ready_storage_keys: list[str]
+    __logged_out_storage_keys: list[str]
+    __timeout: float
+    __poll_interval: float
+    __use_mutation_observer: bool
+
+    def __init__(self, ready_selectors: Optional[Iterable[str]] = None,
+                 logged_out_selectors: Optional[Iterable[str]] = None, ready_storage_keys: Iterable[str] = (),
+                 logged_out_storage_keys: Optional[Iterable[str]] = None, timeout: float = 60,
+                 poll_interval: float = 0.5, use_mutation_observer: bool = True):
+        if timeout <= 0 or poll_interval <= 0:
+            raise ValueError('timeout and poll_interval have to be positive numbers.')
+        self.__ready_selectors = list(self.DEFAULT_READY_SELECTORS if ready_selectors is None else ready_selectors)
+        self.__logged_out_selectors = list(self.DEFAULT_LOGGED_OUT_SELECTORS if logged_out_selectors is None
+                                           else logged_out_selectors)
+        self.__ready_storage_keys = list(ready_storage_keys)
+        self.__logged_out_storage_keys = list(self.DEFAULT_LOGGED_OUT_STORAGE_KEYS if logged_out_storage_keys is None
+                                              else logged_out_storage_keys)
+        self.__timeout = timeout
+        self.__poll_interval = poll_interval
+        self.__use_mutation_observer = use_mutation_observer
+        if not self.__ready_selectors and not self.__ready_storage_keys:
+            raise ValueError('At least one ready selector or ready storage key is required.')
+
+    def get_timeout(self) -> float:
+        return self.__timeout
+
+    def get_config(self) -> dict:
+        return {
+            'readySelectors': list(self.__ready_selectors),
+            'loggedOutSelectors': list(self.__logged_out_selectors),
+            'readyStorageKeys': list(self.__ready_storage_keys),
+            'loggedOutStorageKeys': list(self.__logged_out_storage_keys),
+            'timeout': self.__timeout,
+            'pollInterval': self.__poll_interval,
+            'useMutationObserver': self.__use_mutation_observer,
+        }
+
+    def wait(self, driver: Union[c_wd.WebDriver, f_wd.WebDriver]) -> dict:
+        # Returns {'ready': bool, 'strategy': str, 'detail': Optional[str], 'seconds': float}, strategies that
+        # report a usable page are selector, mutation and storage, the others are qr_code, logged_out and timeout.
+        started = time.monotonic()
+        # NOTE: The page stops waiting on its own, the extra seconds only cover a page that doesn't respond at all.
+        driver.set_script_timeout(self.__timeout + 10)
+        try:
+            result = driver.execute_async_script(_JS_WAIT_FOR_READY, self.get_config())
+        except _selenium_exceptions().TimeoutException:
+            result = None
+        if not isinstance(result, dict) or not isinstance(result.get('result'), dict):
+            return {'ready': False, 'strategy': 'timeout', 'detail': None, 'seconds': time.monotonic() - started}
+        return {
+            'ready': bool(result['result'].get('ready')),
+            'strategy': str(result['result'].get('strategy')),
+            'detail': result['result'].get('detail'),
+            'seconds': time.monotonic() - started,
+        }
+
+
 class SessionHandler:
     __URL = 'https://web.whatsapp.com/'
     __browser_choice = 0
     __log_level: int
     __browser_user_dir: str
     __browser_profile_list: list[str]
-    __browser_options: Union[c_op.Options, f_op.Options]
+    __profile_catalog: ProfileCatalog
     __driver: Union[c_wd.WebDriver, f_wd.WebDriver] = None
     __custom_driver = False
+    __driver_pool: Optional[DriverPool] = None
+    __pool_acquire_timeout: Optional[float] = None
+    __pooled_driver = False
+    __idb_timeout = 30
+    __idb_chunk_size = 500
+    __login_timeout: Optional[Union[int, float]] = 300
+    __LOGIN_POLL_MIN = 0.25
+    __LOGIN_POLL_MAX = 2
+    __delta_compact_threshold = 20
+    __metrics: Optional[SessionMetrics] = None
+    __cancel_event: threading.Event
+    __active_workers: set['SessionHandler']
+    __workers_lock: threading.Lock
+    __profile_errors: dict[str, Exception]
+    __result_cache: Optional[SessionCache] = None
+    __use_snapshots: bool = False
+    __launch_profile: LaunchProfile = LaunchProfile.DEFAULT
+    __readiness_detector: ReadinessDetector = ReadinessDetector()
+    __last_readiness: Optional[dict] = None
+    __snapshot_dir: Optional[str] = None
+    __snapshot: Optional[ProfileSnapshot] = None
     log: logging.Logger
 
     @staticmethod
-    def verify_profile_object(profile_obj: Union[list[dict[str, str]], list[str]]) -> bool:
+    def verify_profile_object(profile_obj: Union[list[dict[str, str]], list[str], 'SessionObject']) -> bool:
+        if isinstance(profile_obj, SessionObject):
+            return profile_obj.is_valid
         for entry in profile_obj:
             if isinstance(entry, str):
                 if 'WASecretBundle' in entry:
@@ -54,7 +1967,9 @@ class SessionHandler:
         return idb_list
 
     @staticmethod
-    def convert_idb_to_ls_obj(idb_obj: list[dict[str, str]]) -> dict[str, str]:
+    def convert_idb_to_ls_obj(idb_obj: Union[list[dict[str, str]], 'SessionObject']) -> Mapping[str, str]:
+        if isinstance(idb_obj, SessionObject):
+            return idb_obj.as_ls_dict()
         ls_dict = {}
         for idb_entry in idb_obj:
             ls_dict[idb_entry['key']] = idb_entry['value']
@@ -73,31 +1988,165 @@ class SessionHandler:
                     return second_cmp_obj
         return load_ls_obj
 
+    @staticmethod
+    def diff_ls_objects(old_ls_obj: dict[str, str], new_ls_obj: dict[str, str]) -> dict:
+        diff = {'added': {}, 'changed': {}, 'removed': []}
+        for ls_key, ls_val in new_ls_obj.items():
+            if ls_key not in old_ls_obj:
+                diff['added'][ls_key] = ls_val
+            elif old_ls_obj[ls_key] != ls_val:
+                diff['changed'][ls_key] = ls_val
+        for ls_key in old_ls_obj.keys():
+            if ls_key not in new_ls_obj:
+                diff['removed'].append(ls_key)
+        return diff
+
+    @staticmethod
+    def merge_ls_objects(load_ls_obj: dict[str, str],
+                         first_cmp_obj: dict[str, str], second_cmp_obj: dict[str, str]) -> dict[str, str]:
+        # same priority as get_newer_obj_from_ls_cmp, but decided for every key on its own
+        merged_ls_obj = {}
+        for ls_key, ls_val in load_ls_obj.items():
+            if ls_key in first_cmp_obj and first_cmp_obj[ls_key] != ls_val:
+                merged_ls_obj[ls_key] = first_cmp_obj[ls_key]
+            elif ls_key in second_cmp_obj and second_cmp_obj[ls_key] != ls_val:
+                merged_ls_obj[ls_key] = second_cmp_obj[ls_key]
+            elif ls_key in first_cmp_obj or ls_key in second_cmp_obj:
+                merged_ls_obj[ls_key] = ls_val
+        for cmp_obj in (first_cmp_obj, second_cmp_obj):
+            for ls_key, ls_val in cmp_obj.items():
+                if ls_key not in load_ls_obj and ls_key not in merged_ls_obj:
+                    merged_ls_obj[ls_key] = ls_val
+        return merged_ls_obj
+
+    @staticmethod
+    def get_account_id(wa_profile_obj: Union[list[dict[str, str]], 'SessionObject']) -> Optional[str]:
+        if isinstance(wa_profile_obj, SessionObject):
+            return wa_profile_obj.account_id
+        return _account_id_from_ls_obj(SessionHandler.convert_idb_to_ls_obj(wa_profile_obj))
+
+    @staticmethod
+    def get_content_hash(wa_profile_obj: Union[list[dict[str, str]], 'SessionObject']) -> str:
+        if isinstance(wa_profile_obj, SessionObject):
+            return wa_profile_obj.content_hash
+        content_hash = hashlib.sha256()
+        for entry in sorted(wa_profile_obj, key=lambda idb_entry: str(idb_entry.get('key', ''))):
+            content_hash.update(json.dumps(entry, sort_keys=True, separators=(',', ':')).encode('utf-8'))
+            content_hash.update(b'\n')
+        return content_hash.hexdigest()
+
+    @staticmethod
+    def get_profile_file_format(file_path: str) -> tuple[SessionFileFormat, Optional[str]]:
+        compact_header = _read_compact_header(file_path)
+        if compact_header is None:
+            return SessionFileFormat.JSON, None
+        return SessionFileFormat.COMPACT, compact_header[1]
+
+    @staticmethod
+    def iter_profile_file(file_path: str):
+        file_path = os.path.normpath(file_path)
+        changed_entries, removed_keys, _ = _read_delta_log(file_path)
+        if _read_compact_header(file_path) is not None:
+            with open(file_path, 'rb') as file:
+                yield from _apply_delta(_iter_compact_session(file), changed_entries, removed_keys)
+        else:
+            with open(file_path, 'r') as file:
+                yield from _apply_delta(json.load(file), changed_entries, removed_keys)
+
+    @staticmethod
+    def load_profile(file_path: str) -> Union[list[dict[str, str]], dict[str, list[dict[str, str]]]]:
+        file_path = os.path.normpath(file_path)
+        if _read_compact_header(file_path) is not None:
+            with open(file_path, 'rb') as file:
+                wa_profile_obj = list(_iter_compact_session(file))
+        else:
+            with open(file_path, 'r') as file:
+                wa_profile_obj = json.load(file)
+        if isinstance(wa_profile_obj, list):
+            changed_entries, removed_keys, delta_count = _read_delta_log(file_path)
+            if delta_count > 0:
+                wa_profile_obj = list(_apply_delta(wa_profile_obj, changed_entries, removed_keys))
+        return wa_profile_obj
+
+    @staticmethod
+    def append_profile_delta(file_path: str, diff: dict) -> bool:
+        changed_entries = dict(diff.get('added', {}))
+        changed_entries.update(diff.get('changed', {}))
+        removed_keys = list(diff.get('removed', []))
+        if not changed_entries and not removed_keys:
+            return False
+        delta = {'saved_at': time.time(), 'set': changed_entries, 'removed': removed_keys}
+        with open(os.path.normpath(file_path) + _DELTA_SUFFIX, 'a') as file:
+            file.write(json.dumps(delta, separators=(',', ':')) + '\n')
+            file.flush()
+            os.fsync(file.fileno())
+        return True
+
+    @staticmethod
+    def compact_profile_file(file_path: str) -> bool:
+        file_path = os.path.normpath(file_path)
+        delta_path = file_path + _DELTA_SUFFIX
+        if not os.path.isfile(delta_path):
+            return False
+        file_format, compression = SessionHandler.get_profile_file_format(file_path)
+        wa_profile_obj = SessionHandler.load_profile(file_path)
+        tmp_path = file_path + '.tmp'
+        SessionHandler.write_profile_file(wa_profile_obj, tmp_path, file_format, compression)
+        os.replace(tmp_path, file_path)
+        os.remove(delta_path)
+        return True
+
+    @staticmethod
+    def write_profile_file(wa_profile_obj: list[dict[str, str]], file_path: str,
+                           file_format: SessionFileFormat = SessionFileFormat.JSON,
+                           compression: Optional[str] = None) -> NoReturn:
+        file_path = os.path.normpath(file_path)
+        if isinstance(wa_profile_obj, SessionObject):
+            wa_profile_obj = wa_profile_obj.as_list()
+        if file_format == SessionFileFormat.COMPACT:
+            # NOTE: The compact format holds one session, a dict of profiles would be written as its key names.
+            if not isinstance(wa_profile_obj, list) or not all(isinstance(entry, dict) for entry in wa_profile_obj):
+                raise TypeError('Only a single WaSession object can be written to a compact session file. '
+                                'Use save_profile() to write one file per profile.')
+            with open(file_path, 'wb') as file:
+                _write_compact_session(file, wa_profile_obj, compression)
+        elif file_format == SessionFileFormat.JSON:
+            if compression is not None:
+                raise ValueError('Compression is only supported by the compact file format.')
+            with open(file_path, 'w') as file:
+                json.dump(wa_profile_obj, file, indent=2)
+        else:
+            raise ValueError('The specified file format is invalid.')
+        # the whole session was written, so older deltas would only overwrite newer values
+        if os.path.isfile(file_path + _DELTA_SUFFIX):
+            os.remove(file_path + _DELTA_SUFFIX)
+
+    @staticmethod
+    def get_profile_file_path(file_path: str, profile_name: str) -> str:
+        # file of a single profile when several profiles are saved at once
+        file_path = os.path.normpath(file_path)
+        return os.path.join(os.path.dirname(file_path), os.path.basename(file_path) + '-' + profile_name)
+
+    @staticmethod
+    def convert_profile_file(source_path: str, target_path: str,
+                             file_format: SessionFileFormat = SessionFileFormat.COMPACT,
+                             compression: Optional[str] = None) -> int:
+        wa_profile_obj = SessionHandler.load_profile(source_path)
+        if not isinstance(wa_profile_obj, list):
+            raise TypeError('Only files containing a single WaSession object can be converted.')
+        SessionHandler.write_profile_file(wa_profile_obj, target_path, file_format, compression)
+        return len(wa_profile_obj)
+
     def __refresh_profile_list(self) -> NoReturn:
         if not self.__custom_driver:
             self.log.debug('Getting browser profiles...')
-            if self.__browser_choice == Browser.CHROME:
-                self.__browser_profile_list = ['']
-                for profile_dir in os.listdir(self.__browser_user_dir):
-                    if 'profile' in profile_dir.lower():
-                        if profile_dir != 'System Profile':
-                            self.__browser_profile_list.append(profile_dir)
-            elif self.__browser_choice == Browser.FIREFOX:
-                # TODO: consider reading out the profiles.ini
-                self.__browser_profile_list = []
-                for profile_dir in os.listdir(self.__browser_user_dir):
-                    if not profile_dir.endswith('.default'):
-                        if os.path.isdir(os.path.join(self.__browser_user_dir, profile_dir)):
-                            self.__browser_profile_list.append(profile_dir)
-
+            self.__browser_profile_list = self.__profile_catalog.get_profile_names()
             self.log.debug('Browser profiles registered.')
 
     def __init_browser(self) -> NoReturn:
         self.__custom_driver = False
         self.log.debug("Setting browser user dirs...")
         if self.__browser_choice == Browser.CHROME:
-            self.__browser_options = webdriver.ChromeOptions()
-
             if self.__platform == 'windows':
                 self.__browser_user_dir = os.path.join(os.environ['USERPROFILE'],
                                                        'Appdata', 'Local', 'Google', 'Chrome', 'User Data')
@@ -105,111 +2154,182 @@ class SessionHandler:
                 self.__browser_user_dir = os.path.join(os.environ['HOME'], '.config', 'google-chrome')
 
         elif self.__browser_choice == Browser.FIREFOX:
-            self.__browser_options = webdriver.FirefoxOptions()
-
             if self.__platform == 'windows':
                 self.__browser_user_dir = os.path.join(os.environ['APPDATA'], 'Mozilla', 'Firefox', 'Profiles')
-                self.__browser_profile_list = os.listdir(self.__browser_user_dir)
             elif self.__platform == 'linux':
                 self.__browser_user_dir = os.path.join(os.environ['HOME'], '.mozilla', 'firefox')
 
         self.log.debug('Browser user dirs set.')
-
-        self.__browser_options.headless = True
+        self.__profile_catalog = ProfileCatalog(self.__browser_choice, self.__browser_user_dir, self.log)
         self.__refresh_profile_list()
 
-    def __get_local_storage(self) -> dict[str, str]:
+    def __phase(self, name: str) -> Union[_MetricsPhase, _NullPhase]:
+        if self.__metrics is None:
+            return _NULL_PHASE
+        return self.__metrics.phase(name)
+
+    def __use_driver(self, driver: Union[c_wd.WebDriver, f_wd.WebDriver]) -> NoReturn:
+        driver = _InstrumentedDriver.unwrap(driver)
+        self.__driver = driver if self.__metrics is None else _InstrumentedDriver(driver, self.__metrics)
+
+    def __create_browser_options(self, headless: bool = True) -> Union[c_op.Options, f_op.Options]:
+        if self.__browser_choice == Browser.CHROME:
+            options = _webdriver().ChromeOptions()
+            if self.__launch_profile == LaunchProfile.LEAN:
+                for argument in _LEAN_CHROME_ARGUMENTS:
+                    options.add_argument(argument)
+                options.add_experimental_option('prefs', dict(_LEAN_CHROME_PREFS))
+        else:
+            options = _webdriver().FirefoxOptions()
+            if self.__launch_profile == LaunchProfile.LEAN:
+                for pref_name, pref_value in _LEAN_FIREFOX_PREFS.items():
+                    options.set_preference(pref_name, pref_value)
+        options.headless = headless
+        return options
+
+    def __apply_launch_profile(self, driver: Union[c_wd.WebDriver, f_wd.WebDriver]) -> NoReturn:
+        if self.__launch_profile == LaunchProfile.LEAN and self.__browser_choice == Browser.CHROME:
+            try:
+                driver.execute_cdp_cmd('Network.enable', {})
+                driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': _LEAN_BLOCKED_URLS})
+            except (AttributeError, _selenium_exceptions().WebDriverException) as e:
+                self.log.debug('Could not block heavy resources: %s', e)
+
+    def __launch_driver(self, options: Union[c_op.Options, f_op.Options]) -> Union[c_wd.WebDriver, f_wd.WebDriver]:
+        self.log.debug('Starting browser... [HEADLESS: %s, PROFILE: %s]', str(options.headless),
+                       self.__launch_profile.name)
+        user_dir = None
+        if self.__launch_profile == LaunchProfile.LEAN:
+            # NOTE: A throwaway profile in memory, so the browser doesn't write its caches to the disk.
+            user_dir = tempfile.mkdtemp(prefix='wawebsession-', dir=_get_memory_dir())
+            if self.__browser_choice == Browser.CHROME:
+                options.add_argument('user-data-dir=%s' % user_dir)
+            else:
+                options.add_argument('-profile')
+                options.add_argument(user_dir)
+        try:
+            if self.__browser_choice == Browser.CHROME:
+                driver = _webdriver().Chrome(options=options)
+            elif self.__browser_choice == Browser.FIREFOX:
+                driver = _webdriver().Firefox(options=options)
+            else:
+                raise ValueError('The specified browser is invalid.')
+        except BaseException:
+            if user_dir is not None:
+                shutil.rmtree(user_dir, ignore_errors=True)
+            raise
+        if user_dir is not None:
+            # the driver might be kept in the pool, so the profile is removed together with the driver object
+            weakref.finalize(driver, shutil.rmtree, user_dir, True)
+        self.__apply_launch_profile(driver)
+        return driver
+
+    def get_browser_rss(self) -> Optional[int]:
+        driver = _InstrumentedDriver.unwrap(self.__driver)
+        service_process = getattr(getattr(driver, 'service', None), 'process', None)
+        if service_process is None or self.__platform != 'linux':
+            return None
+        return _get_process_tree_rss(service_process.pid)
+
+    def __measure_rss(self) -> NoReturn:
+        if self.__metrics is not None:
+            rss_bytes = self.get_browser_rss()
+            if rss_bytes is not None:
+                self.log.debug('Browser memory usage: %s MiB', rss_bytes // (1024 * 1024))
+                self.__metrics.record_rss(rss_bytes)
+
+    def __get_local_storage(self, keys: Optional[list[str]] = None) -> dict[str, str]:
         self.log.debug('Executing getLS function...')
-        return self.__driver.execute_script('''
-        var waSession = {};
-        waLs = window.localStorage;
-        for (var i = 0; i < waLs.length; i++) {
-            waSession[waLs.key(i)] = waLs.getItem(waLs.key(i));
-        }
-        return waSession;
-        ''')
+        with self.__phase('ls_read') as phase:
+            wa_session_obj = self.__driver.execute_script(_JS_GET_LOCAL_STORAGE, keys)
+            phase.add_payload(wa_session_obj)
+        return wa_session_obj
+
+    def __set_local_storage(self, wa_session_obj: dict[str, str]) -> int:
+        self.log.debug('Executing setLS function...')
+        if not isinstance(wa_session_obj, dict):
+            wa_session_obj = dict(wa_session_obj)
+        with self.__phase('ls_write') as phase:
+            phase.add_payload(wa_session_obj)
+            written_keys = self.__driver.execute_script(_JS_SET_LOCAL_STORAGE, wa_session_obj)
+        if written_keys != len(wa_session_obj):
+            raise RuntimeError('Only %s of %s localStorage keys could be written.'
+                               % (written_keys, len(wa_session_obj)))
+        self.log.debug('Wrote %s keys to localStorage.', written_keys)
+        return written_keys
 
-    def __set_local_storage(self, wa_session_obj: dict[str, str]) -> NoReturn:
-        for ls_key, ls_val in wa_session_obj.items():
-            self.__driver.execute_script('window.localStorage.setItem(arguments[0], arguments[1]);',
-                                         ls_key, ls_val)
+    def __execute_idb_script(self, script: str, *args):
+        self.__driver.set_script_timeout(self.__idb_timeout)
+        try:
+            result = self.__driver.execute_async_script(script, *args)
+        except _selenium_exceptions().TimeoutException:
+            raise TimeoutError('The IDB operation did not finish within %s seconds.' % self.__idb_timeout) from None
+        if not isinstance(result, dict):
+            raise RuntimeError('The IDB operation returned an unexpected result: %s' % str(result))
+        if 'error' in result:
+            raise RuntimeError(result['error'])
+        return result['result']
 
     def __get_indexed_db_user(self) -> list[dict[str, str]]:
         self.log.debug('Executing getIDBObjects function...')
-        self.__driver.execute_script('''
-        document.waScript = {};
-        document.waScript.waSession = undefined;
-        function getAllObjects() {
-            document.waScript.dbName = "wawc";
-            document.waScript.osName = "user";
-            document.waScript.db = undefined;
-            document.waScript.transaction = undefined;
-            document.waScript.objectStore = undefined;
-            document.waScript.getAllRequest = undefined;
-            document.waScript.request = indexedDB.open(document.waScript.dbName);
-            document.waScript.request.onsuccess = function(event) {
-                document.waScript.db = event.target.result;
-                document.waScript.transaction = document.waScript.db.transaction(document.waScript.osName);
-                document.waScript.objectStore = document.waScript.transaction.objectStore(document.waScript.osName);
-                document.waScript.getAllRequest = document.waScript.objectStore.getAll();
-                document.waScript.getAllRequest.onsuccess = function(getAllEvent) {
-                    document.waScript.waSession = getAllEvent.target.result;
-                };
-            };
-        }
-        getAllObjects();
-        ''')
-        self.log.debug('Waiting until IDB operation finished...')
-        while not self.__driver.execute_script('return document.waScript.waSession != undefined;'):
-            time.sleep(1)
-        self.log.debug('Getting IDB results...')
-        wa_session_obj: list[dict[str, str]] = self.__driver.execute_script('return document.waScript.waSession;')
+        with self.__phase('idb_read') as phase:
+            wa_session_obj: list[dict[str, str]] = self.__execute_idb_script(_JS_IDB_GET_USER)
+            phase.add_payload(wa_session_obj)
+        self.log.debug('IDB operation finished.')
         # self.log.debug('Got IDB data: %s', wa_session_obj)
         return wa_session_obj
 
-    def __set_indexed_db_user(self, wa_session_obj: list[dict[str, str]]) -> NoReturn:
-        self.log.debug('Inserting setIDBObjects function...')
-        self.__driver.execute_script('''
-        document.waScript = {};
-        document.waScript.insertDone = 0;
-        document.waScript.jsonObj = undefined;
-        document.waScript.setAllObjects = function (_jsonObj) {
-            document.waScript.jsonObj = _jsonObj;
-            document.waScript.dbName = "wawc";
-            document.waScript.osName = "user";
-            document.waScript.db;
-            document.waScript.transaction;
-            document.waScript.objectStore;
-            document.waScript.clearRequest;
-            document.waScript.addRequest;
-            document.waScript.request = indexedDB.open(document.waScript.dbName);
-            document.waScript.request.onsuccess = function(event) {
-                document.waScript.db = event.target.result;
-                document.waScript.transaction = document.waScript.db.transaction(document.waScript.osName, "readwrite");
-                document.waScript.objectStore = document.waScript.transaction.objectStore(document.waScript.osName);
-                document.waScript.clearRequest = document.waScript.objectStore.clear();
-                document.waScript.clearRequest.onsuccess = function(clearEvent) {
-                    for (var i = 0; i < document.waScript.jsonObj.length; i++) {
-                        document.waScript.addRequest = document.waScript.objectStore.add(document.waScript.jsonObj[i]);
-                        document.waScript.addRequest.onsuccess = function(addEvent) {
-                            document.waScript.insertDone++;
-                        };
-                    }
-                };
-            };
-        }
-        ''')
-        self.log.debug('setIDBObjects function inserted.')
-
+    def __set_indexed_db_user(self, wa_session_obj: list[dict[str, str]]) -> dict[str, int]:
         # self.log.debug('Writing IDB data: %s', wa_session_obj)
         self.log.debug('Writing IDB data...')
-        self.__driver.execute_script('document.waScript.setAllObjects(arguments[0]);', wa_session_obj)
+        with self.__phase('idb_write') as phase:
+            phase.add_payload(wa_session_obj)
+            written_bytes = 0
+            chunk_count = 0
+            for chunk_start in range(0, max(len(wa_session_obj), 1), self.__idb_chunk_size):
+                chunk = wa_session_obj[chunk_start:chunk_start + self.__idb_chunk_size]
+                written_bytes += len(json.dumps(chunk, separators=(',', ':')))
+                self.__driver.execute_script(_JS_IDB_STAGE_RECORDS, chunk, chunk_start == 0)
+                chunk_count += 1
+            written_objects = self.__execute_idb_script(_JS_IDB_RESTORE_USER, len(wa_session_obj))
+        self.log.debug('Wrote %s objects (%s bytes in %s chunks) to IDB.', written_objects, written_bytes, chunk_count)
+        return {'records': written_objects, 'bytes': written_bytes, 'chunks': chunk_count}
+
+    def __is_logged_in(self) -> bool:
+        try:
+            return self.__execute_idb_script(_JS_IDB_HAS_LOGIN)
+        except RuntimeError:
+            # NOTE: WhatsApp Web creates the IDB while loading, so it might not exist yet.
+            return False
+
+    def __wait_for_login(self) -> NoReturn:
+        self.log.debug('Waiting for login...')
+        with self.__phase('login_wait'):
+            deadline = time.monotonic() + self.__login_timeout if self.__login_timeout else None
+            interval = self.__LOGIN_POLL_MIN
+            while not self.__is_logged_in():
+                if deadline is not None and time.monotonic() + interval > deadline:
+                    raise TimeoutError('Nobody logged in within %s seconds.' % self.__login_timeout)
+                self.__sleep(interval)
+                interval = min(interval * 1.5, self.__LOGIN_POLL_MAX)
+        self.log.debug('Login completed.')
 
-        self.log.debug('Waiting until all objects are written to IDB...')
-        # FIXME: This looks awful. Please find a way to make this look a little better.
-        while not self.__driver.execute_script(
-                'return (document.waScript.insertDone == document.waScript.jsonObj.length);'):
-            time.sleep(1)
+    def __wait_until_ready(self) -> NoReturn:
+        with self.__phase('page_ready'):
+            readiness = self.__readiness_detector.wait(self.__driver)
+        self.__last_readiness = readiness
+        self.log.debug('Readiness detected. [READY: %s, STRATEGY: %s, DETAIL: %s, SECONDS: %.2f]',
+                       readiness['ready'], readiness['strategy'], readiness['detail'], readiness['seconds'])
+        if self.__metrics is not None:
+            self.__metrics.record_phase('ready:' + readiness['strategy'], readiness['seconds'],
+                                        failed=not readiness['ready'])
+        if readiness['ready']:
+            return
+        if readiness['strategy'] == 'timeout':
+            raise TimeoutError('WhatsApp Web did not finish loading within %s seconds.'
+                               % self.__readiness_detector.get_timeout())
+        raise RuntimeError('WhatsApp Web did not accept the session. [STRATEGY: %s, DETAIL: %s]'
+                           % (readiness['strategy'], readiness['detail']))
 
     def __verify_profile_name_exists(self, profile_name: str) -> bool:
         # self.__refresh_profile_list()
@@ -226,15 +2346,17 @@ class SessionHandler:
 
     def __start_session(self, options: Optional[Union[c_op.Options, f_op.Options]] = None,
                         profile_name: Optional[str] = None, wait_for_login=True) -> NoReturn:
-        if not self.__custom_driver and options is None:
+        if not self.__custom_driver and self.__driver_pool is None and options is None:
             raise ValueError("Do not call this method without providing options for the webdriver.")
         if profile_name is None:
-            if not self.__custom_driver:
-                self.log.debug('Starting browser... [HEADLESS: %s]', str(options.headless))
-                if self.__browser_choice == Browser.CHROME:
-                    self.__driver = webdriver.Chrome(options=options)
-                elif self.__browser_choice == Browser.FIREFOX:
-                    self.__driver = webdriver.Firefox(options=options)
+            if self.__driver_pool is not None and not self.__custom_driver:
+                self.log.debug('Taking browser from the pool...')
+                with self.__phase('browser_launch'):
+                    self.__use_driver(self.__driver_pool.acquire(self.__pool_acquire_timeout))
+                    self.__pooled_driver = True
+            elif not self.__custom_driver:
+                with self.__phase('browser_launch'):
+                    self.__use_driver(self.__launch_driver(options))
             else:
                 self.log.debug('Checking if current browser window can be used...')
                 if self.__browser_choice == Browser.CHROME:
@@ -246,38 +2368,67 @@ class SessionHandler:
                         self.__driver.execute_script('window.open()')
                         self.__driver.switch_to.window(self.__driver.window_handles[-1])
 
-            self.log.debug('Loading WhatsApp Web...')
-            self.__driver.get(self.__URL)
+            try:
+                self.log.debug('Loading WhatsApp Web...')
+                with self.__phase('page_load'):
+                    self.__driver.get(self.__URL)
 
-            if wait_for_login:
-                self.log.debug('Waiting for login...')
-                while not self.verify_profile_object(self.__get_indexed_db_user()):
-                    time.sleep(1)
-                self.log.debug('Login completed.')
+                if wait_for_login:
+                    self.__wait_for_login()
+            except BaseException:
+                # NOTE: A failed start must not leave a browser open or a pool slot taken.
+                self.__abort_session()
+                raise
         else:
-            self.log.debug('Starting browser... [HEADLESS: %s]', str(options.headless))
-            if self.__browser_choice == Browser.CHROME:
-                options.add_argument('user-data-dir=%s' % os.path.join(self.__browser_user_dir, profile_name))
-                self.__driver = webdriver.Chrome(options=options)
-            elif self.__browser_choice == Browser.FIREFOX:
-                fire_profile = webdriver.FirefoxProfile(os.path.join(self.__browser_user_dir, profile_name))
-                self.__driver = webdriver.Firefox(fire_profile, options=options)
+            profile_dir = self.__get_profile_dir(profile_name)
+            if self.__use_snapshots:
+                with self.__phase('profile_snapshot'):
+                    self.__snapshot = ProfileSnapshot(self.__browser_choice, profile_dir, self.__snapshot_dir, self.log)
+                    profile_dir = self.__snapshot.create()
+
+            self.log.debug('Starting browser... [HEADLESS: %s]', str(options.headless))
+            try:
+                with self.__phase('browser_launch'):
+                    if self.__browser_choice == Browser.CHROME:
+                        options.add_argument('user-data-dir=%s' % profile_dir)
+                        self.__use_driver(_webdriver().Chrome(options=options))
+                    elif self.__browser_choice == Browser.FIREFOX and self.__snapshot is not None:
+                        # NOTE: The snapshot is a throwaway copy already, so the browser can use it directly.
+                        options.add_argument('-profile')
+                        options.add_argument(profile_dir)
+                        self.__use_driver(_webdriver().Firefox(options=options))
+                    elif self.__browser_choice == Browser.FIREFOX:
+                        fire_profile = _webdriver().FirefoxProfile(profile_dir)
+                        self.__use_driver(_webdriver().Firefox(fire_profile, options=options))
+            except Exception:
+                self.__remove_snapshot()
+                raise
+            try:
+                self.__apply_launch_profile(self.__driver)
 
-            self.log.debug('Loading WhatsApp Web...')
-            self.__driver.get(self.__URL)
+                self.log.debug('Loading WhatsApp Web...')
+                with self.__phase('page_load'):
+                    self.__driver.get(self.__URL)
+            except BaseException:
+                self.__abort_session()
+                raise
 
     def __start_visible_session(self, profile_name: Optional[str] = None, wait_for_login=True) -> NoReturn:
-        options = self.__browser_options
-        options.headless = False
+        # NOTE: Every session gets its own options, so arguments like user-data-dir don't pile up.
+        options = self.__create_browser_options(headless=False)
 
         if profile_name is not None:
             self.__verify_profile_name_exists(profile_name)
         self.__start_session(options, profile_name, wait_for_login)
 
-    def __start_invisible_session(self, profile_name: Optional[str] = None) -> NoReturn:
+    def __start_invisible_session(self, profile_name: Optional[str] = None, wait_for_login=True) -> NoReturn:
         if profile_name is not None:
             self.__verify_profile_name_exists(profile_name)
-        self.__start_session(self.__browser_options, profile_name)
+        self.__start_session(self.__create_browser_options(headless=True), profile_name, wait_for_login)
+
+    def __sleep(self, seconds: float) -> NoReturn:
+        if self.__cancel_event.wait(seconds):
+            raise InterruptedError('The session was cancelled.')
 
     def __get_profile_storage(self, profile_name: Optional[str] = None) -> list[dict[str, str]]:
         if profile_name is None:
@@ -288,17 +2439,147 @@ class SessionHandler:
         else:
             self.__start_invisible_session(profile_name)
 
-        indexed_db = self.__get_indexed_db_user()
+        try:
+            indexed_db = self.__get_indexed_db_user()
+            self.__measure_rss()
+        except BaseException:
+            self.__abort_session()
+            raise
 
-        if not self.__custom_driver:
+        self.__close_session()
+        return indexed_db
+
+    def __close_session(self, healthy: bool = True) -> NoReturn:
+        if self.__pooled_driver:
+            self.log.debug("Returning browser to the pool...")
+            self.__pooled_driver = False
+            self.__driver_pool.release(_InstrumentedDriver.unwrap(self.__driver), healthy)
+            self.__driver = None
+        elif not self.__custom_driver:
             self.log.debug("Closing browser...")
-            self.__driver.quit()
+            try:
+                self.__driver.quit()
+            finally:
+                self.__remove_snapshot()
         else:
             self.log.debug("Closing tab...")
             self.__driver.close()
             self.__driver.switch_to.window(self.__driver.window_handles[-1])
 
-        return indexed_db
+    def __abort_session(self) -> NoReturn:
+        try:
+            self.__close_session(healthy=False)
+        except _selenium_exceptions().WebDriverException as e:
+            self.log.debug('Could not close the browser after an error: %s', e)
+
+    def __remove_snapshot(self) -> NoReturn:
+        if self.__snapshot is not None:
+            self.log.debug('Removing profile snapshot...')
+            self.__snapshot.remove()
+            self.__snapshot = None
+
+    def __spawn_worker(self) -> 'SessionHandler':
+        worker = SessionHandler(browser=self.__browser_choice, log_level=self.__log_level)
+        worker.set_metrics(self.__metrics)
+        worker.set_profile_snapshots(self.__use_snapshots, self.__snapshot_dir)
+        worker.set_launch_profile(self.__launch_profile)
+        worker.set_readiness_detector(self.__readiness_detector)
+        worker.set_result_cache(self.__result_cache)
+        worker.set_url(self.__URL)
+        worker.set_idb_timeout(self.__idb_timeout)
+        worker.set_idb_chunk_size(self.__idb_chunk_size)
+        worker.set_login_timeout(self.__login_timeout)
+        worker.set_delta_compact_threshold(self.__delta_compact_threshold)
+        # NOTE: Shared, so cancel() also stops the workers.
+        worker.__cancel_event = self.__cancel_event
+        return worker
+
+    def __get_profile_dir(self, profile_name: str) -> str:
+        return os.path.join(self.__browser_user_dir, profile_name)
+
+    def get_offline_session(self, profile_name: str) -> list[dict[str, str]]:
+        if self.__custom_driver:
+            raise AssertionError('Do not call this method if you are using a custom webdriver.')
+        self.__verify_profile_name_exists(profile_name)
+        self.log.debug('Reading WhatsApp Web IDB from disk... [PROFILE: %s]', profile_name)
+        if self.__use_snapshots:
+            with ProfileSnapshot(self.__browser_choice, self.__get_profile_dir(profile_name), self.__snapshot_dir,
+                                 self.log) as snapshot_dir:
+                wa_profile_obj = OfflineSessionReader.read_profile(self.__browser_choice, snapshot_dir)
+        else:
+            wa_profile_obj = OfflineSessionReader.read_profile(self.__browser_choice,
+                                                               self.__get_profile_dir(profile_name))
+        self.log.debug('Read %s objects from disk.', len(wa_profile_obj))
+        return wa_profile_obj
+
+    def __get_offline_storage(self, profile_list: list[str]) -> dict[str, list[dict[str, str]]]:
+        profile_storage_dict = {}
+        for profile in profile_list:
+            try:
+                wa_profile_obj = self.get_offline_session(profile)
+            except (OSError, ValueError, LookupError, struct.error, sqlite3.Error) as e:
+                self.log.debug('Could not read profile %s from disk, falling back to the browser: %s', profile, e)
+                continue
+            if self.verify_profile_object(wa_profile_obj):
+                profile_storage_dict[profile] = wa_profile_obj
+            else:
+                self.log.debug('No session found on disk for profile %s, falling back to the browser.', profile)
+        return profile_storage_dict
+
+    def __get_cached_storage(self, profile_list: list[str]) -> dict[str, list[dict[str, str]]]:
+        profile_storage_dict = {}
+        for profile in profile_list:
+            fingerprint = OfflineSessionReader.get_idb_fingerprint(self.__browser_choice,
+                                                                   self.__get_profile_dir(profile))
+            wa_profile_obj = self.__result_cache.get(self.__browser_choice, profile, fingerprint)
+            if wa_profile_obj is not None:
+                self.log.debug('Using the cached session of profile %s, its IDB did not change.', profile)
+                profile_storage_dict[profile] = wa_profile_obj
+        return profile_storage_dict
+
+    def __cache_storage(self, profile_storage_dict: dict[str, list[dict[str, str]]]) -> NoReturn:
+        for profile, wa_profile_obj in profile_storage_dict.items():
+            # NOTE: The fingerprint is taken after the extraction, because loading WhatsApp Web changes the IDB files.
+            fingerprint = OfflineSessionReader.get_idb_fingerprint(self.__browser_choice,
+                                                                   self.__get_profile_dir(profile))
+            if not self.__result_cache.put(self.__browser_choice, profile, fingerprint, wa_profile_obj):
+                self.log.debug('Could not cache the session of profile %s.', profile)
+
+    def __get_profile_storage_worker(self, profile_name: str) -> list[dict[str, str]]:
+        worker = self.__spawn_worker()
+        with self.__workers_lock:
+            self.__active_workers.add(worker)
+        try:
+            return worker.__get_profile_storage(profile_name)
+        except Exception:
+            if worker.__driver is not None:
+                try:
+                    worker.__driver.quit()
+                except _selenium_exceptions().WebDriverException:
+                    pass
+            worker.__remove_snapshot()
+            raise
+        finally:
+            with self.__workers_lock:
+                self.__active_workers.discard(worker)
+
+    def __get_profile_storage_parallel(self, profile_list: list[str],
+                                       max_workers: int) -> dict[str, list[dict[str, str]]]:
+        profile_storage_dict = {}
+        self.log.info('Extracting %s profiles using up to %s browsers...', len(profile_list), max_workers)
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='WaWebSession') as executor:
+            future_dict = {
+                executor.submit(self.__get_profile_storage_worker, profile): profile for profile in profile_list
+            }
+            for future in as_completed(future_dict):
+                profile = future_dict[future]
+                try:
+                    profile_storage_dict[profile] = future.result()
+                    self.log.debug('Extracted profile: %s', profile)
+                except Exception as e:
+                    self.log.error('Could not extract profile %s: %s', profile, e)
+                    self.__profile_errors[profile] = e
+        return profile_storage_dict
 
     def __init__(self, browser: Optional[Union[Browser, str]] = None,
                  driver: Optional[Union[c_wd.WebDriver, f_wd.WebDriver]] = None,
@@ -306,10 +2587,12 @@ class SessionHandler:
         self.log = logging.getLogger('WaWebSession:SessionHandler')
         log_format = logging.Formatter('%(asctime)s [%(levelname)s] (%(funcName)s): %(message)s')
 
-        log_stream = logging.StreamHandler()
-        log_stream.setLevel(logging.DEBUG)
-        log_stream.setFormatter(log_format)
-        self.log.addHandler(log_stream)
+        # NOTE: The logger is shared between instances, so only attach the handler once.
+        if not self.log.handlers:
+            log_stream = logging.StreamHandler()
+            log_stream.setLevel(logging.DEBUG)
+            log_stream.setFormatter(log_format)
+            self.log.addHandler(log_stream)
 
         if log_level:
             self.set_log_level(log_level)
@@ -317,13 +2600,20 @@ class SessionHandler:
             self.__log_level = logging.WARNING
             self.log.setLevel(self.__log_level)
 
+        self.__profile_errors = {}
+        self.__cancel_event = threading.Event()
+        self.__active_workers = set()
+        self.__workers_lock = threading.Lock()
+
         self.__platform = platform.system().lower()
         if self.__platform != 'windows' and self.__platform != 'linux':
             raise OSError('Only Windows and Linux are supported for now.')
         self.log.debug('Detected platform: %s', self.__platform)
 
         if driver:
-            self.set_custom_webdriver(driver)
+            if isinstance(browser, str):
+                browser = Browser[browser.upper()]
+            self.set_custom_webdriver(driver, browser)
         else:
             if browser:
                 self.set_browser(browser)
@@ -371,15 +2661,119 @@ class SessionHandler:
 
         self.log.setLevel(self.__log_level)
 
-    def set_custom_webdriver(self, driver: Union[c_wd.WebDriver, f_wd.WebDriver]) -> NoReturn:
-        if isinstance(driver, c_wd.WebDriver):
+    def cancel(self) -> NoReturn:
+        self.log.debug('Cancelling session...')
+        self.__cancel_event.set()
+        with self.__workers_lock:
+            workers = list(self.__active_workers)
+        for worker in workers:
+            worker.cancel()
+        if self.__driver is not None and not self.__custom_driver and not self.__pooled_driver:
+            # quitting the browser makes pending WebDriver calls return
+            try:
+                self.__driver.quit()
+            except _selenium_exceptions().WebDriverException:
+                pass
+
+    def set_metrics(self, metrics: Optional[SessionMetrics]) -> NoReturn:
+        self.__metrics = metrics
+        if self.__driver is not None:
+            self.__use_driver(self.__driver)
+
+    def get_metrics(self) -> Optional[SessionMetrics]:
+        return self.__metrics
+
+    def set_readiness_detector(self, detector: Optional[ReadinessDetector]) -> NoReturn:
+        self.__readiness_detector = detector if detector is not None else ReadinessDetector()
+
+    def get_readiness_detector(self) -> ReadinessDetector:
+        return self.__readiness_detector
+
+    def get_last_readiness(self) -> Optional[dict]:
+        return dict(self.__last_readiness) if self.__last_readiness else None
+
+    def set_launch_profile(self, launch_profile: Union[LaunchProfile, str]) -> NoReturn:
+        if isinstance(launch_profile, str):
+            launch_profile = LaunchProfile[launch_profile.upper()]
+        if not isinstance(launch_profile, LaunchProfile):
+            raise TypeError('Launch profile invalid. Try to use LaunchProfile.DEFAULT or LaunchProfile.LEAN instead.')
+        self.log.debug('Setting launch profile... [PROFILE: %s]', launch_profile.name)
+        self.__launch_profile = launch_profile
+
+    def set_profile_snapshots(self, enabled: bool = True, snapshot_dir: Optional[str] = None) -> NoReturn:
+        if snapshot_dir is not None and not isinstance(snapshot_dir, str):
+            raise TypeError('The snapshot_dir has to be a path.')
+        self.__use_snapshots = enabled
+        self.__snapshot_dir = snapshot_dir
+
+    def set_result_cache(self, cache: Optional[SessionCache]) -> NoReturn:
+        self.__result_cache = cache
+
+    def get_result_cache(self) -> Optional[SessionCache]:
+        return self.__result_cache
+
+    def invalidate_result_cache(self, profile_name: Optional[str] = None) -> int:
+        if self.__result_cache is None:
+            return 0
+        return self.__result_cache.invalidate(self.__browser_choice, profile_name)
+
+    def set_idb_chunk_size(self, records: int) -> NoReturn:
+        if not isinstance(records, int) or records < 1:
+            raise ValueError('The IDB chunk size has to be a positive number of records.')
+        self.__idb_chunk_size = records
+
+    def set_login_timeout(self, timeout: Optional[Union[int, float]]) -> NoReturn:
+        if timeout is not None and (not isinstance(timeout, (int, float)) or timeout <= 0):
+            raise ValueError('The login timeout has to be a positive number of seconds or None.')
+        self.__login_timeout = timeout
+
+    def set_url(self, url: str) -> NoReturn:
+        if not isinstance(url, str) or not url.startswith(('http://', 'https://')):
+            raise ValueError('The URL has to start with http:// or https://.')
+        self.__URL = url
+
+    def set_idb_timeout(self, timeout: Union[int, float]) -> NoReturn:
+        if not isinstance(timeout, (int, float)) or timeout <= 0:
+            raise ValueError('The IDB timeout has to be a positive number of seconds.')
+        self.__idb_timeout = timeout
+
+    def set_delta_compact_threshold(self, max_deltas: int) -> NoReturn:
+        if not isinstance(max_deltas, int) or max_deltas < 1:
+            raise ValueError('The delta compact threshold has to be a positive integer.')
+        self.__delta_compact_threshold = max_deltas
+
+    def set_custom_webdriver(self, driver: Union[c_wd.WebDriver, f_wd.WebDriver],
+                             browser: Optional[Browser] = None) -> NoReturn:
+        if browser is not None:
+            # NOTE: Required for drivers which aren't one of the selenium browser classes (e.g. remote drivers).
+            self.__browser_choice = browser
+        elif isinstance(driver, _webdriver().Chrome):
             self.__browser_choice = Browser.CHROME
-        elif isinstance(driver, f_wd.WebDriver):
+        elif isinstance(driver, _webdriver().Firefox):
             self.__browser_choice = Browser.FIREFOX
         self.__custom_driver = True
-        self.__driver = driver
+        self.__use_driver(driver)
+
+    def enable_driver_pool(self, size: int = 1, max_uses: int = 10, headless: bool = True,
+                           acquire_timeout: Optional[float] = None) -> NoReturn:
+        if self.__custom_driver:
+            raise AssertionError('Do not call this method if you are using a custom webdriver.')
+        if acquire_timeout is not None and acquire_timeout <= 0:
+            raise ValueError('acquire_timeout has to be a positive number of seconds.')
+        self.disable_driver_pool()
+        self.log.debug('Starting driver pool... [SIZE: %s, MAX USES: %s]', size, max_uses)
+        self.__pool_acquire_timeout = acquire_timeout
+        self.__driver_pool = DriverPool(lambda: self.__launch_driver(self.__create_browser_options(headless)),
+                                        size, max_uses, self.log)
+        self.__driver_pool.warm_up()
+
+    def disable_driver_pool(self) -> NoReturn:
+        if self.__driver_pool is not None:
+            self.__driver_pool.shutdown()
+            self.__driver_pool = None
 
     def set_browser(self, browser: Union[Browser, str]) -> NoReturn:
+        self.disable_driver_pool()
         if self.__driver is not None:
             self.__driver.quit()
 
@@ -405,90 +2799,166 @@ class SessionHandler:
             )
         self.__init_browser()
 
+    def get_profile_list(self) -> list[str]:
+        self.__refresh_profile_list()
+        return list(self.__browser_profile_list)
+
+    def get_profile_catalog(self) -> list[dict]:
+        if self.__custom_driver:
+            raise AssertionError('Do not call this method if you are using a custom webdriver.')
+        return self.__profile_catalog.get_profiles()
+
+    def get_profile_errors(self) -> dict[str, Exception]:
+        return dict(self.__profile_errors)
+
     # TODO: Think about type aliasing
-    def get_active_session(self, use_profile: Optional[Union[list[str], str]] = None, all_profiles=False) -> Union[
+    def get_active_session(self, use_profile: Optional[Union[list[str], str]] = None, all_profiles=False,
+                           max_workers: int = 1, offline: bool = False) -> Union[
         list[dict[str, str]], dict[str, list[dict[str, str]]]
     ]:
-        self.log.warning('Make sure the specified browser profile is not being used by another process.')
+        if not self.__use_snapshots:
+            self.log.warning('Make sure the specified browser profile is not being used by another process.')
         profile_storage_dict = {}
         use_profile_list = []
+        self.__profile_errors = {}
+        self.__cancel_event.clear()
         self.__refresh_profile_list()
 
+        if not isinstance(max_workers, int) or max_workers < 1:
+            raise ValueError('max_workers has to be a positive integer.')
+
         if self.__custom_driver:
             raise AssertionError('Do not call this method if you are using a custom webdriver.')
 
         if all_profiles:
-            use_profile_list.extend(self.__browser_profile_list)
+            use_profile_list.extend(self.__profile_catalog.get_profile_names(whatsapp_only=True))
             self.log.info(
                 'Trying to get active sessions for all browser profiles of the selected type...'
             )
+            self.log.debug('Skipping %s profiles without WhatsApp Web data.',
+                           len(self.__browser_profile_list) - len(use_profile_list))
         else:
-            if use_profile and use_profile not in self.__browser_profile_list:
+            if isinstance(use_profile, list):
+                for profile in use_profile:
+                    if profile not in self.__browser_profile_list:
+                        raise ValueError('Profile does not exist: %s', profile)
+                use_profile_list.extend(use_profile)
+            elif use_profile and use_profile not in self.__browser_profile_list:
                 raise ValueError('Profile does not exist: %s', use_profile)
             elif use_profile is None:
                 return self.__get_profile_storage()
             elif use_profile and use_profile in self.__browser_profile_list:
                 use_profile_list.append(use_profile)
-            elif isinstance(use_profile, list):
-                use_profile_list.extend(use_profile)
             else:
                 # NOTE: Should this be a TypeError instead?
                 raise ValueError(
                     'Invalid profile provided. Make sure you provided a list of profiles or a profile name.'
                 )
 
-        for profile in use_profile_list:
-            profile_storage_dict[profile] = self.__get_profile_storage(profile)
+        if self.__result_cache is not None:
+            profile_storage_dict = self.__get_cached_storage(use_profile_list)
+            use_profile_list = [profile for profile in use_profile_list if profile not in profile_storage_dict]
+        cached_profiles = set(profile_storage_dict)
+
+        if offline:
+            profile_storage_dict.update(self.__get_offline_storage(use_profile_list))
+            use_profile_list = [profile for profile in use_profile_list if profile not in profile_storage_dict]
+
+        if max_workers > 1 and len(use_profile_list) > 1:
+            profile_storage_dict.update(
+                self.__get_profile_storage_parallel(use_profile_list, min(max_workers, len(use_profile_list)))
+            )
+        else:
+            for profile in use_profile_list:
+                try:
+                    profile_storage_dict[profile] = self.__get_profile_storage(profile)
+                except Exception as e:
+                    if not all_profiles and len(use_profile_list) == 1:
+                        raise
+                    self.log.error('Could not extract profile %s: %s', profile, e)
+                    self.__profile_errors[profile] = e
 
+        if self.__result_cache is not None:
+            self.__cache_storage({profile: wa_profile_obj for profile, wa_profile_obj in profile_storage_dict.items()
+                                  if profile not in cached_profiles})
         return profile_storage_dict
 
     def create_new_session(self) -> list[dict[str, str]]:
+        self.__cancel_event.clear()
         return self.__get_profile_storage()
 
-    def access_by_obj(self, wa_profile_obj: list[dict[str, str]]) -> list[dict[str, str]]:
+    def access_by_obj(self, wa_profile_obj: Union[list[dict[str, str]], 'SessionObject'],
+                      headless: bool = False) -> list[dict[str, str]]:
+        return self.__access_session(wa_profile_obj, headless)[0]
+
+    def __access_session(self, wa_profile_obj: Union[list[dict[str, str]], 'SessionObject'],
+                         headless: bool = False) -> tuple[list[dict[str, str]], dict]:
         if not self.verify_profile_object(wa_profile_obj):
             raise TypeError(
                 'Invalid profile object provided. '
                 'Make sure you only pass one session to this method.'
             )
+        if not isinstance(wa_profile_obj, SessionObject):
+            wa_profile_obj = SessionObject(wa_profile_obj)
+        self.__last_readiness = None
+        self.__cancel_event.clear()
 
-        if not self.__custom_driver:
-            self.__start_visible_session(wait_for_login=False)
-        else:
+        if self.__custom_driver:
             self.__start_session(wait_for_login=False)
+        elif headless:
+            self.__start_invisible_session(wait_for_login=False)
+        else:
+            self.__start_visible_session(wait_for_login=False)
 
-        self.__set_indexed_db_user(wa_profile_obj)
-        self.__set_local_storage(self.convert_idb_to_ls_obj(wa_profile_obj))
-        self.log.debug('Reloading WhatsApp Web...')
-        self.__driver.refresh()
-        self.log.debug('Waiting until WhatsApp Web finished loading...')
-        wait = WebDriverWait(self.__driver, 60)
-        wait.until(EC.visibility_of_element_located((By.CSS_SELECTOR, 'div._2DPZK:nth-child(3)')))
-        self.log.debug('WhatsApp Web is now usable!')
-        return_idb_obj = self.convert_ls_to_idb_obj(self.get_newer_obj_from_ls_cmp(
-            self.convert_idb_to_ls_obj(wa_profile_obj),
-            self.__get_local_storage(),
-            self.convert_idb_to_ls_obj(self.__get_indexed_db_user()))
-        )
+        try:
+            self.__set_indexed_db_user(wa_profile_obj)
+            self.__set_local_storage(self.convert_idb_to_ls_obj(wa_profile_obj))
+            self.log.debug('Reloading WhatsApp Web...')
+            self.__driver.refresh()
+            self.log.debug('Waiting until WhatsApp Web finished loading...')
+            self.__wait_until_ready()
+            self.log.debug('WhatsApp Web is now usable!')
+            self.__measure_rss()
+            wa_profile_ls_obj = self.convert_idb_to_ls_obj(wa_profile_obj)
+            merged_ls_obj = self.merge_ls_objects(
+                wa_profile_ls_obj,
+                # NOTE: All keys, WhatsApp Web writes some of them only to the localStorage.
+                self.__get_local_storage(),
+                self.convert_idb_to_ls_obj(self.__get_indexed_db_user())
+            )
+            session_diff = self.diff_ls_objects(wa_profile_ls_obj, merged_ls_obj)
+            self.log.debug('Session changes: %s added, %s changed, %s removed.', len(session_diff['added']),
+                           len(session_diff['changed']), len(session_diff['removed']))
+            return_idb_obj = self.convert_ls_to_idb_obj(merged_ls_obj)
+        except BaseException:
+            if self.__pooled_driver or (headless and not self.__custom_driver):
+                self.__abort_session()
+            raise
 
-        if not self.__custom_driver:
+        if self.__pooled_driver or (headless and not self.__custom_driver):
+            # NOTE: Pooled and headless browsers have no window for the user to close.
+            self.__close_session()
+        elif not self.__custom_driver:
             self.log.warning('Please do not reload the page manually.')
             self.log.debug('Waiting until the browser window is closed...')
             while True:
                 try:
                     _ = self.__driver.current_window_handle
-                    time.sleep(1)
-                except WebDriverException:
+                    self.__sleep(1)
+                except _selenium_exceptions().WebDriverException:
                     break
-        return return_idb_obj
+        return return_idb_obj, session_diff
 
-    def access_by_file(self, profile_file: str) -> NoReturn:
+    def access_by_file(self, profile_file: str, headless: bool = False) -> NoReturn:
         profile_file = os.path.normpath(profile_file)
 
         if os.path.isfile(profile_file):
             self.log.debug('Reading WaSession from file...')
-            with open(profile_file, 'r') as file:
-                wa_profile_obj = json.load(file)
+            with self.__phase('file_load') as phase:
+                wa_profile_obj = self.load_profile(profile_file)
+                phase.add_payload(wa_profile_obj)
+            if isinstance(wa_profile_obj, list):
+                wa_profile_obj = SessionObject(wa_profile_obj)
 
             self.log.debug('Verifying WaSession object...')
             if not self.verify_profile_object(wa_profile_obj):
@@ -498,20 +2968,36 @@ class SessionHandler:
                 )
 
             self.log.debug('WaSession object is valid.')
-            new_wa_profile_obj = self.access_by_obj(wa_profile_obj)
-            self.save_profile(new_wa_profile_obj, profile_file)
+            _, session_diff = self.__access_session(wa_profile_obj, headless)
+            self.__write_back_profile_file(profile_file, session_diff)
 
         else:
             raise FileNotFoundError('Make sure you pass a valid WaSession file to this method.')
 
-    def save_profile(self, wa_profile_obj: Union[list[dict[str, str]], dict[str, list[dict[str, str]]]],
-                     file_path: str) -> Union[NoReturn, int]:
+    def __write_back_profile_file(self, profile_file: str, session_diff: dict) -> NoReturn:
+        with self.__phase('file_save') as phase:
+            phase.add_payload(session_diff)
+            if not self.append_profile_delta(profile_file, session_diff):
+                self.log.debug('WaSession did not change, nothing to write.')
+                return
+            self.log.debug('Appended changes to the delta log of the WaSession file.')
+            _, _, delta_count = _read_delta_log(profile_file)
+            if delta_count >= self.__delta_compact_threshold or \
+                    os.path.getsize(profile_file + _DELTA_SUFFIX) > os.path.getsize(profile_file):
+                self.log.debug('Compacting the delta log into the WaSession file... [DELTAS: %s]', delta_count)
+                self.compact_profile_file(profile_file)
+
+    def save_profile(self, wa_profile_obj: Union[list[dict[str, str]], dict[str, list[dict[str, str]]],
+                                                 'SessionObject'],
+                     file_path: str, file_format: SessionFileFormat = SessionFileFormat.JSON,
+                     compression: Optional[str] = None) -> Union[NoReturn, int]:
         file_path = os.path.normpath(file_path)
 
         if self.verify_profile_object(wa_profile_obj):
-            self.log.debug('Saving WaSession object to file...')
-            with open(file_path, 'w') as file:
-                json.dump(wa_profile_obj, file, indent=2)
+            self.log.debug('Saving WaSession object to file... [FORMAT: %s]', file_format.name)
+            with self.__phase('file_save') as phase:
+                phase.add_payload(wa_profile_obj)
+                self.write_profile_file(wa_profile_obj, file_path, file_format, compression)
         else:
             self.log.debug('Scanning the list for multiple WaSession objects...')
             if len(wa_profile_obj) == 0:
@@ -524,8 +3010,8 @@ class SessionHandler:
                 profile_storage = wa_profile_obj[profile_name]
                 if self.verify_profile_object(profile_storage):
                     self.log.debug('Found a new profile in the list!')
-                    single_profile_name = os.path.basename(file_path) + '-' + profile_name
-                    self.save_profile(profile_storage, os.path.join(os.path.dirname(file_path), single_profile_name))
+                    self.save_profile(profile_storage, self.get_profile_file_path(file_path, profile_name),
+                                      file_format, compression)
                     saved_profiles += 1
             if saved_profiles > 0:
                 if saved_profiles > 1:
@@ -536,8 +3022,951 @@ class SessionHandler:
                 self.log.error("Could not find any active profiles in the list.")
             return saved_profiles
 
+    def save_to_store(self, wa_profile_obj: Union[list[dict[str, str]], dict[str, list[dict[str, str]]]],
+                      store: 'SessionStore', profile_name: Optional[str] = None) -> list[str]:
+        if self.verify_profile_object(wa_profile_obj):
+            return [store.save(wa_profile_obj, self.__browser_choice or None, profile_name)]
+        saved_entries = store.save_all(wa_profile_obj, self.__browser_choice or None)
+        if len(saved_entries) == 0:
+            self.log.error("Could not find any active profiles in the list.")
+        return saved_entries
+
 
-if __name__ == '__main__':
+def _account_id_from_ls_obj(ls_obj: Mapping[str, str]) -> Optional[str]:
+    for account_key in ('last-wid-md', 'last-wid'):
+        account_id = ls_obj.get(account_key)
+        if not account_id:
+            continue
+        if isinstance(account_id, str):
+            try:
+                account_id = json.loads(account_id)
+            except ValueError:
+                pass
+        account_id = str(account_id)
+        # multi device ids look like "<number>:<device>@c.us", only the account part is relevant
+        if ':' in account_id and '@' in account_id:
+            account_id = account_id.split(':', 1)[0] + '@' + account_id.rsplit('@', 1)[1]
+        return account_id
+    return None
+
+
+class SessionLsView(Mapping):
+    # Read-only localStorage style view ({key: value}) on the records of a SessionObject.
+    __slots__ = ('__session',)
+
+    def __init__(self, session: 'SessionObject'):
+        self.__session = session
+
+    def __getitem__(self, key: str) -> str:
+        return self.__session.get_record(key)['value']
+
+    def __contains__(self, key) -> bool:
+        return self.__session.has_key(key)
+
+    def __iter__(self):
+        return iter(self.__session.keys())
+
+    def __len__(self) -> int:
+        return len(self.__session)
+
+
+class SessionObject(Sequence):
+    # Stores the IDB user records of one session once and caches everything derived from them.
+    # NOTE: The records are shared with the views, so they must not be changed after creating the object.
+    __slots__ = ('__records', '__index', '__valid', '__account_id', '__content_hash')
+
+    def __init__(self, records: Iterable[dict[str, str]]):
+        if isinstance(records, SessionObject):
+            records = records.as_list()
+        self.__records = records if isinstance(records, list) else list(records)
+        self.__index = {}
+        for position, record in enumerate(self.__records):
+            if not isinstance(record, dict):
+                raise TypeError('Session records have to be dicts.')
+            if 'key' in record:
+                self.__index[record['key']] = position
+        self.__valid = None
+        self.__account_id = False
+        self.__content_hash = None
+
+    @classmethod
+    def from_ls_obj(cls, ls_obj: Mapping[str, str]) -> 'SessionObject':
+        return cls([{'key': ls_key, 'value': ls_val} for ls_key, ls_val in ls_obj.items()])
+
+    def __getitem__(self, item):
+        return self.__records[item]
+
+    def __len__(self) -> int:
+        return len(self.__records)
+
+    def __iter__(self):
+        return iter(self.__records)
+
+    def __repr__(self) -> str:
+        return 'SessionObject(records=%s, valid=%s)' % (len(self.__records), self.is_valid)
+
+    def has_key(self, key: str) -> bool:
+        return key in self.__index
+
+    def keys(self):
+        return self.__index.keys()
+
+    def get_record(self, key: str) -> dict[str, str]:
+        return self.__records[self.__index[key]]
+
+    def get(self, key: str, default: Optional[str] = None) -> Optional[str]:
+        position = self.__index.get(key)
+        return default if position is None else self.__records[position]['value']
+
+    def as_list(self) -> list[dict[str, str]]:
+        return self.__records
+
+    def as_ls_dict(self) -> SessionLsView:
+        return SessionLsView(self)
+
+    @property
+    def is_valid(self) -> bool:
+        if self.__valid is None:
+            self.__valid = any('WASecretBundle' in key for key in self.__index.keys() if isinstance(key, str))
+        return self.__valid
+
+    @property
+    def account_id(self) -> Optional[str]:
+        if self.__account_id is False:
+            self.__account_id = _account_id_from_ls_obj(self.as_ls_dict())
+        return self.__account_id
+
+    @property
+    def content_hash(self) -> str:
+        if self.__content_hash is None:
+            self.__content_hash = SessionHandler.get_content_hash(self.__records)
+        return self.__content_hash
+
+    def get_footprint(self) -> dict[str, int]:
+        record_bytes = sys.getsizeof(self.__records)
+        for record in self.__records:
+            record_bytes += sys.getsizeof(record)
+            for field, value in record.items():
+                record_bytes += sys.getsizeof(field) + sys.getsizeof(value)
+        index_bytes = sys.getsizeof(self.__index)
+        return {
+            'records': len(self.__records),
+            'record_bytes': record_bytes,
+            'index_bytes': index_bytes,
+            'total_bytes': sys.getsizeof(self) + record_bytes + index_bytes,
+        }
+
+
+class SessionStore:
+    __INDEX_FILE = 'index.json'
+    __INDEX_VERSION = 1
+    __FILE_EXTENSION = '.wasession'
+    __store_dir: str
+    __file_format: SessionFileFormat
+    __compression: Optional[str]
+    __entries: dict[str, dict]
+    __account_index: dict[str, str]
+    __hash_index: dict[str, str]
+    __lock: threading.RLock
+    log: logging.Logger
+
+    def __init__(self, store_dir: str, file_format: SessionFileFormat = SessionFileFormat.COMPACT,
+                 compression: Optional[str] = 'zlib', log: Optional[logging.Logger] = None):
+        self.__store_dir = os.path.normpath(store_dir)
+        self.__file_format = file_format
+        self.__compression = compression if file_format == SessionFileFormat.COMPACT else None
+        self.__entries = {}
+        self.__account_index = {}
+        self.__hash_index = {}
+        self.__lock = threading.RLock()
+        self.log = log if log else logging.getLogger('WaWebSession:SessionStore')
+
+        os.makedirs(self.__store_dir, exist_ok=True)
+        self.__load_index()
+        self.rebuild_index()
+
+    @staticmethod
+    def __atomic_write(file_path: str, write_function: Callable[[str], NoReturn]) -> NoReturn:
+        file_descriptor, tmp_path = tempfile.mkstemp(dir=os.path.dirname(file_path),
+                                                     prefix='.' + os.path.basename(file_path), suffix='.tmp')
+        os.close(file_descriptor)
+        try:
+            write_function(tmp_path)
+            os.replace(tmp_path, file_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def __index_path(self) -> str:
+        return os.path.join(self.__store_dir, self.__INDEX_FILE)
+
+    def __load_index(self) -> NoReturn:
+        index_path = self.__index_path()
+        if not os.path.isfile(index_path):
+            return
+        try:
+            with open(index_path, 'r') as file:
+                index = json.load(file)
+        except (OSError, ValueError) as e:
+            self.log.warning('Could not read the session index, it will be rebuilt: %s', e)
+            return
+        if index.get('version') != self.__INDEX_VERSION:
+            self.log.debug('Session index has an unknown version, it will be rebuilt.')
+            return
+        for entry in index.get('entries', {}).values():
+            self.__add_entry(entry)
+
+    def __save_index(self) -> NoReturn:
+        index = {'version': self.__INDEX_VERSION, 'entries': self.__entries}
+
+        def write_index(tmp_path: str) -> NoReturn:
+            with open(tmp_path, 'w') as file:
+                json.dump(index, file, indent=2)
+
+        self.__atomic_write(self.__index_path(), write_index)
+
+    def __add_entry(self, entry: dict) -> NoReturn:
+        self.__remove_entry(entry['id'])
+        self.__entries[entry['id']] = entry
+        if entry.get('account_id'):
+            self.__account_index[entry['account_id']] = entry['id']
+        self.__hash_index[entry['content_hash']] = entry['id']
+
+    def __remove_entry(self, entry_id: str) -> Optional[dict]:
+        entry = self.__entries.pop(entry_id, None)
+        if entry is not None:
+            if self.__account_index.get(entry.get('account_id')) == entry_id:
+                del self.__account_index[entry['account_id']]
+            if self.__hash_index.get(entry['content_hash']) == entry_id:
+                del self.__hash_index[entry['content_hash']]
+        return entry
+
+    def __file_path(self, entry: dict) -> str:
+        return os.path.join(self.__store_dir, entry['file'])
+
+    @staticmethod
+    def __new_entry_id(account_id: Optional[str], content_hash: str) -> str:
+        if account_id:
+            return hashlib.sha256(account_id.encode('utf-8')).hexdigest()[:16]
+        return content_hash[:16]
+
+    def __read_entry(self, file_name: str, entry_id: str, previous: Optional[dict] = None) -> dict:
+        file_path = os.path.join(self.__store_dir, file_name)
+        wa_profile_obj = SessionHandler.load_profile(file_path)
+        if not isinstance(wa_profile_obj, list):
+            raise ValueError('The file does not contain a single session.')
+        wa_profile_obj = SessionObject(wa_profile_obj)
+        file_stat = os.stat(file_path)
+        entry = dict(previous) if previous else {'browser': None, 'profile': None, 'saved_at': file_stat.st_mtime,
+                                                 'refreshed_at': None}
+        entry.update({
+            'id': entry_id,
+            'file': file_name,
+            'account_id': SessionHandler.get_account_id(wa_profile_obj),
+            'content_hash': SessionHandler.get_content_hash(wa_profile_obj),
+            'records': len(wa_profile_obj),
+            'size': file_stat.st_size,
+            'mtime': file_stat.st_mtime,
+        })
+        return entry
+
+    def rebuild_index(self) -> int:
+        with self.__lock:
+            changed_entries = 0
+            known_files = {entry['file']: entry for entry in self.__entries.values()}
+            disk_files = set(file_name for file_name in os.listdir(self.__store_dir)
+                             if file_name.endswith(self.__FILE_EXTENSION))
+
+            for file_name, entry in known_files.items():
+                if file_name not in disk_files:
+                    self.log.debug('Session file was removed, dropping it from the index: %s', file_name)
+                    self.__remove_entry(entry['id'])
+                    changed_entries += 1
+
+            for file_name in disk_files:
+                entry = known_files.get(file_name)
+                try:
+                    file_stat = os.stat(os.path.join(self.__store_dir, file_name))
+                    if entry is not None and entry['size'] == file_stat.st_size and \
+                            entry['mtime'] == file_stat.st_mtime:
+                        continue
+                    self.__add_entry(self.__read_entry(file_name, file_name[:-len(self.__FILE_EXTENSION)], entry))
+                except (OSError, ValueError, TypeError) as e:
+                    # NOTE: One unreadable file must not make the whole store unusable.
+                    self.log.warning('Skipping unreadable session file %s: %s', file_name, e)
+                    continue
+                changed_entries += 1
+
+            if changed_entries > 0 or not os.path.isfile(self.__index_path()):
+                self.log.debug('Session index updated. [CHANGED: %s]', changed_entries)
+                self.__save_index()
+            return changed_entries
+
+    def save(self, wa_profile_obj: Union[list[dict[str, str]], SessionObject],
+             browser: Optional[Union[Browser, str]] = None, profile_name: Optional[str] = None) -> str:
+        if not SessionHandler.verify_profile_object(wa_profile_obj):
+            raise TypeError('Invalid profile object provided. Make sure you only pass one session to this method.')
+        if not isinstance(wa_profile_obj, SessionObject):
+            wa_profile_obj = SessionObject(wa_profile_obj)
+        account_id = SessionHandler.get_account_id(wa_profile_obj)
+        content_hash = SessionHandler.get_content_hash(wa_profile_obj)
+        if isinstance(browser, Browser):
+            browser = browser.name.lower()
+
+        with self.__lock:
+            entry_id = self.__account_index.get(account_id) if account_id else self.__hash_index.get(content_hash)
+            if entry_id is None:
+                entry_id = self.__new_entry_id(account_id, content_hash)
+            previous = self.__entries.get(entry_id)
+            file_name = entry_id + self.__FILE_EXTENSION
+            now = time.time()
+
+            self.__atomic_write(
+                os.path.join(self.__store_dir, file_name),
+                lambda tmp_path: SessionHandler.write_profile_file(wa_profile_obj, tmp_path,
+                                                                   self.__file_format, self.__compression)
+            )
+            if os.path.isfile(os.path.join(self.__store_dir, file_name) + _DELTA_SUFFIX):
+                os.remove(os.path.join(self.__store_dir, file_name) + _DELTA_SUFFIX)
+            entry = self.__read_entry(file_name, entry_id, previous)
+            entry['saved_at'] = previous['saved_at'] if previous else now
+            entry['refreshed_at'] = now if previous else None
+            if browser is not None:
+                entry['browser'] = browser
+            if profile_name is not None:
+                entry['profile'] = profile_name
+            self.__add_entry(entry)
+            self.__save_index()
+            self.log.debug('Saved session to store. [ID: %s, ACCOUNT: %s]', entry_id, account_id)
+            return entry_id
+
+    def save_all(self, wa_profile_dict: dict[str, list[dict[str, str]]],
+                 browser: Optional[Union[Browser, str]] = None) -> list[str]:
+        return [self.save(wa_profile_obj, browser, profile_name)
+                for profile_name, wa_profile_obj in wa_profile_dict.items()
+                if SessionHandler.verify_profile_object(wa_profile_obj)]
+
+    def load(self, entry_id: str) -> list[dict[str, str]]:
+        with self.__lock:
+            entry = self.__entries.get(entry_id)
+        if entry is None:
+            raise KeyError('No session with this id in the store: %s' % entry_id)
+        return SessionHandler.load_profile(self.__file_path(entry))
+
+    def remove(self, entry_id: str) -> NoReturn:
+        with self.__lock:
+            entry = self.__remove_entry(entry_id)
+            if entry is None:
+                raise KeyError('No session with this id in the store: %s' % entry_id)
+            if os.path.isfile(self.__file_path(entry)):
+                os.remove(self.__file_path(entry))
+            self.__save_index()
+
+    def get_entry(self, entry_id: str) -> Optional[dict]:
+        with self.__lock:
+            entry = self.__entries.get(entry_id)
+            return dict(entry) if entry else None
+
+    def get_file_path(self, entry_id: str) -> str:
+        with self.__lock:
+            entry = self.__entries.get(entry_id)
+        if entry is None:
+            raise KeyError('No session with this id in the store: %s' % entry_id)
+        return self.__file_path(entry)
+
+    def find_by_account(self, account_id: str) -> Optional[dict]:
+        with self.__lock:
+            entry_id = self.__account_index.get(account_id)
+            return dict(self.__entries[entry_id]) if entry_id else None
+
+    def find_by_hash(self, content_hash: str) -> Optional[dict]:
+        with self.__lock:
+            entry_id = self.__hash_index.get(content_hash)
+            return dict(self.__entries[entry_id]) if entry_id else None
+
+    def find_older_than(self, days: Union[int, float], use_refreshed_at: bool = True) -> list[dict]:
+        threshold = time.time() - days * 86400
+        with self.__lock:
+            return [dict(entry) for entry in self.__entries.values()
+                    if ((entry['refreshed_at'] or entry['saved_at']) if use_refreshed_at
+                        else entry['saved_at']) < threshold]
+
+    def mark_refreshed(self, entry_id: str) -> NoReturn:
+        with self.__lock:
+            entry = self.__entries.get(entry_id)
+            if entry is None:
+                raise KeyError('No session with this id in the store: %s' % entry_id)
+            entry['refreshed_at'] = time.time()
+            self.__save_index()
+
+    def list_entries(self) -> list[dict]:
+        with self.__lock:
+            return [dict(entry) for entry in self.__entries.values()]
+
+    def __len__(self) -> int:
+        return len(self.__entries)
+
+
+class AsyncSessionHandler:
+    __browser: Browser
+    __log_level: Optional[Union[int, str]]
+    __handler_factory: Callable[[], SessionHandler]
+    __semaphore: Optional[asyncio.Semaphore] = None
+    __executor: ThreadPoolExecutor
+    __max_concurrency: int
+    __profile_errors: dict[str, BaseException]
+
+    def __init__(self, browser: Union[Browser, str], log_level: Optional[Union[int, str]] = None,
+                 max_concurrency: int = 4, handler_factory: Optional[Callable[[], SessionHandler]] = None):
+        if not isinstance(max_concurrency, int) or max_concurrency < 1:
+            raise ValueError('max_concurrency has to be a positive integer.')
+        if isinstance(browser, str):
+            browser = Browser[browser.upper()]
+        self.__browser = browser
+        self.__log_level = log_level
+        self.__max_concurrency = max_concurrency
+        self.__handler_factory = handler_factory if handler_factory else self.__new_handler
+        self.__executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='WaWebSessionAsync')
+        self.__profile_errors = {}
+
+    def __new_handler(self) -> SessionHandler:
+        return SessionHandler(browser=self.__browser, log_level=self.__log_level)
+
+    def __get_semaphore(self) -> asyncio.Semaphore:
+        # NOTE: Created lazily, so the semaphore belongs to the running event loop.
+        if self.__semaphore is None:
+            self.__semaphore = asyncio.Semaphore(self.__max_concurrency)
+        return self.__semaphore
+
+    async def __run(self, method_name: str, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        async with self.__get_semaphore():
+            handler = await loop.run_in_executor(self.__executor, self.__handler_factory)
+            future = loop.run_in_executor(self.__executor, functools.partial(getattr(handler, method_name),
+                                                                             *args, **kwargs))
+            try:
+                return await future
+            except asyncio.CancelledError:
+                # the worker thread can't be interrupted, so stop the blocking waits and quit its browser
+                handler.cancel()
+                raise
+
+    async def get_active_session(self, use_profile: Optional[Union[list[str], str]] = None, all_profiles=False,
+                                 offline: bool = False) -> Union[
+        list[dict[str, str]], dict[str, list[dict[str, str]]]
+    ]:
+        self.__profile_errors = {}
+        if use_profile is None and not all_profiles:
+            return await self.__run('get_active_session', offline=offline)
+        profile_list = [use_profile] if isinstance(use_profile, str) else use_profile
+        if all_profiles:
+            # like SessionHandler.get_active_session, profiles without WhatsApp Web data are skipped
+            profile_list = [profile['name'] for profile in await self.__run('get_profile_catalog')
+                            if profile['has_whatsapp']]
+        # NOTE: Always passed as a list, a single name is rejected if it is empty like Chrome's default profile.
+        results = await asyncio.gather(
+            *(self.__run('get_active_session', use_profile=[profile], offline=offline) for profile in profile_list),
+            return_exceptions=True
+        )
+        profile_storage_dict = {}
+        profile_errors = {}
+        for profile, result in zip(profile_list, results):
+            if isinstance(result, asyncio.CancelledError):
+                raise result
+            if isinstance(result, BaseException):
+                logging.getLogger('WaWebSession:SessionHandler').error('Could not extract profile %s: %s',
+                                                                       profile, result)
+                profile_errors[profile] = result
+                continue
+            profile_storage_dict.update(result)
+        self.__profile_errors = profile_errors
+        if not all_profiles and len(profile_list) == 1 and profile_errors:
+            # same as SessionHandler.get_active_session for a single profile
+            raise profile_errors[profile_list[0]]
+        return profile_storage_dict
+
+    def get_profile_errors(self) -> dict[str, BaseException]:
+        return dict(self.__profile_errors)
+
+    async def create_new_session(self) -> list[dict[str, str]]:
+        return await self.__run('create_new_session')
+
+    async def access_by_obj(self, wa_profile_obj: list[dict[str, str]], headless: bool = True) -> list[dict[str, str]]:
+        return await self.__run('access_by_obj', wa_profile_obj, headless)
+
+    async def access_by_file(self, profile_file: str, headless: bool = True) -> NoReturn:
+        return await self.__run('access_by_file', profile_file, headless)
+
+    async def save_profile(self, wa_profile_obj: Union[list[dict[str, str]], dict[str, list[dict[str, str]]]],
+                           file_path: str, file_format: SessionFileFormat = SessionFileFormat.JSON,
+                           compression: Optional[str] = None) -> Union[NoReturn, int]:
+        loop = asyncio.get_running_loop()
+        # no browser involved, so this needs no SessionHandler and doesn't count against the concurrency limit
+        return await loop.run_in_executor(None, functools.partial(self.__write_profile_files, wa_profile_obj,
+                                                                  file_path, file_format, compression))
+
+    @staticmethod
+    def __write_profile_files(wa_profile_obj: Union[list[dict[str, str]], dict[str, list[dict[str, str]]]],
+                              file_path: str, file_format: SessionFileFormat,
+                              compression: Optional[str]) -> Union[NoReturn, int]:
+        if SessionHandler.verify_profile_object(wa_profile_obj):
+            SessionHandler.write_profile_file(wa_profile_obj, file_path, file_format, compression)
+            return
+        if len(wa_profile_obj) == 0:
+            raise ValueError('Could not find any profiles in the list. Make sure to specified file path is correct.')
+        saved_profiles = 0
+        for profile_name, profile_storage in wa_profile_obj.items():
+            if SessionHandler.verify_profile_object(profile_storage):
+                SessionHandler.write_profile_file(profile_storage,
+                                                  SessionHandler.get_profile_file_path(file_path, profile_name),
+                                                  file_format, compression)
+                saved_profiles += 1
+        return saved_profiles
+
+    def shutdown(self) -> NoReturn:
+        self.__executor.shutdown(wait=False, cancel_futures=True)
+
+    async def __aenter__(self) -> 'AsyncSessionHandler':
+        return self
+
+    async def __aexit__(self, *args) -> NoReturn:
+        self.shutdown()
+
+
+class SessionRefresher:
+    __SKIPPED_FILES = ('index.json',)
+    __source: Union[str, SessionStore]
+    __file_pattern: str
+    __interval: float
+    __jitter: float
+    __retry_delay: float
+    __max_backoff: float
+    __max_concurrency: int
+    __handler_factory: Callable[[], SessionHandler]
+    __sessions: dict[str, dict]
+    __active_handlers: dict[str, SessionHandler]
+    __executor: Optional[ThreadPoolExecutor] = None
+    __thread: Optional[threading.Thread] = None
+    __stop_event: threading.Event
+    __lock: threading.Lock
+    log: logging.Logger
+
+    def __init__(self, source: Union[str, SessionStore], browser: Optional[Union[Browser, str]] = None,
+                 interval: float = 6 * 3600, jitter: float = 0.1, max_concurrency: int = 2,
+                 retry_delay: float = 300, max_backoff: float = 24 * 3600, file_pattern: str = '*',
+                 log_level: Optional[Union[int, str]] = None,
+                 handler_factory: Optional[Callable[[], SessionHandler]] = None):
+        if not isinstance(max_concurrency, int) or max_concurrency < 1:
+            raise ValueError('max_concurrency has to be a positive integer.')
+        if interval <= 0 or retry_delay <= 0 or max_backoff <= 0:
+            raise ValueError('interval, retry_delay and max_backoff have to be positive numbers.')
+        if not 0 <= jitter < 1:
+            raise ValueError('jitter has to be a number between 0 and 1.')
+        if handler_factory is None and browser is None:
+            raise ValueError('Provide either a browser or a handler_factory.')
+        if isinstance(source, str) and not os.path.isdir(source):
+            raise FileNotFoundError('The session directory does not exist: %s' % source)
+        if isinstance(browser, str):
+            browser = Browser[browser.upper()]
+
+        self.__source = os.path.normpath(source) if isinstance(source, str) else source
+        self.__file_pattern = file_pattern
+        self.__interval = interval
+        self.__jitter = jitter
+        self.__retry_delay = retry_delay
+        self.__max_backoff = max_backoff
+        self.__max_concurrency = max_concurrency
+        self.__handler_factory = handler_factory if handler_factory else \
+            functools.partial(SessionHandler, browser=browser, log_level=log_level)
+        self.__sessions = {}
+        self.__active_handlers = {}
+        self.__stop_event = threading.Event()
+        self.__lock = threading.Lock()
+        self.log = logging.getLogger('WaWebSession:SessionRefresher')
+        if log_level:
+            self.log.setLevel(log_level.upper() if isinstance(log_level, str) else log_level)
+
+    def __enter__(self) -> 'SessionRefresher':
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> bool:
+        self.stop()
+        return False
+
+    def __jittered(self, seconds: float) -> float:
+        return seconds * random.uniform(1 - self.__jitter, 1 + self.__jitter)
+
+    def __list_sources(self) -> list[str]:
+        if isinstance(self.__source, SessionStore):
+            self.__source.rebuild_index()
+            return [entry['id'] for entry in self.__source.list_entries()]
+        return sorted(
+            os.path.join(self.__source, file_name) for file_name in os.listdir(self.__source)
+            if fnmatch.fnmatch(file_name, self.__file_pattern) and not file_name.startswith('.') and
+            not file_name.endswith(_DELTA_SUFFIX) and file_name not in self.__SKIPPED_FILES and
+            os.path.isfile(os.path.join(self.__source, file_name))
+        )
+
+    def __sync_sessions(self) -> NoReturn:
+        source_keys = self.__list_sources()
+        now = time.time()
+        with self.__lock:
+            for session_key in source_keys:
+                if session_key not in self.__sessions:
+                    # new sessions are spread over the first jitter window, so they don't all start at once
+                    self.__sessions[session_key] = {
+                        'session': session_key, 'state': 'scheduled', 'runs': 0, 'failures': 0,
+                        'next_run': now + random.uniform(0, self.__interval * self.__jitter),
+                        'last_run': None, 'last_success': None, 'last_error': None, 'last_seconds': None,
+                        'changed': None,
+                    }
+            for session_key in list(self.__sessions):
+                if session_key not in source_keys and self.__sessions[session_key]['state'] != 'running':
+                    del self.__sessions[session_key]
+
+    def __refresh(self, session_key: str) -> bool:
+        handler = self.__handler_factory()
+        with self.__lock:
+            self.__active_handlers[session_key] = handler
+        try:
+            if isinstance(self.__source, SessionStore):
+                entry = self.__source.get_entry(session_key)
+                if entry is None:
+                    raise KeyError('No session with this id in the store: %s' % session_key)
+                wa_profile_obj = handler.access_by_obj(self.__source.load(session_key), headless=True)
+                if SessionHandler.get_content_hash(wa_profile_obj) == entry['content_hash']:
+                    self.__source.mark_refreshed(session_key)
+                    return False
+                self.__source.save(wa_profile_obj, entry['browser'], entry['profile'])
+                return True
+            delta_path = session_key + _DELTA_SUFFIX
+            delta_size = os.path.getsize(delta_path) if os.path.isfile(delta_path) else -1
+            file_mtime = os.path.getmtime(session_key)
+            handler.access_by_file(session_key, headless=True)
+            return (os.path.getsize(delta_path) if os.path.isfile(delta_path) else -1) != delta_size or \
+                os.path.getmtime(session_key) != file_mtime
+        finally:
+            with self.__lock:
+                self.__active_handlers.pop(session_key, None)
+
+    def __run_session(self, session_key: str) -> NoReturn:
+        started = time.time()
+        self.log.debug('Refreshing session: %s', session_key)
+        try:
+            changed = self.__refresh(session_key)
+            error = None
+        except Exception as e:
+            changed = None
+            error = e
+        finished = time.time()
+
+        with self.__lock:
+            session = self.__sessions.get(session_key)
+            if session is None:
+                return
+            session['runs'] += 1
+            session['last_run'] = finished
+            session['last_seconds'] = finished - started
+            if error is None:
+                session['state'] = 'ok'
+                session['failures'] = 0
+                session['last_success'] = finished
+                session['last_error'] = None
+                session['changed'] = changed
+                session['next_run'] = finished + self.__jittered(self.__interval)
+            else:
+                session['state'] = 'failed'
+                session['failures'] += 1
+                session['last_error'] = '%s: %s' % (type(error).__name__, error)
+                backoff = min(self.__retry_delay * 2 ** (session['failures'] - 1), self.__max_backoff)
+                session['next_run'] = finished + self.__jittered(backoff)
+        if error is None:
+            self.log.debug('Refreshed session %s in %.1f seconds. [CHANGED: %s]', session_key,
+                           finished - started, changed)
+        else:
+            self.log.error('Could not refresh session %s: %s', session_key, error)
+
+    def __take_due_sessions(self, force: bool = False) -> list[str]:
+        now = time.time()
+        with self.__lock:
+            due_sessions = sorted((session for session in self.__sessions.values()
+                                   if session['state'] != 'running' and (force or session['next_run'] <= now)),
+                                  key=lambda session: session['next_run'])
+            for session in due_sessions:
+                session['state'] = 'running'
+            return [session['session'] for session in due_sessions]
+
+    def __loop(self) -> NoReturn:
+        while not self.__stop_event.is_set():
+            try:
+                self.__sync_sessions()
+            except OSError as e:
+                self.log.error('Could not list the sessions: %s', e)
+            for session_key in self.__take_due_sessions():
+                self.__executor.submit(self.__run_session, session_key)
+            with self.__lock:
+                next_runs = [session['next_run'] for session in self.__sessions.values()
+                             if session['state'] != 'running']
+            # NOTE: New session files are picked up at least once a minute.
+            self.__stop_event.wait(min(max(min(next_runs, default=time.time() + 60) - time.time(), 1), 60))
+
+    def start(self) -> NoReturn:
+        if self.__thread is not None and self.__thread.is_alive():
+            raise RuntimeError('The refresher is already running.')
+        self.__stop_event.clear()
+        self.__executor = ThreadPoolExecutor(max_workers=self.__max_concurrency,
+                                             thread_name_prefix='WaWebSessionRefresher')
+        self.__thread = threading.Thread(target=self.__loop, name='WaWebSessionRefresher', daemon=True)
+        self.__thread.start()
+        self.log.info('Session refresher started. [INTERVAL: %s, MAX CONCURRENCY: %s]', self.__interval,
+                      self.__max_concurrency)
+
+    def stop(self, wait: bool = True) -> NoReturn:
+        self.__stop_event.set()
+        with self.__lock:
+            active_handlers = list(self.__active_handlers.values())
+        for handler in active_handlers:
+            # stops the waits of running sessions and quits their browsers
+            handler.cancel()
+        if self.__thread is not None:
+            self.__thread.join()
+            self.__thread = None
+        if self.__executor is not None:
+            self.__executor.shutdown(wait=wait, cancel_futures=True)
+            self.__executor = None
+        if wait:
+            with self.__lock:
+                for session in self.__sessions.values():
+                    # sessions that were still queued when the executor was shut down
+                    if session['state'] == 'running':
+                        session['state'] = 'scheduled'
+        self.log.info('Session refresher stopped.')
+
+    def run_once(self, force: bool = True) -> dict:
+        self.__sync_sessions()
+        session_keys = self.__take_due_sessions(force)
+        with ThreadPoolExecutor(max_workers=self.__max_concurrency,
+                                thread_name_prefix='WaWebSessionRefresher') as executor:
+            for _ in executor.map(self.__run_session, session_keys):
+                pass
+        return self.get_report()
+
+    def get_status(self) -> list[dict]:
+        with self.__lock:
+            return [dict(session) for session in self.__sessions.values()]
+
+    def get_report(self) -> dict:
+        with self.__lock:
+            sessions = list(self.__sessions.values())
+        report = {state: 0 for state in ('scheduled', 'running', 'ok', 'failed')}
+        for session in sessions:
+            report[session['state']] += 1
+        report['sessions'] = len(sessions)
+        report['changed'] = sum(1 for session in sessions if session['changed'])
+        report['next_run'] = min((session['next_run'] for session in sessions if session['state'] != 'running'),
+                                 default=None)
+        return report
+
+
+def _check_session_file(file_path: str) -> dict:
+    # NOTE: Runs in the worker processes of SessionChecker, so it has to stay a module level function.
+    result = {'file': file_path, 'valid': False, 'format': None, 'records': 0, 'account_id': None,
+              'content_hash': None, 'error': None, 'duplicate_of': None, 'live': None, 'live_detail': None,
+              'live_seconds': None}
+    try:
+        result['format'] = SessionHandler.get_profile_file_format(file_path)[0].name.lower()
+        wa_profile_obj = SessionHandler.load_profile(file_path)
+        if not isinstance(wa_profile_obj, list):
+            result['error'] = 'The file does not contain a single session.'
+            return result
+        session = SessionObject(wa_profile_obj)
+    except (OSError, ValueError, TypeError) as e:
+        result['error'] = '%s: %s' % (type(e).__name__, e)
+        return result
+    result['records'] = len(session)
+    result['valid'] = session.is_valid
+    result['account_id'] = session.account_id
+    result['content_hash'] = session.content_hash
+    if not session.is_valid:
+        result['error'] = 'No WASecretBundle found.'
+    return result
+
+
+class SessionChecker:
+    __browser: Optional[Browser]
+    __max_processes: int
+    __max_browsers: int
+    __acquire_timeout: float
+    __url: Optional[str]
+    __launch_profile: LaunchProfile
+    __readiness_detector: Optional[ReadinessDetector]
+    __log_level: Optional[Union[int, str]]
+    __handler_factory: Callable[[], SessionHandler]
+    log: logging.Logger
+
+    def __init__(self, browser: Optional[Union[Browser, str]] = None, max_processes: Optional[int] = None,
+                 max_browsers: int = 2, url: Optional[str] = None,
+                 launch_profile: LaunchProfile = LaunchProfile.DEFAULT, acquire_timeout: float = 300,
+                 readiness_detector: Optional[ReadinessDetector] = None, log_level: Optional[Union[int, str]] = None,
+                 handler_factory: Optional[Callable[[], SessionHandler]] = None):
+        if max_processes is not None and (not isinstance(max_processes, int) or max_processes < 1):
+            raise ValueError('max_processes has to be a positive integer.')
+        if not isinstance(max_browsers, int) or max_browsers < 1:
+            raise ValueError('max_browsers has to be a positive integer.')
+        if acquire_timeout <= 0:
+            raise ValueError('acquire_timeout has to be a positive number of seconds.')
+        if isinstance(browser, str):
+            browser = Browser[browser.upper()]
+        self.__browser = browser
+        self.__max_processes = max_processes or os.cpu_count() or 1
+        self.__max_browsers = max_browsers
+        self.__acquire_timeout = acquire_timeout
+        self.__url = url
+        self.__launch_profile = launch_profile
+        self.__readiness_detector = readiness_detector
+        self.__log_level = log_level
+        self.__handler_factory = handler_factory if handler_factory else self.__new_handler
+        self.log = logging.getLogger('WaWebSession:SessionChecker')
+
+    def __new_handler(self) -> SessionHandler:
+        if self.__browser is None:
+            raise ValueError('A browser is required for the live check.')
+        handler = SessionHandler(browser=self.__browser, log_level=self.__log_level)
+        handler.set_launch_profile(self.__launch_profile)
+        # every browser is reused for the following sessions, the pool clears its storage in between
+        handler.enable_driver_pool(size=1, max_uses=50, headless=True, acquire_timeout=self.__acquire_timeout)
+        return handler
+
+    @staticmethod
+    def collect_files(paths: Iterable[str], file_pattern: str = '*') -> list[str]:
+        file_paths = []
+        for path in paths:
+            if not os.path.isdir(path):
+                file_paths.append(path)
+                continue
+            for file_name in sorted(os.listdir(path)):
+                file_path = os.path.join(path, file_name)
+                if fnmatch.fnmatch(file_name, file_pattern) and not file_name.startswith('.') and \
+                        not file_name.endswith(_DELTA_SUFFIX) and file_name != 'index.json' and \
+                        os.path.isfile(file_path):
+                    file_paths.append(file_path)
+        return file_paths
+
+    def check_offline(self, file_paths: list[str]) -> list[dict]:
+        self.log.debug('Checking %s session files... [PROCESSES: %s]', len(file_paths), self.__max_processes)
+        if self.__max_processes == 1 or len(file_paths) < 2:
+            results = [_check_session_file(file_path) for file_path in file_paths]
+        else:
+            max_workers = min(self.__max_processes, len(file_paths))
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                results = list(executor.map(_check_session_file, file_paths,
+                                            chunksize=max(1, len(file_paths) // (max_workers * 4))))
+
+        first_files = {}
+        for result in results:
+            if result['content_hash'] is None:
+                continue
+            if result['content_hash'] in first_files:
+                result['duplicate_of'] = first_files[result['content_hash']]
+            else:
+                first_files[result['content_hash']] = result['file']
+        return results
+
+    def __check_live_session(self, handlers: queue.Queue, result: dict) -> NoReturn:
+        started = time.monotonic()
+        try:
+            handler = handlers.get(timeout=self.__acquire_timeout)
+        except queue.Empty:
+            result['live'] = 'error'
+            result['live_detail'] = 'TimeoutError: No browser became available within %s seconds.' \
+                                    % self.__acquire_timeout
+            result['live_seconds'] = time.monotonic() - started
+            return
+        try:
+            handler.access_by_obj(SessionHandler.load_profile(result['file']), headless=True)
+            result['live'] = 'logged_in'
+        except Exception as e:
+            readiness = handler.get_last_readiness()
+            if readiness is not None and readiness['strategy'] in ('qr_code', 'logged_out'):
+                result['live'] = 'logged_out'
+            else:
+                result['live'] = 'error'
+            result['live_detail'] = '%s: %s' % (type(e).__name__, e)
+        finally:
+            result['live_seconds'] = time.monotonic() - started
+            handlers.put(handler)
+        self.log.debug('Checked %s: %s', result['file'], result['live'])
+
+    def check_live(self, results: list[dict]) -> list[dict]:
+        # every distinct session is only opened once, duplicates get the result of the first file
+        to_check = [result for result in results if result['valid'] and result['duplicate_of'] is None]
+        if not to_check:
+            return results
+        handler_count = min(self.__max_browsers, len(to_check))
+        self.log.debug('Checking %s sessions in a browser... [BROWSERS: %s]', len(to_check), handler_count)
+        handlers = queue.Queue()
+        created_handlers = []
+        try:
+            for _ in range(handler_count):
+                handler = self.__handler_factory()
+                if self.__url is not None:
+                    handler.set_url(self.__url)
+                if self.__readiness_detector is not None:
+                    handler.set_readiness_detector(self.__readiness_detector)
+                created_handlers.append(handler)
+                handlers.put(handler)
+            with ThreadPoolExecutor(max_workers=handler_count, thread_name_prefix='WaWebSessionChecker') as executor:
+                for future in [executor.submit(self.__check_live_session, handlers, result) for result in to_check]:
+                    future.result()
+        finally:
+            for handler in created_handlers:
+                handler.disable_driver_pool()
+
+        live_results = {result['file']: result for result in to_check}
+        for result in results:
+            if result['valid'] and result['duplicate_of'] is not None:
+                first_result = live_results[result['duplicate_of']]
+                result['live'] = first_result['live']
+                result['live_detail'] = first_result['live_detail']
+        return results
+
+    @staticmethod
+    def summarize(results: list[dict]) -> dict:
+        accounts = {}
+        for result in results:
+            if result['valid'] and result['account_id']:
+                accounts.setdefault(result['account_id'], []).append(result['file'])
+        summary = {
+            'files': len(results),
+            'valid': sum(1 for result in results if result['valid']),
+            'invalid': sum(1 for result in results if not result['valid']),
+            'duplicates': sum(1 for result in results if result['duplicate_of'] is not None),
+            'accounts': len(accounts),
+            'accounts_with_multiple_files': {account_id: file_paths for account_id, file_paths in accounts.items()
+                                             if len(file_paths) > 1},
+            'live': None,
+        }
+        if any(result['live'] is not None for result in results):
+            summary['live'] = {state: sum(1 for result in results if result['live'] == state)
+                               for state in ('logged_in', 'logged_out', 'error')}
+        return summary
+
+    def check(self, paths: Iterable[str], live: bool = False, file_pattern: str = '*') -> dict:
+        started = time.monotonic()
+        results = self.check_offline(self.collect_files(paths, file_pattern))
+        offline_seconds = time.monotonic() - started
+        if live:
+            self.check_live(results)
+        report = self.summarize(results)
+        report['seconds'] = {'offline': offline_seconds,
+                             'live': time.monotonic() - started - offline_seconds if live else None}
+        report['results'] = results
+        return report
+
+
+def _run_interactive() -> NoReturn:
     web = SessionHandler()
     web.set_log_level(logging.DEBUG)
     choice = 0
@@ -558,3 +3987,235 @@ if __name__ == '__main__':
             print('Files successfully created.')
     elif choice == 3:
         web.access_by_file(input('Enter the file path to the session file you would like to open: '))
+
+
+def _new_cli_handler(args) -> SessionHandler:
+    handler = SessionHandler(browser=args.browser, log_level=args.log_level)
+    if getattr(args, 'lean', False):
+        handler.set_launch_profile(LaunchProfile.LEAN)
+    if getattr(args, 'snapshot', False):
+        handler.set_profile_snapshots(True, args.snapshot_dir)
+    return handler
+
+
+def _get_cli_file_format(args, default: SessionFileFormat) -> SessionFileFormat:
+    if args.format is not None:
+        return SessionFileFormat[args.format.upper()]
+    # only the compact format can be compressed
+    return SessionFileFormat.COMPACT if args.compression else default
+
+
+def _save_cli_sessions(handler: SessionHandler, args, wa_profile_dict: dict[str, list[dict[str, str]]]) -> int:
+    if args.store:
+        store = SessionStore(args.store) if args.format is None and args.compression is None else \
+            SessionStore(args.store, _get_cli_file_format(args, SessionFileFormat.COMPACT), args.compression)
+        saved_entries = handler.save_to_store(wa_profile_dict, store)
+        for entry_id in saved_entries:
+            print(entry_id)
+        return len(saved_entries)
+    file_format = _get_cli_file_format(args, SessionFileFormat.JSON)
+    if len(wa_profile_dict) == 1 and not args.all_profiles:
+        # a single profile is written to the output path itself
+        handler.save_profile(next(iter(wa_profile_dict.values())), args.output, file_format, args.compression)
+        print(args.output)
+        return 1
+    return handler.save_profile(wa_profile_dict, args.output, file_format, args.compression)
+
+
+def _cli_extract(args) -> int:
+    handler = _new_cli_handler(args)
+    if not args.profile and not args.all_profiles:
+        wa_profile_dict = {'': handler.create_new_session()}
+    else:
+        wa_profile_dict = handler.get_active_session(use_profile=args.profile, all_profiles=args.all_profiles,
+                                                     max_workers=args.workers, offline=args.offline)
+    for profile, error in handler.get_profile_errors().items():
+        print('Could not extract profile %s: %s' % (profile, error), file=sys.stderr)
+    if not wa_profile_dict:
+        print('No active sessions found.', file=sys.stderr)
+        return 1
+    return 0 if _save_cli_sessions(handler, args, wa_profile_dict) > 0 else 1
+
+
+def _cli_open(args) -> int:
+    handler = _new_cli_handler(args)
+    handler.access_by_file(args.file, args.headless)
+    return 0
+
+
+def _cli_validate(args) -> int:
+    if args.live and args.browser is None:
+        print('--live requires a browser (-b).', file=sys.stderr)
+        return 2
+    checker = SessionChecker(args.browser, max_processes=args.processes, max_browsers=args.workers, url=args.url,
+                             launch_profile=LaunchProfile.LEAN if args.lean else LaunchProfile.DEFAULT,
+                             log_level=args.log_level)
+    report = checker.check(args.files, live=args.live, file_pattern=args.pattern)
+    results = report['results']
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        for result in results:
+            if not result['valid']:
+                state = 'INVALID'
+            elif result['live'] is not None:
+                state = result['live'].upper()
+            else:
+                state = 'OK'
+            detail = result['live_detail'] or result['error'] or '%s records' % result['records']
+            if result['duplicate_of'] is not None:
+                detail += ', duplicate of %s' % result['duplicate_of']
+            print('%s\t%s\t%s\t%s' % (state, result['file'], result['account_id'] or '-', detail))
+        summary = '%s files, %s valid, %s invalid, %s duplicates, %s accounts' % (
+            report['files'], report['valid'], report['invalid'], report['duplicates'], report['accounts'])
+        if report['live'] is not None:
+            summary += ', %s logged in, %s logged out, %s errors' % (
+                report['live']['logged_in'], report['live']['logged_out'], report['live']['error'])
+        print(summary, file=sys.stderr)
+    if not all(result['valid'] for result in results):
+        return 1
+    return 0 if all(result['live'] in (None, 'logged_in') for result in results) else 1
+
+
+def _cli_convert(args) -> int:
+    records = SessionHandler.convert_profile_file(args.source, args.target,
+                                                  _get_cli_file_format(args, SessionFileFormat.COMPACT),
+                                                  args.compression)
+    print('Converted %s records to %s.' % (records, args.target))
+    return 0
+
+
+def _cli_list(args) -> int:
+    if args.store:
+        if not os.path.isdir(args.store):
+            raise FileNotFoundError('The session store does not exist: %s' % args.store)
+        entries = SessionStore(args.store).list_entries()
+        if args.json:
+            print(json.dumps(entries, indent=2))
+        else:
+            for entry in entries:
+                print('%s\t%s\t%s\t%s' % (entry['id'], entry['account_id'] or '-', entry['browser'] or '-',
+                                          entry['profile'] or '-'))
+        return 0
+    if not args.browser:
+        print('Provide a browser (--browser) or a session store (--store).', file=sys.stderr)
+        return 2
+    profiles = SessionHandler(browser=args.browser, log_level=args.log_level).get_profile_catalog()
+    if args.whatsapp_only:
+        profiles = [profile for profile in profiles if profile['has_whatsapp']]
+    if args.json:
+        print(json.dumps(profiles, indent=2))
+    else:
+        for profile in profiles:
+            print('%s\t%s\t%s' % (profile['name'] or '(default)', 'whatsapp' if profile['has_whatsapp'] else '-',
+                                  profile['display_name'] or '-'))
+    return 0
+
+
+def _create_cli_parser():
+    import argparse
+
+    parser = argparse.ArgumentParser(prog='WaWebSession',
+                                     description='Save, open, check and convert WhatsApp Web sessions. '
+                                                 'Without a command an interactive menu is shown.')
+    parser.add_argument('--log-level', default='WARNING',
+                        choices=['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'], help='default: WARNING')
+    subparsers = parser.add_subparsers(dest='command', metavar='command')
+
+    browser_parser = argparse.ArgumentParser(add_help=False)
+    browser_parser.add_argument('-b', '--browser', required=True, choices=['chrome', 'firefox'])
+    browser_parser.add_argument('--lean', action='store_true', help='start browsers with the lean launch profile')
+
+    output_parser = argparse.ArgumentParser(add_help=False)
+    output_parser.add_argument('--format', choices=['json', 'compact'],
+                               help='default: json for session files, compact for converting and for stores')
+    output_parser.add_argument('--compression', choices=['zlib', 'lzma'],
+                               help='compression of compact session files')
+
+    extract_parent = argparse.ArgumentParser(add_help=False, parents=[browser_parser, output_parser])
+    extract_target = extract_parent.add_mutually_exclusive_group(required=True)
+    extract_target.add_argument('-o', '--output', help='session file (with multiple profiles: file name prefix)')
+    extract_target.add_argument('--store', help='save the sessions to this SessionStore directory instead')
+    extract_parent.add_argument('-w', '--workers', type=int, default=1,
+                                help='number of browsers used at the same time (default: 1)')
+    extract_parent.add_argument('--offline', action='store_true',
+                                help='read the sessions from disk, the browser is only started if that fails')
+    extract_parent.add_argument('--snapshot', action='store_true',
+                                help='extract from a temporary copy, so profiles can be open in a browser')
+    extract_parent.add_argument('--snapshot-dir', help='directory for the copies (e.g. /dev/shm)')
+
+    extract_command = subparsers.add_parser('extract', parents=[extract_parent],
+                                            help='extract the sessions of browser profiles, or of a new login')
+    extract_command.add_argument('-p', '--profile', action='append',
+                                 help='browser profile (can be repeated), without it a new login is started')
+    extract_command.set_defaults(function=_cli_extract, all_profiles=False)
+
+    extract_all_command = subparsers.add_parser('extract-all', parents=[extract_parent],
+                                                help='extract the sessions of all browser profiles')
+    extract_all_command.set_defaults(function=_cli_extract, all_profiles=True, profile=None)
+
+    open_command = subparsers.add_parser('open', parents=[browser_parser], help='open a session file in a browser')
+    open_command.add_argument('file')
+    open_command.add_argument('--headless', action='store_true',
+                              help='refresh the session file without showing a browser window')
+    open_command.set_defaults(function=_cli_open)
+
+    validate_command = subparsers.add_parser('validate', help='check session files, optionally also in a browser')
+    validate_command.add_argument('files', nargs='+', help='session files or directories of session files')
+    validate_command.add_argument('--pattern', default='*', help='file name pattern for directories (default: *)')
+    validate_command.add_argument('--processes', type=int,
+                                  help='number of processes for the offline check (default: CPU count)')
+    validate_command.add_argument('--live', action='store_true',
+                                  help='also open every distinct session in a headless browser')
+    validate_command.add_argument('-b', '--browser', choices=['chrome', 'firefox'], help='browser for --live')
+    validate_command.add_argument('-w', '--workers', type=int, default=2,
+                                  help='number of browsers used at the same time for --live (default: 2)')
+    validate_command.add_argument('--url', help='page opened for --live instead of WhatsApp Web')
+    validate_command.add_argument('--lean', action='store_true', help='start browsers with the lean launch profile')
+    validate_command.add_argument('--json', action='store_true', help='print the report as JSON')
+    validate_command.set_defaults(function=_cli_validate)
+
+    convert_command = subparsers.add_parser('convert', parents=[output_parser],
+                                            help='convert a session file to another file format')
+    convert_command.add_argument('source')
+    convert_command.add_argument('target')
+    convert_command.set_defaults(function=_cli_convert)
+
+    list_command = subparsers.add_parser('list', help='list browser profiles or the sessions of a SessionStore')
+    list_source = list_command.add_mutually_exclusive_group()
+    list_source.add_argument('-b', '--browser', choices=['chrome', 'firefox'])
+    list_source.add_argument('--store', help='SessionStore directory')
+    list_command.add_argument('--whatsapp-only', action='store_true',
+                              help='only list profiles with WhatsApp Web data')
+    list_command.add_argument('--json', action='store_true', help='print the results as JSON')
+    list_command.set_defaults(function=_cli_list)
+    return parser
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv:
+        _run_interactive()
+        return 0
+    args = _create_cli_parser().parse_args(argv)
+    if args.command is None:
+        _run_interactive()
+        return 0
+    try:
+        return args.function(args)
+    except (OSError, ValueError, TypeError, LookupError, RuntimeError, AssertionError, ImportError) as e:
+        # NOTE: TimeoutError, FileNotFoundError and InterruptedError are OSErrors.
+        print('%s: %s' % (type(e).__name__, e), file=sys.stderr)
+        return 1
+    except Exception as e:
+        # NOTE: Selenium is only imported once a browser is needed, so its errors can only occur after that.
+        selenium_exceptions = sys.modules.get('selenium.common.exceptions')
+        if selenium_exceptions is None or not isinstance(e, selenium_exceptions.WebDriverException):
+            raise
+        print('%s: %s' % (type(e).__name__, (e.msg or '').strip() or 'The browser could not be controlled.'),
+              file=sys.stderr)
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
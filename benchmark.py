@@ -0,0 +1,573 @@
+import argparse
+import collections
+import copy
+import http.server
+import json
+import logging
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from typing import Callable, NoReturn, Optional
+
+from selenium.common.exceptions import NoSuchElementException, NoSuchWindowException
+
+import WaWebSession
+from WaWebSession import Browser, LaunchProfile, SessionChecker, SessionFileFormat, SessionHandler, SessionMetrics
+
+
+def build_session(key_count: int, value_size: int = 64) -> list[dict[str, str]]:
+    wa_profile_obj = [
+        {'key': 'WASecretBundle', 'value': json.dumps({'key': 'k' * 44, 'encKey': 'e' * 44, 'macKey': 'm' * 44})},
+        {'key': 'last-wid-md', 'value': '"491700000000:1@c.us"'},
+    ]
+    for i in range(max(key_count - len(wa_profile_obj), 0)):
+        wa_profile_obj.append({'key': 'bench-key-%06d' % i, 'value': ('v%06d' % i) * (value_size // 7 + 1)})
+    return wa_profile_obj[:max(key_count, 1)]
+
+
+class _FakeElement:
+    def __init__(self, displayed: bool):
+        self.__displayed = displayed
+
+    def is_displayed(self) -> bool:
+        return self.__displayed
+
+
+class _FakeSwitchTo:
+    def __init__(self, driver: 'FakeWebDriver'):
+        self.__driver = driver
+
+    def window(self, handle: str) -> NoReturn:
+        self.__driver.record('switch_to_window')
+        if handle not in self.__driver.window_handles:
+            raise NoSuchWindowException(handle)
+        self.__driver.active_handle = handle
+
+
+class FakeWebDriver:
+    # In-process stand-in for the part of the selenium WebDriver API that SessionHandler uses.
+    # Scripts are recognized by identity with the script constants of WaWebSession, arguments and
+    # results are serialized like they would be for a real WebDriver HTTP round trip.
+    def __init__(self, login_session: Optional[list[dict[str, str]]] = None, latency: float = 0.0):
+        self.login_session = login_session
+        self.latency = latency
+        self.call_counts = collections.Counter()
+        self.call_times = collections.defaultdict(float)
+        self.payload_bytes = 0
+        self.local_storage: dict[str, str] = {}
+        self.idb: Optional[dict[str, dict[str, str]]] = None
+        self.staged_records: Optional[list[dict[str, str]]] = None
+        self.page_ready = False
+        self.page_url = 'https://example.invalid/'
+        self.window_handles = ['window-0']
+        self.active_handle = 'window-0'
+        self.switch_to = _FakeSwitchTo(self)
+        self.__window_counter = 0
+        self.__scripts: dict[str, Callable] = {
+            WaWebSession._JS_GET_LOCAL_STORAGE: self.__get_local_storage,
+            WaWebSession._JS_SET_LOCAL_STORAGE: self.__set_local_storage,
+            WaWebSession._JS_IDB_GET_USER: self.__idb_get_user,
+            WaWebSession._JS_IDB_STAGE_RECORDS: self.__idb_stage_records,
+            WaWebSession._JS_IDB_RESTORE_USER: self.__idb_restore_user,
+            WaWebSession._JS_IDB_HAS_LOGIN: self.__idb_has_login,
+            WaWebSession._JS_RESET_WA_STORAGE: self.__reset_storage,
+            WaWebSession._JS_WAIT_FOR_READY: self.__wait_for_ready,
+            'window.open()': self.__window_open,
+            'return 1;': lambda: 1,
+        }
+
+    def record(self, kind: str, started: Optional[float] = None) -> NoReturn:
+        if self.latency:
+            time.sleep(self.latency)
+        self.call_counts[kind] += 1
+        if started is not None:
+            self.call_times[kind] += time.perf_counter() - started
+
+    def reset_stats(self) -> NoReturn:
+        self.call_counts.clear()
+        self.call_times.clear()
+        self.payload_bytes = 0
+
+    def __transfer(self, value):
+        encoded = json.dumps(value)
+        self.payload_bytes += len(encoded)
+        return json.loads(encoded)
+
+    def __session_logged_in(self) -> bool:
+        return self.idb is not None and any('WASecretBundle' in key for key in self.idb.keys())
+
+    def __load_page(self) -> NoReturn:
+        if self.idb is None:
+            self.idb = {}
+        if self.login_session is not None and not self.__session_logged_in():
+            # behaves like a user who scans the QR code right away
+            for entry in self.login_session:
+                self.idb[entry['key']] = dict(entry)
+                self.local_storage[entry['key']] = entry['value']
+        self.page_ready = self.__session_logged_in()
+        if self.page_ready:
+            # WhatsApp Web updates a few keys while starting
+            self.idb['bench-last-active'] = {'key': 'bench-last-active', 'value': str(time.time())}
+
+    def __get_local_storage(self, keys):
+        if keys is None:
+            return dict(self.local_storage)
+        return {key: self.local_storage[key] for key in keys if key in self.local_storage}
+
+    def __set_local_storage(self, wa_session):
+        self.local_storage.update(wa_session)
+        return len(wa_session)
+
+    def __idb_get_user(self):
+        if self.idb is None:
+            return {'error': 'The IDB wawc does not exist.'}
+        return {'result': [dict(entry) for _, entry in sorted(self.idb.items())]}
+
+    def __idb_has_login(self):
+        if self.idb is None:
+            return {'error': 'The IDB wawc does not exist.'}
+        return {'result': self.__session_logged_in()}
+
+    def __idb_stage_records(self, records, first_chunk):
+        if first_chunk or self.staged_records is None:
+            self.staged_records = []
+        self.staged_records.extend(records)
+        return len(self.staged_records)
+
+    def __idb_restore_user(self, expected_count):
+        records = self.staged_records or []
+        self.staged_records = None
+        if len(records) != expected_count:
+            return {'error': 'Only %s of %s records were staged.' % (len(records), expected_count)}
+        if self.idb is None:
+            return {'error': 'The IDB wawc does not exist.'}
+        self.idb = {entry['key']: entry for entry in records}
+        return {'result': len(records)}
+
+    def __reset_storage(self):
+        self.local_storage.clear()
+        if self.idb is not None:
+            self.idb.clear()
+        return True
+
+    def __wait_for_ready(self, config):
+        # the chat list is shown right away for a valid session, the QR code otherwise
+        if self.page_ready and config['readySelectors']:
+            return {'result': {'ready': True, 'strategy': 'selector', 'detail': config['readySelectors'][0],
+                               'elapsed': 0.0}}
+        if not self.page_ready and config['loggedOutSelectors']:
+            return {'result': {'ready': False, 'strategy': 'qr_code', 'detail': config['loggedOutSelectors'][0],
+                               'elapsed': 0.0}}
+        return {'result': {'ready': False, 'strategy': 'timeout', 'detail': None, 'elapsed': config['timeout']}}
+
+    def __window_open(self):
+        self.__window_counter += 1
+        self.window_handles.append('window-%s' % self.__window_counter)
+
+    def __run_script(self, kind: str, script: str, args):
+        started = time.perf_counter()
+        if script not in self.__scripts:
+            raise NotImplementedError('FakeWebDriver does not know this script: %s' % script[:80])
+        result = self.__transfer(self.__scripts[script](*self.__transfer(list(args))))
+        self.record(kind + ':' + self.__scripts[script].__name__.strip('_'), started)
+        return result
+
+    def execute_script(self, script: str, *args):
+        return self.__run_script('execute_script', script, args)
+
+    def execute_async_script(self, script: str, *args):
+        return self.__run_script('execute_async_script', script, args)
+
+    def set_script_timeout(self, timeout: float) -> NoReturn:
+        self.record('set_script_timeout')
+
+    def get(self, url: str) -> NoReturn:
+        started = time.perf_counter()
+        self.page_url = url
+        if url.startswith('http'):
+            self.__load_page()
+        self.record('get', started)
+
+    def refresh(self) -> NoReturn:
+        started = time.perf_counter()
+        self.__load_page()
+        self.record('refresh', started)
+
+    def find_element(self, by: str = None, value: str = None) -> _FakeElement:
+        self.record('find_element')
+        if not self.page_ready:
+            raise NoSuchElementException(value)
+        return _FakeElement(True)
+
+    def find_elements(self, by: str = None, value: str = None) -> list[_FakeElement]:
+        self.record('find_elements')
+        return [_FakeElement(True)] if self.page_ready else []
+
+    @property
+    def current_url(self) -> str:
+        self.record('current_url')
+        return self.page_url
+
+    @property
+    def current_window_handle(self) -> str:
+        self.record('current_window_handle')
+        if self.active_handle not in self.window_handles:
+            raise NoSuchWindowException(self.active_handle)
+        return self.active_handle
+
+    def close(self) -> NoReturn:
+        self.record('close')
+        self.window_handles.remove(self.active_handle)
+
+    def quit(self) -> NoReturn:
+        self.record('quit')
+        self.window_handles = []
+
+
+STAND_IN_PAGE = '''<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="utf-8">
+    <title>WhatsApp Web stand-in</title>
+</head>
+<body>
+<div id="app"></div>
+<script>
+    function render(loggedIn) {
+        var app = document.getElementById("app");
+        app.innerHTML = "";
+        if (loggedIn) {
+            var pane = document.createElement("div");
+            pane.id = "pane-side";
+            pane.setAttribute("data-testid", "chat-list");
+            for (var i = 0; i < 3; i++) {
+                var chat = document.createElement("div");
+                chat.className = "_2DPZK";
+                chat.textContent = "Chat " + i;
+                pane.appendChild(chat);
+            }
+            app.appendChild(pane);
+        } else {
+            var qrCode = document.createElement("canvas");
+            qrCode.setAttribute("aria-label", "Scan me!");
+            qrCode.setAttribute("data-ref", "stand-in");
+            app.appendChild(qrCode);
+        }
+    }
+
+    var request = indexedDB.open("wawc", 1);
+    request.onupgradeneeded = function (event) {
+        event.target.result.createObjectStore("user", {keyPath: "key"});
+    };
+    request.onsuccess = function (event) {
+        var db = event.target.result;
+        var getRequest = db.transaction("user").objectStore("user").get("WASecretBundle");
+        getRequest.onsuccess = function () {
+            var loggedIn = getRequest.result !== undefined;
+            // the delay simulates the time WhatsApp Web needs to start
+            setTimeout(function () {
+                render(loggedIn);
+            }, LOAD_DELAY_MS);
+            if (!loggedIn && location.search.indexOf("autologin") !== -1) {
+                // behaves like a user who scans the QR code after a moment
+                setTimeout(function () {
+                    var transaction = db.transaction("user", "readwrite");
+                    var objectStore = transaction.objectStore("user");
+                    var session = SESSION;
+                    for (var i = 0; i < session.length; i++) {
+                        objectStore.put(session[i]);
+                        window.localStorage.setItem(session[i].key, session[i].value);
+                    }
+                    transaction.oncomplete = function () {
+                        render(true);
+                    };
+                }, LOGIN_DELAY_MS);
+            }
+        };
+    };
+</script>
+</body>
+</html>
+'''
+
+
+class StandInPageServer:
+    # Local HTTP server for a page that mimics the wawc IDB and the chat list of WhatsApp Web.
+    def __init__(self, login_session: Optional[list[dict[str, str]]] = None, load_delay: float = 0.1,
+                 login_delay: float = 0.5, host: str = '127.0.0.1', port: int = 0):
+        page = STAND_IN_PAGE.replace('SESSION', json.dumps(login_session or build_session(10)))
+        page = page.replace('LOAD_DELAY_MS', str(int(load_delay * 1000)))
+        page = page.replace('LOGIN_DELAY_MS', str(int(login_delay * 1000))).encode('utf-8')
+
+        class _Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(page)))
+                self.end_headers()
+                self.wfile.write(page)
+
+            def log_message(self, *args):
+                pass
+
+        self.__server = http.server.ThreadingHTTPServer((host, port), _Handler)
+        self.__thread = threading.Thread(target=self.__server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return 'http://%s:%s/' % self.__server.server_address[:2]
+
+    def __enter__(self) -> 'StandInPageServer':
+        self.__thread.start()
+        return self
+
+    def __exit__(self, *args) -> NoReturn:
+        self.__server.shutdown()
+        self.__server.server_close()
+
+
+def _new_fake_handler(driver: FakeWebDriver) -> SessionHandler:
+    handler = SessionHandler(browser=Browser.CHROME, driver=driver, log_level=logging.ERROR)
+    handler.set_metrics(SessionMetrics())
+    return handler
+
+
+def _result(scenario: str, params: dict, timings: list[float], driver: Optional[FakeWebDriver] = None,
+            phases: Optional[dict[str, float]] = None, metrics: Optional[SessionMetrics] = None) -> dict:
+    result = {
+        'scenario': scenario,
+        'params': params,
+        'runs': len(timings),
+        'median_seconds': statistics.median(timings),
+        'min_seconds': min(timings),
+        'max_seconds': max(timings),
+        'phases': dict(phases or {}),
+    }
+    if driver is not None:
+        # driver statistics are taken from the last run
+        result['round_trips'] = sum(driver.call_counts.values())
+        result['round_trips_by_call'] = dict(driver.call_counts)
+        result['payload_bytes'] = driver.payload_bytes
+        for kind, seconds in driver.call_times.items():
+            result['phases']['driver:' + kind] = seconds
+    if metrics is not None:
+        # SessionHandler phases of the last run
+        result['session_metrics'] = metrics.snapshot()
+        for phase_name, phase in result['session_metrics']['phases'].items():
+            result['phases'][phase_name] = phase['seconds_total']
+    return result
+
+
+def bench_extract(key_count: int, repeat: int, latency: float) -> dict:
+    timings = []
+    driver = None
+    for _ in range(repeat):
+        driver = FakeWebDriver(login_session=build_session(key_count), latency=latency)
+        handler = _new_fake_handler(driver)
+        started = time.perf_counter()
+        handler.create_new_session()
+        timings.append(time.perf_counter() - started)
+    return _result('extract', {'keys': key_count}, timings, driver, metrics=handler.get_metrics())
+
+
+def bench_inject(key_count: int, repeat: int, latency: float) -> dict:
+    timings = []
+    driver = None
+    wa_profile_obj = build_session(key_count)
+    for _ in range(repeat):
+        driver = FakeWebDriver(latency=latency)
+        handler = _new_fake_handler(driver)
+        started = time.perf_counter()
+        handler.access_by_obj(copy.deepcopy(wa_profile_obj))
+        timings.append(time.perf_counter() - started)
+    return _result('inject', {'keys': key_count}, timings, driver, metrics=handler.get_metrics())
+
+
+def bench_save_profiles(profile_count: int, key_count: int, file_format: SessionFileFormat,
+                        compression: Optional[str], repeat: int) -> dict:
+    timings = []
+    profile_dict = {'Profile %s' % i: build_session(key_count) for i in range(profile_count)}
+    handler = _new_fake_handler(FakeWebDriver())
+    bytes_written = 0
+    for _ in range(repeat):
+        handler.get_metrics().reset()
+        target_dir = tempfile.mkdtemp(prefix='wawebsession-bench-')
+        try:
+            started = time.perf_counter()
+            handler.save_profile(profile_dict, os.path.join(target_dir, 'session'), file_format, compression)
+            timings.append(time.perf_counter() - started)
+            bytes_written = sum(os.path.getsize(os.path.join(target_dir, file_name))
+                                for file_name in os.listdir(target_dir))
+        finally:
+            shutil.rmtree(target_dir)
+    result = _result('save_profile', {'profiles': profile_count, 'keys': key_count, 'format': file_format.name,
+                                      'compression': compression}, timings, metrics=handler.get_metrics())
+    result['bytes_written'] = bytes_written
+    return result
+
+
+def bench_access_by_file(key_count: int, file_format: SessionFileFormat, compression: Optional[str],
+                         repeat: int, latency: float) -> dict:
+    timings = []
+    load_timings = []
+    driver = None
+    wa_profile_obj = build_session(key_count)
+    for _ in range(repeat):
+        target_dir = tempfile.mkdtemp(prefix='wawebsession-bench-')
+        try:
+            session_file = os.path.join(target_dir, 'session')
+            SessionHandler.write_profile_file(wa_profile_obj, session_file, file_format, compression)
+            started = time.perf_counter()
+            SessionHandler.load_profile(session_file)
+            load_timings.append(time.perf_counter() - started)
+
+            driver = FakeWebDriver(latency=latency)
+            handler = _new_fake_handler(driver)
+            started = time.perf_counter()
+            handler.access_by_file(session_file)
+            timings.append(time.perf_counter() - started)
+        finally:
+            shutil.rmtree(target_dir)
+    return _result('access_by_file', {'keys': key_count, 'format': file_format.name, 'compression': compression},
+                   timings, driver, {'raw_file_load': statistics.median(load_timings)}, handler.get_metrics())
+
+
+def _write_check_files(target_dir: str, file_count: int, key_count: int) -> list[dict[str, str]]:
+    wa_profile_obj = build_session(key_count)
+    for i in range(file_count):
+        session = copy.deepcopy(wa_profile_obj)
+        # every fifth file is a copy of the previous one, every tenth file has no WASecretBundle
+        if i % 5 != 4:
+            session[1]['value'] = '"4917%08d:1@c.us"' % i
+        if i % 10 == 9:
+            session = session[1:]
+        SessionHandler.write_profile_file(session, os.path.join(target_dir, 'session-%04d' % i),
+                                          SessionFileFormat.COMPACT, 'zlib')
+    return wa_profile_obj
+
+
+def bench_check_sessions(file_count: int, key_count: int, repeat: int, latency: float,
+                         max_processes: Optional[int] = None) -> dict:
+    timings = []
+    live_timings = []
+    target_dir = tempfile.mkdtemp(prefix='wawebsession-bench-')
+    try:
+        _write_check_files(target_dir, file_count, key_count)
+        checker = SessionChecker(max_processes=max_processes, max_browsers=2,
+                                 handler_factory=lambda: _new_fake_handler(FakeWebDriver(latency=latency)))
+        for _ in range(repeat):
+            started = time.perf_counter()
+            report = checker.check([target_dir])
+            timings.append(time.perf_counter() - started)
+            started = time.perf_counter()
+            checker.check_live(report['results'])
+            live_timings.append(time.perf_counter() - started)
+    finally:
+        shutil.rmtree(target_dir)
+    result = _result('check_sessions', {'files': file_count, 'keys': key_count, 'processes': max_processes},
+                     timings, phases={'live_check': statistics.median(live_timings)})
+    result['summary'] = SessionChecker.summarize(report['results'])
+    return result
+
+
+def bench_real_browser(browser: str, key_count: int, repeat: int,
+                       launch_profile: LaunchProfile = LaunchProfile.DEFAULT) -> list[dict]:
+    results = []
+    params = {'browser': browser, 'keys': key_count, 'launch_profile': launch_profile.name.lower()}
+    wa_profile_obj = build_session(key_count)
+    with StandInPageServer(login_session=wa_profile_obj, load_delay=0.05, login_delay=0.2) as server:
+        handler = SessionHandler(browser=browser, log_level=logging.ERROR)
+        handler.set_launch_profile(launch_profile)
+        handler.enable_driver_pool(size=1, max_uses=repeat * 2 + 1)
+        try:
+            timings = []
+            metrics = SessionMetrics()
+            handler.set_metrics(metrics)
+            handler.set_url(server.url + '?autologin')
+            for _ in range(repeat):
+                started = time.perf_counter()
+                handler.create_new_session()
+                timings.append(time.perf_counter() - started)
+            results.append(_result('real_extract', params, timings, metrics=metrics))
+
+            timings = []
+            metrics = SessionMetrics()
+            handler.set_metrics(metrics)
+            handler.set_url(server.url)
+            for _ in range(repeat):
+                started = time.perf_counter()
+                handler.access_by_obj(wa_profile_obj)
+                timings.append(time.perf_counter() - started)
+            results.append(_result('real_inject', params, timings, metrics=metrics))
+        finally:
+            handler.disable_driver_pool()
+
+        target_dir = tempfile.mkdtemp(prefix='wawebsession-bench-')
+        try:
+            _write_check_files(target_dir, 10, key_count)
+            checker = SessionChecker(browser, max_browsers=2, url=server.url, launch_profile=launch_profile,
+                                     log_level=logging.ERROR)
+            started = time.perf_counter()
+            report = checker.check([target_dir], live=True)
+            result = _result('real_check_sessions', dict(params, files=10), [time.perf_counter() - started])
+            result['summary'] = SessionChecker.summarize(report['results'])
+            results.append(result)
+        finally:
+            shutil.rmtree(target_dir)
+    return results
+
+
+def run_benchmarks(sizes: list[int], profile_count: int, repeat: int, latency: float,
+                   real_browser: Optional[str] = None) -> dict:
+    results = []
+    for key_count in sizes:
+        results.append(bench_extract(key_count, repeat, latency))
+        results.append(bench_inject(key_count, repeat, latency))
+        for file_format, compression in ((SessionFileFormat.JSON, None), (SessionFileFormat.COMPACT, 'zlib')):
+            results.append(bench_access_by_file(key_count, file_format, compression, repeat, latency))
+    for file_format, compression in ((SessionFileFormat.JSON, None), (SessionFileFormat.COMPACT, None),
+                                     (SessionFileFormat.COMPACT, 'zlib'), (SessionFileFormat.COMPACT, 'lzma')):
+        results.append(bench_save_profiles(profile_count, 100, file_format, compression, repeat))
+    for max_processes in (1, None):
+        results.append(bench_check_sessions(200, min(sizes), repeat, latency, max_processes))
+    if real_browser:
+        # both launch profiles, so the memory usage (session_metrics.browser_rss) can be compared
+        for launch_profile in LaunchProfile:
+            results.extend(bench_real_browser(real_browser, min(sizes), repeat, launch_profile))
+    return {
+        'meta': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'timestamp': time.time(),
+            'repeat': repeat,
+            'latency_seconds': latency,
+        },
+        'results': results,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks for WaWebSession using a fake WebDriver.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 1000, 100000],
+                        help='number of keys per session (default: 10 1000 100000)')
+    parser.add_argument('--profiles', type=int, default=50, help='number of profiles for save_profile (default: 50)')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per scenario, the median is reported')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='simulated seconds per WebDriver round trip (default: 0)')
+    parser.add_argument('--real-browser', choices=[browser.name.lower() for browser in Browser],
+                        help='also run extraction and injection in a headless browser against a local stand-in page')
+    parser.add_argument('--output', help='write the JSON results to this file instead of stdout')
+    args = parser.parse_args()
+
+    report = run_benchmarks(args.sizes, args.profiles, args.repeat, args.latency, args.real_browser)
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(report, output_file, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
@@ -0,0 +1,440 @@
+# Writers for the on-disk IndexedDB formats that OfflineSessionReader decodes: LevelDB log and table files with
+# Chrome's IndexedDB key layout and Blink/V8 serialized values, and Firefox's IDB sqlite schema with SpiderMonkey
+# structured clone values. They follow the layouts of the browsers, so the fixtures and the round trip tests don't
+# depend on the readers they test.
+import os
+import sqlite3
+import struct
+from typing import Optional
+
+LOG_BLOCK_SIZE = 32768
+TABLE_MAGIC = 0xdb4775248b80fb57
+TYPE_DELETION = 0
+TYPE_VALUE = 1
+
+
+def _make_crc32c_table() -> list[int]:
+    table = []
+    for i in range(256):
+        crc = i
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0x82f63b78 if crc & 1 else crc >> 1
+        table.append(crc)
+    return table
+
+
+_CRC32C_TABLE = _make_crc32c_table()
+
+
+def crc32c(data: bytes) -> int:
+    crc = 0xffffffff
+    for byte in data:
+        crc = _CRC32C_TABLE[(crc ^ byte) & 0xff] ^ (crc >> 8)
+    return crc ^ 0xffffffff
+
+
+def masked_crc32c(data: bytes) -> int:
+    crc = crc32c(data)
+    return (((crc >> 15) | (crc << 17)) + 0xa282ead8) & 0xffffffff
+
+
+def varint(value: int) -> bytes:
+    out = bytearray()
+    while value >= 0x80:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+# Snappy
+
+def _snappy_literal(data: bytes) -> bytes:
+    length = len(data) - 1
+    if length < 60:
+        return bytes((length << 2,)) + data
+    extra_bytes = (length.bit_length() + 7) // 8
+    return bytes(((59 + extra_bytes) << 2,)) + length.to_bytes(extra_bytes, 'little') + data
+
+
+def _snappy_copy(offset: int, length: int) -> bytes:
+    out = bytearray()
+    while length > 0:
+        if 4 <= length <= 11 and offset < 2048:
+            out += bytes((((offset >> 8) << 5) | ((length - 4) << 2) | 1, offset & 0xff))
+            return bytes(out)
+        chunk = min(length, 64)
+        out += bytes((((chunk - 1) << 2) | 2,)) + offset.to_bytes(2, 'little')
+        length -= chunk
+    return bytes(out)
+
+
+def snappy_compress(data: bytes) -> bytes:
+    out = bytearray(varint(len(data)))
+    last_positions: dict[bytes, int] = {}
+    literal_start = 0
+    pos = 0
+    while pos + 4 <= len(data):
+        candidate = last_positions.get(data[pos:pos + 4])
+        last_positions[data[pos:pos + 4]] = pos
+        if candidate is None or pos - candidate > 0xffff:
+            pos += 1
+            continue
+        length = 4
+        while pos + length < len(data) and data[candidate + length] == data[pos + length]:
+            length += 1
+        if literal_start < pos:
+            out += _snappy_literal(data[literal_start:pos])
+        out += _snappy_copy(pos - candidate, length)
+        pos += length
+        literal_start = pos
+    if literal_start < len(data):
+        out += _snappy_literal(data[literal_start:])
+    return bytes(out)
+
+
+# LevelDB
+
+def encode_write_batch(sequence: int, operations: list[tuple[int, bytes, bytes]]) -> bytes:
+    batch = bytearray(struct.pack('<QI', sequence, len(operations)))
+    for record_type, key, value in operations:
+        batch += bytes((record_type,)) + varint(len(key)) + key
+        if record_type == TYPE_VALUE:
+            batch += varint(len(value)) + value
+    return bytes(batch)
+
+
+def write_log_file(file_path: str, batches: list[bytes]) -> None:
+    out = bytearray()
+    for batch in batches:
+        pos = 0
+        first = True
+        while True:
+            left_in_block = LOG_BLOCK_SIZE - len(out) % LOG_BLOCK_SIZE
+            if left_in_block < 7:
+                out += b'\x00' * left_in_block
+                continue
+            fragment = batch[pos:pos + left_in_block - 7]
+            pos += len(fragment)
+            last = pos >= len(batch)
+            record_type = (1 if last else 2) if first else (4 if last else 3)
+            out += struct.pack('<IHB', masked_crc32c(bytes((record_type,)) + fragment), len(fragment), record_type)
+            out += fragment
+            first = False
+            if last:
+                break
+    with open(file_path, 'wb') as file:
+        file.write(out)
+
+
+def _encode_block(entries: list[tuple[bytes, bytes]], restart_interval: int) -> bytes:
+    block = bytearray()
+    restarts = []
+    previous_key = b''
+    for i, (key, value) in enumerate(entries):
+        shared = 0
+        if i % restart_interval == 0:
+            restarts.append(len(block))
+        else:
+            while shared < min(len(key), len(previous_key)) and key[shared] == previous_key[shared]:
+                shared += 1
+        block += varint(shared) + varint(len(key) - shared) + varint(len(value)) + key[shared:] + value
+        previous_key = key
+    if not restarts:
+        restarts.append(0)
+    for restart in restarts:
+        block += struct.pack('<I', restart)
+    return bytes(block + struct.pack('<I', len(restarts)))
+
+
+def _append_block(table: bytearray, block: bytes, compress: bool) -> bytes:
+    compression = 0
+    if compress:
+        compressed = snappy_compress(block)
+        if len(compressed) < len(block) - len(block) // 8:
+            block, compression = compressed, 1
+    handle = varint(len(table)) + varint(len(block))
+    table += block + bytes((compression,)) + struct.pack('<I', masked_crc32c(block + bytes((compression,))))
+    return handle
+
+
+def write_table_file(file_path: str, entries: list[tuple[bytes, int, int, bytes]], block_size: int = 4096,
+                     compress: bool = True) -> None:
+    # entries: (user key, sequence, record type, value)
+    internal_entries = sorted(((key + struct.pack('<Q', (sequence << 8) | record_type), value)
+                               for key, sequence, record_type, value in entries),
+                              key=lambda entry: (entry[0][:-8], -int.from_bytes(entry[0][-8:], 'little')))
+    table = bytearray()
+    index_entries = []
+    block_entries = []
+    block_bytes = 0
+    for i, (key, value) in enumerate(internal_entries):
+        block_entries.append((key, value))
+        block_bytes += len(key) + len(value)
+        if block_bytes >= block_size or i == len(internal_entries) - 1:
+            index_entries.append((key, _append_block(table, _encode_block(block_entries, 16), compress)))
+            block_entries = []
+            block_bytes = 0
+    metaindex_handle = _append_block(table, _encode_block([], 1), False)
+    index_handle = _append_block(table, _encode_block(index_entries, 1), False)
+    footer = metaindex_handle + index_handle
+    table += footer + b'\x00' * (40 - len(footer)) + struct.pack('<Q', TABLE_MAGIC)
+    with open(file_path, 'wb') as file:
+        file.write(table)
+
+
+# Chrome IndexedDB on LevelDB
+
+def _encode_int(value: int) -> bytes:
+    return value.to_bytes(max((value.bit_length() + 7) // 8, 1), 'little')
+
+
+def chrome_key_prefix(database_id: int, object_store_id: int = 0, index_id: int = 0) -> bytes:
+    database_bytes, store_bytes, index_bytes = _encode_int(database_id), _encode_int(object_store_id), \
+        _encode_int(index_id)
+    first_byte = ((len(database_bytes) - 1) << 5) | ((len(store_bytes) - 1) << 2) | (len(index_bytes) - 1)
+    return bytes((first_byte,)) + database_bytes + store_bytes + index_bytes
+
+
+def chrome_string_with_length(value: str) -> bytes:
+    return varint(len(value)) + value.encode('utf-16-be')
+
+
+def chrome_idb_key(value: str) -> bytes:
+    # string keys (type byte 1)
+    return b'\x01' + chrome_string_with_length(value)
+
+
+def v8_serialize(value) -> bytes:
+    out = bytearray()
+
+    def write(item) -> None:
+        if item is None:
+            out.extend(b'0')
+        elif item is True:
+            out.extend(b'T')
+        elif item is False:
+            out.extend(b'F')
+        elif isinstance(item, int) and -2 ** 31 <= item < 2 ** 31:
+            out.extend(b'I' + varint(((item << 1) ^ (item >> 63)) & 0xffffffffffffffff))
+        elif isinstance(item, (int, float)):
+            out.extend(b'N' + struct.pack('<d', item))
+        elif isinstance(item, str):
+            if all(ord(char) < 256 for char in item):
+                raw = item.encode('latin-1')
+                out.extend(b'"' + varint(len(raw)) + raw)
+            else:
+                raw = item.encode('utf-16-le')
+                header = varint(len(raw))
+                if (len(out) + 1 + len(header)) % 2:
+                    # two-byte strings are aligned with padding tags
+                    out.append(0)
+                out.extend(b'c' + header + raw)
+        elif isinstance(item, dict):
+            out.extend(b'o')
+            for key, entry in item.items():
+                write(key)
+                write(entry)
+            out.extend(b'{' + varint(len(item)))
+        elif isinstance(item, list):
+            out.extend(b'A' + varint(len(item)))
+            for entry in item:
+                write(entry)
+            out.extend(b'$' + varint(0) + varint(len(item)))
+        else:
+            raise TypeError('Unsupported value: %r' % (item,))
+
+    write(value)
+    # Blink envelope (version 21 with the trailer offset) followed by the V8 header (version 15)
+    return b'\xff\x15\xfe' + struct.pack('<QI', 0, 0) + b'\xff\x0f' + bytes(out)
+
+
+def chrome_idb_value(value, compress: bool = False, version: int = 1) -> bytes:
+    serialized = v8_serialize(value)
+    if compress:
+        # Blink wraps large values: pseudo version 17, then 2 for snappy compression
+        serialized = b'\xff\x11\x02' + snappy_compress(serialized)
+    return varint(version) + serialized
+
+
+def chrome_database_entries(database_id: int, database_name: str, store_names: dict[int, str],
+                            origin: str = 'https_web.whatsapp.com_0') -> list[tuple[bytes, bytes]]:
+    entries = [
+        (chrome_key_prefix(0) + b'\xc9' + chrome_string_with_length(origin) + chrome_string_with_length(database_name),
+         _encode_int(database_id)),
+        # database metadata: version and max object store id
+        (chrome_key_prefix(database_id) + b'\x02', _encode_int(1)),
+        (chrome_key_prefix(database_id) + b'\x03', _encode_int(max(store_names))),
+    ]
+    for store_id, store_name in store_names.items():
+        entries.append((chrome_key_prefix(database_id) + b'\x32' + varint(store_id) + b'\x00',
+                        store_name.encode('utf-16-be')))
+        entries.append((chrome_key_prefix(database_id) + b'\x32' + varint(store_id) + b'\x01',
+                        'key'.encode('utf-16-be')))
+    return entries
+
+
+def chrome_record_entries(database_id: int, object_store_id: int, record, compress: bool = False) \
+        -> list[tuple[bytes, bytes]]:
+    key = chrome_idb_key(record['key'])
+    return [
+        (chrome_key_prefix(database_id, object_store_id, 1) + key, chrome_idb_value(record, compress)),
+        # exists entry, which has to be ignored by the reader
+        (chrome_key_prefix(database_id, object_store_id, 2) + key, varint(1)),
+    ]
+
+
+def write_chrome_profile(profile_dir: str, records: list[dict], table_records: Optional[list[dict]] = None,
+                         deleted_keys: tuple[str, ...] = (), compress_from: int = 2048) -> str:
+    # Records in "table_records" are written to a table file first, "records" and the deletions to the log
+    # afterwards, so the reader has to pick the newest version of every key.
+    idb_dir = os.path.join(profile_dir, 'Default', 'IndexedDB', 'https_web.whatsapp.com_0.indexeddb.leveldb')
+    os.makedirs(idb_dir, exist_ok=True)
+    meta_entries = [(chrome_key_prefix(0) + b'\x00', _encode_int(5))]
+    meta_entries += chrome_database_entries(2, 'model-storage', {1: 'user', 2: 'message'})
+    meta_entries += chrome_database_entries(3, 'wawc', {1: 'keys', 2: 'user'})
+    sequence = 1
+    table_entries = []
+    for key, value in meta_entries:
+        table_entries.append((key, sequence, TYPE_VALUE, value))
+        sequence += 1
+    for record in table_records or []:
+        for key, value in chrome_record_entries(3, 2, record):
+            table_entries.append((key, sequence, TYPE_VALUE, value))
+            sequence += 1
+    # records with the same keys in other stores and databases
+    for key, value in chrome_record_entries(2, 1, {'key': 'WASecretBundle', 'value': 'other database'}) + \
+            chrome_record_entries(3, 1, {'key': 'WASecretBundle', 'value': 'other store'}):
+        table_entries.append((key, sequence, TYPE_VALUE, value))
+        sequence += 1
+    write_table_file(os.path.join(idb_dir, '000005.ldb'), table_entries)
+
+    batches = []
+    for record in records:
+        operations = [(TYPE_VALUE, key, value) for key, value in
+                      chrome_record_entries(3, 2, record, len(str(record['value'])) >= compress_from)]
+        batches.append(encode_write_batch(sequence, operations))
+        sequence += len(operations)
+    operations = []
+    for deleted_key in deleted_keys:
+        operations.append((TYPE_DELETION, chrome_key_prefix(3, 2, 1) + chrome_idb_key(deleted_key), b''))
+        operations.append((TYPE_DELETION, chrome_key_prefix(3, 2, 2) + chrome_idb_key(deleted_key), b''))
+    if operations:
+        batches.append(encode_write_batch(sequence, operations))
+    write_log_file(os.path.join(idb_dir, '000006.log'), batches)
+
+    with open(os.path.join(idb_dir, 'CURRENT'), 'w') as file:
+        file.write('MANIFEST-000004\n')
+    return idb_dir
+
+
+# Firefox IndexedDB on sqlite
+
+SC_HEADER = 0xfff10000
+SC_NULL = 0xffff0000
+SC_BOOLEAN = 0xffff0002
+SC_INT32 = 0xffff0003
+SC_STRING = 0xffff0004
+SC_ARRAY_OBJECT = 0xffff0007
+SC_OBJECT_OBJECT = 0xffff0008
+SC_END_OF_KEYS = 0xffff0013
+
+
+def structured_clone_serialize(value) -> bytes:
+    out = bytearray()
+
+    def pair(tag: int, data: int) -> None:
+        out.extend(struct.pack('<II', data, tag))
+
+    def write(item) -> None:
+        if item is None:
+            pair(SC_NULL, 0)
+        elif isinstance(item, bool):
+            pair(SC_BOOLEAN, int(item))
+        elif isinstance(item, int) and -2 ** 31 <= item < 2 ** 31:
+            pair(SC_INT32, item & 0xffffffff)
+        elif isinstance(item, (int, float)):
+            out.extend(struct.pack('<d', item))
+        elif isinstance(item, str):
+            if all(ord(char) < 256 for char in item):
+                raw = item.encode('latin-1')
+                pair(SC_STRING, len(item) | 0x80000000)
+            else:
+                raw = item.encode('utf-16-le')
+                pair(SC_STRING, len(raw) // 2)
+            out.extend(raw + b'\x00' * (-len(raw) % 8))
+        elif isinstance(item, dict):
+            pair(SC_OBJECT_OBJECT, 0)
+            for key, entry in item.items():
+                write(key)
+                write(entry)
+            pair(SC_END_OF_KEYS, 0)
+        elif isinstance(item, list):
+            pair(SC_ARRAY_OBJECT, len(item))
+            for i, entry in enumerate(item):
+                write(i)
+                write(entry)
+            pair(SC_END_OF_KEYS, 0)
+        else:
+            raise TypeError('Unsupported value: %r' % (item,))
+
+    pair(SC_HEADER, 2)
+    write(value)
+    return bytes(out)
+
+
+def firefox_idb_key(value: str) -> bytes:
+    # string keys (type byte 0x30), characters are shifted by one so 0 can end the key
+    out = bytearray(b'\x30')
+    for char in value:
+        code = ord(char)
+        if code <= 0x7e:
+            out.append(code + 1)
+        elif code <= 0x3fff + 0x7f:
+            code -= 0x7f
+            out += bytes((0x80 | (code >> 8), code & 0xff))
+        else:
+            out += bytes((0xc0 | (code >> 10), (code >> 2) & 0xff, (code & 3) << 6))
+    return bytes(out)
+
+
+def write_firefox_idb(sqlite_file: str, database_name: str, records: list[dict], compress: bool = True) -> None:
+    os.makedirs(os.path.dirname(sqlite_file), exist_ok=True)
+    if os.path.exists(sqlite_file):
+        os.remove(sqlite_file)
+    connection = sqlite3.connect(sqlite_file)
+    try:
+        connection.executescript('''
+            CREATE TABLE database (name TEXT PRIMARY KEY, origin TEXT NOT NULL, version INTEGER NOT NULL DEFAULT 0,
+                                   last_vacuum_time INTEGER NOT NULL DEFAULT 0,
+                                   last_analyze_time INTEGER NOT NULL DEFAULT 0,
+                                   last_vacuum_size INTEGER NOT NULL DEFAULT 0) WITHOUT ROWID;
+            CREATE TABLE object_store (id INTEGER PRIMARY KEY, auto_increment INTEGER NOT NULL DEFAULT 0,
+                                       name TEXT NOT NULL, key_path TEXT);
+            CREATE TABLE object_data (object_store_id INTEGER NOT NULL, key BLOB NOT NULL,
+                                      index_data_values BLOB DEFAULT NULL, file_ids TEXT, data BLOB NOT NULL,
+                                      PRIMARY KEY (object_store_id, key)) WITHOUT ROWID;
+        ''')
+        connection.execute('INSERT INTO database (name, origin, version) VALUES (?, ?, ?)',
+                           (database_name, 'https://web.whatsapp.com', 1))
+        connection.executemany('INSERT INTO object_store (id, name, key_path) VALUES (?, ?, ?)',
+                               [(1, 'keys', 'key'), (2, 'user', 'key')])
+        for store_id, store_records in ((1, [{'key': 'WASecretBundle', 'value': 'other store'}]), (2, records)):
+            for record in store_records:
+                data = structured_clone_serialize(record)
+                connection.execute('INSERT INTO object_data (object_store_id, key, data) VALUES (?, ?, ?)',
+                                   (store_id, firefox_idb_key(record['key']),
+                                    snappy_compress(data) if compress else data))
+        connection.commit()
+    finally:
+        connection.close()
+
+
+def write_firefox_profile(profile_dir: str, records: list[dict], compress: bool = True) -> str:
+    idb_dir = os.path.join(profile_dir, 'storage', 'default', 'https+++web.whatsapp.com', 'idb')
+    # another database of the origin, which is sorted before wawc
+    write_firefox_idb(os.path.join(idb_dir, '1006217148esngaatrsoe-dloem.sqlite'), 'model-storage',
+                      [{'key': 'WASecretBundle', 'value': 'other database'}], compress)
+    sqlite_file = os.path.join(idb_dir, '3165909829wcaw.sqlite')
+    write_firefox_idb(sqlite_file, 'wawc', records, compress)
+    return sqlite_file
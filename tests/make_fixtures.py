@@ -0,0 +1,44 @@
+# Recreates the browser profile fixtures in tests/fixtures. The output is deterministic, so running it again
+# must not change the committed files.
+import json
+import os
+import shutil
+
+import idb_writers
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+# the wawc user store of a logged in session, sorted by key like OfflineSessionReader returns it
+SESSION_RECORDS = [
+    {'key': 'WABrowserId', 'value': '"Mjk0NDc5NjE5NzQ3NjQ5Mg=="'},
+    {'key': 'WASecretBundle', 'value': json.dumps({'key': 'k' * 44, 'encKey': 'e' * 44, 'macKey': 'm' * 44})},
+    {'key': 'WAToken1', 'value': '"' + 'T' * 43 + '="'},
+    {'key': 'WAToken2', 'value': '"1@' + 'x' * 5000 + '"'},
+    {'key': 'last-wid-md', 'value': '"491700000000:1@c.us"'},
+    {'key': 'mutex', 'value': 'Grüße ✓'},
+    {'key': 'remember-me', 'value': 'true'},
+    {'key': 'storage-version', 'value': 5},
+]
+# older versions in the LevelDB table, which are replaced or deleted by the log
+OUTDATED_RECORDS = [
+    {'key': 'last-wid-md', 'value': '"491700000000:0@c.us"'},
+    {'key': 'logout-token', 'value': '"outdated"'},
+    {'key': 'remember-me', 'value': 'false'},
+]
+DELETED_KEYS = ('logout-token',)
+
+
+def main() -> None:
+    if os.path.isdir(FIXTURES_DIR):
+        shutil.rmtree(FIXTURES_DIR)
+    os.makedirs(FIXTURES_DIR)
+    idb_writers.write_chrome_profile(os.path.join(FIXTURES_DIR, 'chrome_profile'), SESSION_RECORDS,
+                                     OUTDATED_RECORDS, DELETED_KEYS)
+    idb_writers.write_firefox_profile(os.path.join(FIXTURES_DIR, 'firefox_profile'), SESSION_RECORDS)
+    with open(os.path.join(FIXTURES_DIR, 'session.json'), 'w') as file:
+        json.dump(SESSION_RECORDS, file, indent=2, ensure_ascii=False)
+        file.write('\n')
+
+
+if __name__ == '__main__':
+    main()
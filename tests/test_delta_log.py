@@ -0,0 +1,129 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(TESTS_DIR))
+
+import WaWebSession  # noqa: E402
+from WaWebSession import SessionFileFormat, SessionHandler  # noqa: E402
+
+FILE_FORMATS = ((SessionFileFormat.JSON, None), (SessionFileFormat.COMPACT, None), (SessionFileFormat.COMPACT, 'zlib'))
+
+
+def build_session() -> list[dict]:
+    return [
+        {'key': 'WASecretBundle', 'value': json.dumps({'key': 'k' * 44, 'encKey': 'e' * 44, 'macKey': 'm' * 44})},
+        {'key': 'WAToken1', 'value': '"token-1"'},
+        {'key': 'WAToken2', 'value': '"token-2"'},
+        {'key': 'last-wid-md', 'value': '"491700000000:1@c.us"'},
+        {'key': 'storage-version', 'value': 5},
+    ]
+
+
+class LsObjectTest(unittest.TestCase):
+    def test_diff(self):
+        old_ls_obj = {'kept': '1', 'changed': '1', 'removed': '1'}
+        new_ls_obj = {'kept': '1', 'changed': '2', 'added': '1'}
+        self.assertEqual(SessionHandler.diff_ls_objects(old_ls_obj, new_ls_obj),
+                         {'added': {'added': '1'}, 'changed': {'changed': '2'}, 'removed': ['removed']})
+        self.assertEqual(SessionHandler.diff_ls_objects(old_ls_obj, dict(old_ls_obj)),
+                         {'added': {}, 'changed': {}, 'removed': []})
+
+    def test_merge(self):
+        load_ls_obj = {'same': '0', 'browser': '0', 'idb': '0', 'both': '0', 'dropped': '0', 'idb-only': '0'}
+        browser_ls_obj = {'same': '0', 'browser': '1', 'idb': '0', 'both': '1', 'new-browser': '1'}
+        idb_ls_obj = {'same': '0', 'browser': '0', 'idb': '2', 'both': '2', 'idb-only': '0', 'new-idb': '2',
+                      'new-browser': '2'}
+        self.assertEqual(SessionHandler.merge_ls_objects(load_ls_obj, browser_ls_obj, idb_ls_obj), {
+            'same': '0',
+            'browser': '1',
+            'idb': '2',
+            # a key changed on both sides takes the value of the first object, like get_newer_obj_from_ls_cmp
+            'both': '1',
+            # a key that is only left in one of the objects is kept, 'dropped' is gone from both
+            'idb-only': '0',
+            'new-browser': '1',
+            'new-idb': '2',
+        })
+
+    def test_merge_unchanged(self):
+        ls_obj = {'a': '1', 'b': '2'}
+        self.assertEqual(SessionHandler.merge_ls_objects(ls_obj, dict(ls_obj), dict(ls_obj)), ls_obj)
+
+
+class DeltaLogTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp(prefix='wawebsession-test-')
+        self.file_path = os.path.join(self.tmp_dir, 'session.wasession')
+        self.delta_path = self.file_path + WaWebSession._DELTA_SUFFIX
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def append_deltas(self) -> list[dict]:
+        SessionHandler.append_profile_delta(self.file_path, {'added': {'new-key': '"new"'},
+                                                             'changed': {'WAToken1': '"token-1b"'},
+                                                             'removed': ['WAToken2']})
+        SessionHandler.append_profile_delta(self.file_path, {'added': {'WAToken2': '"token-2b"'},
+                                                             'changed': {'WAToken1': '"token-1c"'},
+                                                             'removed': ['storage-version']})
+        expected_obj = build_session()
+        expected_obj[1]['value'] = '"token-1c"'
+        expected_obj[2]['value'] = '"token-2b"'
+        del expected_obj[4]
+        return expected_obj + [{'key': 'new-key', 'value': '"new"'}]
+
+    def test_apply_deltas(self):
+        for file_format, compression in FILE_FORMATS:
+            with self.subTest(file_format=file_format, compression=compression):
+                SessionHandler.write_profile_file(build_session(), self.file_path, file_format, compression)
+                expected_obj = self.append_deltas()
+                self.assertEqual(SessionHandler.load_profile(self.file_path), expected_obj)
+                self.assertEqual(list(SessionHandler.iter_profile_file(self.file_path)), expected_obj)
+
+    def test_empty_diff(self):
+        SessionHandler.write_profile_file(build_session(), self.file_path)
+        self.assertFalse(SessionHandler.append_profile_delta(self.file_path, {'added': {}, 'changed': {},
+                                                                              'removed': []}))
+        self.assertFalse(os.path.exists(self.delta_path))
+        self.assertFalse(SessionHandler.compact_profile_file(self.file_path))
+
+    def test_damaged_last_line(self):
+        SessionHandler.write_profile_file(build_session(), self.file_path)
+        expected_obj = self.append_deltas()
+        with open(self.delta_path, 'a') as file:
+            file.write('{"saved_at": 1, "set": {"WAToken1": "\\"cut')
+        self.assertEqual(SessionHandler.load_profile(self.file_path), expected_obj)
+        self.assertEqual(WaWebSession._read_delta_log(self.file_path)[2], 2)
+
+    def test_compact(self):
+        for file_format, compression in FILE_FORMATS:
+            with self.subTest(file_format=file_format, compression=compression):
+                SessionHandler.write_profile_file(build_session(), self.file_path, file_format, compression)
+                expected_obj = self.append_deltas()
+                self.assertTrue(SessionHandler.compact_profile_file(self.file_path))
+                self.assertFalse(os.path.exists(self.delta_path))
+                self.assertFalse(os.path.exists(self.file_path + '.tmp'))
+                self.assertEqual(SessionHandler.get_profile_file_format(self.file_path), (file_format, compression))
+                self.assertEqual(SessionHandler.load_profile(self.file_path), expected_obj)
+
+    def test_write_removes_stale_delta(self):
+        SessionHandler.write_profile_file(build_session(), self.file_path)
+        self.append_deltas()
+        SessionHandler.write_profile_file(build_session(), self.file_path, SessionFileFormat.COMPACT)
+        self.assertFalse(os.path.exists(self.delta_path))
+        self.assertEqual(SessionHandler.load_profile(self.file_path), build_session())
+
+    def test_profile_dict_ignores_deltas(self):
+        # files with several profiles are never written back through the delta log
+        SessionHandler.write_profile_file({'Default': build_session()}, self.file_path)
+        SessionHandler.append_profile_delta(self.file_path, {'changed': {'WAToken1': '"token-1b"'}})
+        self.assertEqual(SessionHandler.load_profile(self.file_path), {'Default': build_session()})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,220 @@
+import json
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(TESTS_DIR))
+sys.path.insert(0, TESTS_DIR)
+
+import idb_writers  # noqa: E402
+import WaWebSession  # noqa: E402
+from WaWebSession import Browser, OfflineSessionReader  # noqa: E402
+
+FIXTURES_DIR = os.path.join(TESTS_DIR, 'fixtures')
+CHROME_PROFILE = os.path.join(FIXTURES_DIR, 'chrome_profile')
+FIREFOX_PROFILE = os.path.join(FIXTURES_DIR, 'firefox_profile')
+
+SAMPLE_VALUES = [
+    None, True, False, 0, 1, -1, 2 ** 31 - 1, -2 ** 31, 2 ** 40, 0.5, -1e300, '', 'latin-1 only: äöü',
+    'two-byte: ✓ €', {'key': 'WASecretBundle', 'value': '{"key":"k"}'}, [], [1, 'two', [3.5, None]],
+    {'nested': {'list': ['✓', {'deep': True}], 'number': -7}},
+]
+
+
+def load_expected_session() -> list[dict]:
+    with open(os.path.join(FIXTURES_DIR, 'session.json'), 'r') as file:
+        return json.load(file)
+
+
+def random_session(rng: random.Random, record_count: int) -> list[dict]:
+    records = [{'key': 'WASecretBundle', 'value': json.dumps({'key': 'k' * 44, 'encKey': 'e' * 44})}]
+    for i in range(record_count):
+        value_length = rng.choice((0, 1, 60, 500, 3000, 40000))
+        alphabet = rng.choice(('abc', 'abcdefghijklmnopqrstuvwxyz0123456789', 'äöü✓€xyz'))
+        records.append({'key': 'record-%04d' % i,
+                        'value': ''.join(rng.choice(alphabet) for _ in range(value_length))})
+    return sorted(records, key=lambda record: record['key'])
+
+
+class SnappyTest(unittest.TestCase):
+    def test_known_stream(self):
+        # one literal and an overlapping copy-1 element, like the reference implementation writes it
+        self.assertEqual(WaWebSession._snappy_decompress(b'\x0a\x00a\x15\x01'), b'a' * 10)
+
+    def test_round_trip(self):
+        rng = random.Random(5)
+        for length in (0, 1, 59, 60, 61, 256, 257, 65536, 70000):
+            for data in (bytes(rng.randrange(256) for _ in range(length)), (b'wawc-user' * length)[:length]):
+                self.assertEqual(WaWebSession._snappy_decompress(idb_writers.snappy_compress(data)), data)
+
+    def test_invalid_offset(self):
+        with self.assertRaises(ValueError):
+            WaWebSession._snappy_decompress(b'\x08\x15\x05')
+
+    def test_wrong_length(self):
+        with self.assertRaises(ValueError):
+            WaWebSession._snappy_decompress(b'\x05\x00a')
+
+
+class ValueDecoderTest(unittest.TestCase):
+    def test_v8_round_trip(self):
+        for value in SAMPLE_VALUES:
+            with self.subTest(value=value):
+                self.assertEqual(WaWebSession._V8Deserializer(idb_writers.v8_serialize(value)).read_value(), value)
+
+    def test_v8_back_reference(self):
+        # {"a": {}, "b": <reference to the inner object>}
+        data = b'\xff\x0fo"\x01ao{\x00"\x01b^\x01{\x02'
+        value = WaWebSession._V8Deserializer(data).read_value()
+        self.assertEqual(value, {'a': {}, 'b': {}})
+        self.assertIs(value['a'], value['b'])
+
+    def test_v8_unsupported_tag(self):
+        with self.assertRaises(ValueError):
+            WaWebSession._V8Deserializer(b'\xff\x0fm').read_value()
+
+    def test_structured_clone_round_trip(self):
+        for value in SAMPLE_VALUES:
+            with self.subTest(value=value):
+                data = idb_writers.structured_clone_serialize(value)
+                self.assertEqual(WaWebSession._StructuredCloneReader(data).read_value(), value)
+
+    def test_structured_clone_unsupported_tag(self):
+        with self.assertRaises(ValueError):
+            WaWebSession._StructuredCloneReader(b'\x00\x00\x00\x00\x0f\x00\xff\xff').read_value()
+
+
+class LevelDbReaderTest(unittest.TestCase):
+    def setUp(self):
+        self.db_dir = tempfile.mkdtemp(prefix='wawebsession-test-')
+
+    def tearDown(self):
+        shutil.rmtree(self.db_dir)
+
+    def test_newest_version_wins(self):
+        idb_writers.write_table_file(os.path.join(self.db_dir, '000005.ldb'), [
+            (b'changed', 1, idb_writers.TYPE_VALUE, b'old'),
+            (b'deleted', 2, idb_writers.TYPE_VALUE, b'old'),
+            (b'kept', 3, idb_writers.TYPE_VALUE, b'old'),
+        ])
+        idb_writers.write_log_file(os.path.join(self.db_dir, '000006.log'), [
+            idb_writers.encode_write_batch(4, [(idb_writers.TYPE_VALUE, b'changed', b'new'),
+                                               (idb_writers.TYPE_DELETION, b'deleted', b'')]),
+            idb_writers.encode_write_batch(6, [(idb_writers.TYPE_VALUE, b'added', b'new')]),
+        ])
+        self.assertEqual(WaWebSession._LevelDbReader(self.db_dir).read_all(),
+                         {b'changed': b'new', b'kept': b'old', b'added': b'new'})
+
+    def test_table_blocks(self):
+        rng = random.Random(7)
+        entries = {b'key-%05d' % i: bytes(rng.randrange(256) for _ in range(rng.randrange(200)))
+                   for i in range(2000)}
+        for compress in (False, True):
+            with self.subTest(compress=compress):
+                idb_writers.write_table_file(os.path.join(self.db_dir, '000005.ldb'), [
+                    (key, i + 1, idb_writers.TYPE_VALUE, value) for i, (key, value) in enumerate(entries.items())
+                ], block_size=1024, compress=compress)
+                self.assertEqual(WaWebSession._LevelDbReader(self.db_dir).read_all(), entries)
+
+    def test_log_fragments(self):
+        # batches bigger than a log block are split into first, middle and last fragments
+        rng = random.Random(9)
+        entries = {b'big-%d' % i: bytes(rng.randrange(256) for _ in range(50000)) for i in range(3)}
+        entries[b'small'] = b'value'
+        idb_writers.write_log_file(os.path.join(self.db_dir, '000003.log'), [
+            idb_writers.encode_write_batch(i + 1, [(idb_writers.TYPE_VALUE, key, value)])
+            for i, (key, value) in enumerate(entries.items())
+        ])
+        self.assertEqual(WaWebSession._LevelDbReader(self.db_dir).read_all(), entries)
+
+    def test_not_a_table(self):
+        with open(os.path.join(self.db_dir, '000005.ldb'), 'wb') as file:
+            file.write(b'\x00' * 64)
+        with self.assertRaises(ValueError):
+            WaWebSession._LevelDbReader(self.db_dir).read_all()
+
+
+class OfflineSessionReaderFixtureTest(unittest.TestCase):
+    def test_chrome_profile(self):
+        self.assertEqual(OfflineSessionReader.read_profile(Browser.CHROME, CHROME_PROFILE), load_expected_session())
+
+    def test_firefox_profile(self):
+        self.assertEqual(OfflineSessionReader.read_profile(Browser.FIREFOX, FIREFOX_PROFILE),
+                         load_expected_session())
+
+    def test_fixture_session_is_valid(self):
+        wa_profile_obj = OfflineSessionReader.read_profile(Browser.CHROME, CHROME_PROFILE)
+        self.assertTrue(WaWebSession.SessionHandler.verify_profile_object(wa_profile_obj))
+        self.assertEqual(WaWebSession.SessionHandler.get_account_id(wa_profile_obj), '491700000000@c.us')
+
+    def test_find_idb_files(self):
+        self.assertTrue(OfflineSessionReader.find_chrome_idb_dir(CHROME_PROFILE).endswith(
+            OfflineSessionReader.CHROME_IDB_DIR))
+        self.assertEqual([os.path.basename(sqlite_file) for sqlite_file in
+                          OfflineSessionReader.find_firefox_idb_files(FIREFOX_PROFILE)],
+                         ['1006217148esngaatrsoe-dloem.sqlite', '3165909829wcaw.sqlite'])
+
+    def test_fingerprint(self):
+        for browser, profile_dir in ((Browser.CHROME, CHROME_PROFILE), (Browser.FIREFOX, FIREFOX_PROFILE)):
+            with self.subTest(browser=browser):
+                fingerprint = OfflineSessionReader.get_idb_fingerprint(browser, profile_dir)
+                self.assertIsNotNone(fingerprint)
+                self.assertEqual(fingerprint, OfflineSessionReader.get_idb_fingerprint(browser, profile_dir))
+
+
+class OfflineSessionReaderRoundTripTest(unittest.TestCase):
+    def setUp(self):
+        self.profile_dir = tempfile.mkdtemp(prefix='wawebsession-test-')
+
+    def tearDown(self):
+        shutil.rmtree(self.profile_dir)
+
+    def test_chrome_round_trip(self):
+        wa_profile_obj = random_session(random.Random(11), 40)
+        idb_writers.write_chrome_profile(self.profile_dir, wa_profile_obj, wa_profile_obj[:10],
+                                         ('outdated-only',))
+        self.assertEqual(OfflineSessionReader.read_profile(Browser.CHROME, self.profile_dir), wa_profile_obj)
+
+    def test_firefox_round_trip(self):
+        for compress in (True, False):
+            with self.subTest(compress=compress):
+                wa_profile_obj = random_session(random.Random(13), 40)
+                idb_writers.write_firefox_profile(self.profile_dir, wa_profile_obj, compress)
+                self.assertEqual(OfflineSessionReader.read_profile(Browser.FIREFOX, self.profile_dir),
+                                 wa_profile_obj)
+
+    def test_missing_idb(self):
+        for browser in (Browser.CHROME, Browser.FIREFOX):
+            with self.subTest(browser=browser):
+                with self.assertRaises(FileNotFoundError):
+                    OfflineSessionReader.read_profile(browser, self.profile_dir)
+                self.assertIsNone(OfflineSessionReader.get_idb_fingerprint(browser, self.profile_dir))
+
+    def test_missing_database(self):
+        idb_dir = os.path.join(self.profile_dir, 'IndexedDB', OfflineSessionReader.CHROME_IDB_DIR)
+        os.makedirs(idb_dir)
+        idb_writers.write_table_file(os.path.join(idb_dir, '000005.ldb'), [
+            (key, i + 1, idb_writers.TYPE_VALUE, value) for i, (key, value) in
+            enumerate(idb_writers.chrome_database_entries(2, 'model-storage', {1: 'user'}))
+        ])
+        with self.assertRaises(LookupError):
+            OfflineSessionReader.read_profile(Browser.CHROME, self.profile_dir)
+
+    def test_missing_object_store(self):
+        sqlite_file = os.path.join(self.profile_dir, 'wawc.sqlite')
+        idb_writers.write_firefox_idb(sqlite_file, 'wawc', [])
+        connection = sqlite3.connect(sqlite_file)
+        connection.execute("DELETE FROM object_store WHERE name = 'user'")
+        connection.commit()
+        connection.close()
+        with self.assertRaises(LookupError):
+            OfflineSessionReader.read_firefox_idb(sqlite_file)
+
+
+if __name__ == '__main__':
+    unittest.main()
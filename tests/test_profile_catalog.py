@@ -0,0 +1,202 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(TESTS_DIR))
+
+from WaWebSession import Browser, OfflineSessionReader, ProfileCatalog  # noqa: E402
+
+
+def make_dirs(*path_parts: str) -> str:
+    path = os.path.join(*path_parts)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def add_chrome_whatsapp(profile_dir: str) -> None:
+    make_dirs(profile_dir, 'IndexedDB', OfflineSessionReader.CHROME_IDB_DIR)
+
+
+def add_firefox_whatsapp(profile_dir: str) -> None:
+    idb_dir = make_dirs(profile_dir, 'storage', 'default', OfflineSessionReader.FIREFOX_ORIGIN_DIR, 'idb')
+    open(os.path.join(idb_dir, '3165909829wcaw.sqlite'), 'wb').close()
+
+
+def touch_later(path: str, seconds: int = 10) -> None:
+    # NOTE: Some file systems only update the mtime every few milliseconds, so it is moved on explicitly.
+    file_stat = os.stat(path)
+    os.utime(path, ns=(file_stat.st_atime_ns, file_stat.st_mtime_ns + seconds * 10 ** 9))
+
+
+def names(profiles: list[dict]) -> list[str]:
+    return [profile['name'] for profile in profiles]
+
+
+class ChromeProfileCatalogTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp(prefix='wawebsession-test-')
+        self.user_dir = make_dirs(self.tmp_dir, 'User Data')
+        self.local_state_path = os.path.join(self.user_dir, 'Local State')
+        add_chrome_whatsapp(make_dirs(self.user_dir, 'Default'))
+        make_dirs(self.user_dir, 'Profile 1')
+        make_dirs(self.user_dir, 'System Profile')
+        make_dirs(self.user_dir, 'Crashpad')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def write_local_state(self, info_cache: dict) -> None:
+        with open(self.local_state_path, 'w', encoding='utf-8') as file:
+            json.dump({'profile': {'info_cache': info_cache}}, file)
+
+    def test_local_state(self):
+        self.write_local_state({
+            'Default': {'name': 'Person 1'},
+            'Profile 1': {'name': 'Arbeit ✓'},
+            # profiles that were deleted on disk and the internal system profile are left out
+            'Profile 2': {'name': 'Deleted'},
+            'System Profile': {'name': 'System'},
+        })
+        self.assertEqual(ProfileCatalog(Browser.CHROME, self.user_dir).get_profiles(), [
+            {'name': '', 'path': self.user_dir, 'display_name': 'Person 1', 'has_whatsapp': True},
+            {'name': 'Profile 1', 'path': os.path.join(self.user_dir, 'Profile 1'), 'display_name': 'Arbeit ✓',
+             'has_whatsapp': False},
+        ])
+
+    def test_directory_scan(self):
+        # without a Local State file, e.g. a copied user dir, the profiles are found by their directory names
+        catalog = ProfileCatalog(Browser.CHROME, self.user_dir)
+        self.assertEqual(names(catalog.get_profiles()), ['', 'Profile 1'])
+        self.assertEqual([profile['display_name'] for profile in catalog.get_profiles()], [None, None])
+
+    def test_invalid_local_state(self):
+        for local_state_data in ('{"profile": ', '[]', '{"profile": {"info_cache": []}}'):
+            with self.subTest(local_state_data=local_state_data):
+                with open(self.local_state_path, 'w') as file:
+                    file.write(local_state_data)
+                with self.assertLogs('WaWebSession:ProfileCatalog', 'WARNING'):
+                    self.assertEqual(names(ProfileCatalog(Browser.CHROME, self.user_dir).get_profiles()),
+                                     ['', 'Profile 1'])
+
+    def test_whatsapp_only(self):
+        self.write_local_state({'Default': {}, 'Profile 1': {}})
+        catalog = ProfileCatalog(Browser.CHROME, self.user_dir)
+        self.assertEqual(catalog.get_profile_names(), ['', 'Profile 1'])
+        self.assertEqual(catalog.get_profile_names(whatsapp_only=True), [''])
+
+    def test_cache_follows_changes(self):
+        self.write_local_state({'Default': {}, 'Profile 1': {}})
+        catalog = ProfileCatalog(Browser.CHROME, self.user_dir)
+        self.assertEqual(catalog.get_profile_names(whatsapp_only=True), [''])
+
+        add_chrome_whatsapp(os.path.join(self.user_dir, 'Profile 1'))
+        self.assertEqual(catalog.get_profile_names(whatsapp_only=True), ['', 'Profile 1'])
+
+        make_dirs(self.user_dir, 'Profile 2')
+        self.write_local_state({'Default': {}, 'Profile 1': {}, 'Profile 2': {}})
+        touch_later(self.local_state_path)
+        self.assertEqual(catalog.get_profile_names(), ['', 'Profile 1', 'Profile 2'])
+
+    def test_invalidate(self):
+        self.write_local_state({'Default': {}})
+        catalog = ProfileCatalog(Browser.CHROME, self.user_dir)
+        self.assertEqual(catalog.get_profile_names(), [''])
+
+        # a change that keeps every mtime is only seen after invalidate()
+        local_state_stat = os.stat(self.local_state_path)
+        user_dir_stat = os.stat(self.user_dir)
+        self.write_local_state({'Default': {}, 'Profile 1': {}})
+        os.utime(self.local_state_path, ns=(local_state_stat.st_atime_ns, local_state_stat.st_mtime_ns))
+        os.utime(self.user_dir, ns=(user_dir_stat.st_atime_ns, user_dir_stat.st_mtime_ns))
+        self.assertEqual(catalog.get_profile_names(), [''])
+        catalog.invalidate()
+        self.assertEqual(catalog.get_profile_names(), ['', 'Profile 1'])
+
+    def test_missing_user_dir(self):
+        with self.assertRaises(FileNotFoundError):
+            ProfileCatalog(Browser.CHROME, os.path.join(self.tmp_dir, 'missing')).get_profiles()
+
+
+class FirefoxProfileCatalogTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp(prefix='wawebsession-test-')
+        self.user_dir = make_dirs(self.tmp_dir, 'firefox')
+        self.outside_profile = make_dirs(self.tmp_dir, 'elsewhere', 'portable')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def write_ini(self, ini_dir: str, profile_sections: list[str]) -> str:
+        ini_path = os.path.join(ini_dir, 'profiles.ini')
+        with open(ini_path, 'w', encoding='utf-8') as file:
+            file.write('[Install4F96D1932A9F858E]\nDefault=abcd1234.default-release\nLocked=1\n\n')
+            file.write('[General]\nStartWithLastProfile=1\nVersion=2\n\n')
+            file.write('\n'.join(profile_sections))
+        return ini_path
+
+    def test_profiles_ini(self):
+        add_firefox_whatsapp(make_dirs(self.user_dir, 'abcd1234.default-release'))
+        make_dirs(self.user_dir, 'efgh5678.default')
+        self.write_ini(self.user_dir, [
+            '[Profile1]\nName=default\nIsRelative=1\nPath=efgh5678.default\nDefault=1\n',
+            '[Profile0]\nName=default-release\nIsRelative=1\nPath=abcd1234.default-release\n',
+            '[Profile2]\nName=Portable\nIsRelative=0\nPath=%s\n' % self.outside_profile,
+            # a profile that was deleted on disk and a section without a path are left out
+            '[Profile3]\nName=deleted\nIsRelative=1\nPath=deleted.profile\n',
+            '[Profile4]\nName=broken\n',
+        ])
+        self.assertEqual(ProfileCatalog(Browser.FIREFOX, self.user_dir).get_profiles(), [
+            {'name': 'efgh5678.default', 'path': os.path.join(self.user_dir, 'efgh5678.default'),
+             'display_name': 'default', 'has_whatsapp': False},
+            {'name': 'abcd1234.default-release', 'path': os.path.join(self.user_dir, 'abcd1234.default-release'),
+             'display_name': 'default-release', 'has_whatsapp': True},
+            # profiles outside of the user dir are named by their absolute path
+            {'name': self.outside_profile, 'path': self.outside_profile, 'display_name': 'Portable',
+             'has_whatsapp': False},
+        ])
+
+    def test_profiles_ini_in_parent_dir(self):
+        # the Windows layout: profiles.ini next to the Profiles directory that is used as user dir
+        profiles_dir = make_dirs(self.user_dir, 'Profiles')
+        add_firefox_whatsapp(make_dirs(profiles_dir, 'abcd1234.default-release'))
+        self.write_ini(self.user_dir, [
+            '[Profile0]\nName=default-release\nIsRelative=1\nPath=Profiles/abcd1234.default-release\n',
+        ])
+        catalog = ProfileCatalog(Browser.FIREFOX, profiles_dir)
+        self.assertEqual(catalog.get_profile_names(whatsapp_only=True), ['abcd1234.default-release'])
+
+    def test_directory_scan(self):
+        add_firefox_whatsapp(make_dirs(self.user_dir, 'abcd1234.default-release'))
+        make_dirs(self.user_dir, 'efgh5678.default')
+        make_dirs(self.user_dir, 'ijkl9012.work')
+        open(os.path.join(self.user_dir, 'installs.ini'), 'w').close()
+        catalog = ProfileCatalog(Browser.FIREFOX, self.user_dir)
+        self.assertEqual(catalog.get_profile_names(), ['abcd1234.default-release', 'ijkl9012.work'])
+        self.assertEqual(catalog.get_profile_names(whatsapp_only=True), ['abcd1234.default-release'])
+
+    def test_cache_follows_changes(self):
+        make_dirs(self.user_dir, 'abcd1234.default-release')
+        ini_path = self.write_ini(self.user_dir, [
+            '[Profile0]\nName=default-release\nIsRelative=1\nPath=abcd1234.default-release\n',
+        ])
+        catalog = ProfileCatalog(Browser.FIREFOX, self.user_dir)
+        self.assertEqual(catalog.get_profile_names(whatsapp_only=True), [])
+
+        add_firefox_whatsapp(os.path.join(self.user_dir, 'abcd1234.default-release'))
+        self.assertEqual(catalog.get_profile_names(whatsapp_only=True), ['abcd1234.default-release'])
+
+        make_dirs(self.user_dir, 'ijkl9012.work')
+        self.write_ini(self.user_dir, [
+            '[Profile0]\nName=default-release\nIsRelative=1\nPath=abcd1234.default-release\n',
+            '[Profile1]\nName=work\nIsRelative=1\nPath=ijkl9012.work\n',
+        ])
+        touch_later(ini_path)
+        self.assertEqual(catalog.get_profile_names(), ['abcd1234.default-release', 'ijkl9012.work'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,195 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(TESTS_DIR))
+
+from WaWebSession import Browser, OfflineSessionReader, SessionCache  # noqa: E402
+
+FIXTURES_DIR = os.path.join(TESTS_DIR, 'fixtures')
+
+
+def build_session(token: str = 'token', value_length: int = 100) -> list[dict]:
+    return [
+        {'key': 'WASecretBundle', 'value': json.dumps({'key': 'k' * 44, 'encKey': 'e' * 44, 'macKey': 'm' * 44})},
+        {'key': 'WAToken1', 'value': '"%s"' % token},
+        {'key': 'padding', 'value': 'p' * value_length},
+    ]
+
+
+def session_bytes(wa_profile_obj: list[dict]) -> int:
+    # the size the cache accounts for its own copy of the session
+    cache = SessionCache()
+    cache.put(Browser.CHROME, '', (1,), wa_profile_obj)
+    return cache.get_stats()['bytes']
+
+
+class SessionCacheTest(unittest.TestCase):
+    def test_hit_and_miss(self):
+        cache = SessionCache()
+        wa_profile_obj = build_session()
+        self.assertIsNone(cache.get(Browser.CHROME, '', (1,)))
+        self.assertTrue(cache.put(Browser.CHROME, '', (1,), wa_profile_obj))
+        self.assertEqual(cache.get(Browser.CHROME, '', (1,)), wa_profile_obj)
+        # browser names and enum members address the same entry, profiles are kept apart
+        self.assertEqual(cache.get('Chrome', '', (1,)), wa_profile_obj)
+        self.assertIsNone(cache.get(Browser.CHROME, 'Profile 1', (1,)))
+        self.assertIsNone(cache.get(Browser.FIREFOX, '', (1,)))
+        self.assertEqual(cache.get_stats(), {'hits': 2, 'misses': 3, 'evictions': 0, 'entries': 1,
+                                             'bytes': session_bytes(wa_profile_obj)})
+
+    def test_copies(self):
+        cache = SessionCache()
+        wa_profile_obj = build_session()
+        cache.put(Browser.CHROME, '', (1,), wa_profile_obj)
+        wa_profile_obj[1]['value'] = '"changed"'
+        cached_obj = cache.get(Browser.CHROME, '', (1,))
+        cached_obj[1]['value'] = '"changed again"'
+        self.assertEqual(cache.get(Browser.CHROME, '', (1,)), build_session())
+
+    def test_fingerprint_change(self):
+        cache = SessionCache()
+        cache.put(Browser.CHROME, '', (1,), build_session())
+        self.assertIsNone(cache.get(Browser.CHROME, '', (2,)))
+        # the outdated entry is dropped, so going back to the old fingerprint can't return it either
+        self.assertIsNone(cache.get(Browser.CHROME, '', (1,)))
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.get_stats()['bytes'], 0)
+
+    def test_unknown_fingerprint(self):
+        cache = SessionCache()
+        self.assertFalse(cache.put(Browser.CHROME, '', None, build_session()))
+        self.assertEqual(len(cache), 0)
+        cache.put(Browser.CHROME, '', (1,), build_session())
+        self.assertIsNone(cache.get(Browser.CHROME, '', None))
+        self.assertEqual(len(cache), 0)
+
+    def test_ttl(self):
+        cache = SessionCache(ttl=60)
+        now = time.monotonic()
+        with mock.patch.object(time, 'monotonic', return_value=now):
+            cache.put(Browser.CHROME, '', (1,), build_session())
+        with mock.patch.object(time, 'monotonic', return_value=now + 59):
+            self.assertIsNotNone(cache.get(Browser.CHROME, '', (1,)))
+        with mock.patch.object(time, 'monotonic', return_value=now + 61):
+            self.assertIsNone(cache.get(Browser.CHROME, '', (1,)))
+        self.assertEqual(len(cache), 0)
+
+        cache = SessionCache(ttl=None)
+        cache.put(Browser.CHROME, '', (1,), build_session())
+        with mock.patch.object(time, 'monotonic', return_value=now + 10 ** 9):
+            self.assertIsNotNone(cache.get(Browser.CHROME, '', (1,)))
+
+    def test_lru_eviction(self):
+        entry_bytes = session_bytes(build_session())
+        cache = SessionCache(max_bytes=entry_bytes * 5 // 2)
+        cache.put(Browser.CHROME, 'first', (1,), build_session())
+        cache.put(Browser.CHROME, 'second', (1,), build_session())
+        # using the first profile makes the second one the least recently used
+        self.assertIsNotNone(cache.get(Browser.CHROME, 'first', (1,)))
+        cache.put(Browser.CHROME, 'third', (1,), build_session())
+        self.assertIsNone(cache.get(Browser.CHROME, 'second', (1,)))
+        self.assertIsNotNone(cache.get(Browser.CHROME, 'first', (1,)))
+        self.assertIsNotNone(cache.get(Browser.CHROME, 'third', (1,)))
+        stats = cache.get_stats()
+        self.assertEqual((stats['evictions'], stats['entries'], stats['bytes']), (1, 2, entry_bytes * 2))
+
+    def test_replace_and_oversized_entries(self):
+        entry_bytes = session_bytes(build_session())
+        cache = SessionCache(max_bytes=entry_bytes * 3 // 2)
+        cache.put(Browser.CHROME, '', (1,), build_session())
+        # replacing an entry frees its own space first instead of evicting it
+        self.assertTrue(cache.put(Browser.CHROME, '', (2,), build_session('new')))
+        self.assertEqual(cache.get(Browser.CHROME, '', (2,)), build_session('new'))
+        self.assertEqual(cache.get_stats()['evictions'], 0)
+
+        # a session bigger than the whole cache is not stored and removes the older version
+        self.assertFalse(cache.put(Browser.CHROME, '', (3,), build_session(value_length=entry_bytes * 2)))
+        self.assertEqual(cache.get_stats()['bytes'], 0)
+
+    def test_invalidate(self):
+        cache = SessionCache()
+        for browser, profile_name in ((Browser.CHROME, ''), (Browser.CHROME, 'Profile 1'), (Browser.FIREFOX, '')):
+            cache.put(browser, profile_name, (1,), build_session())
+        self.assertEqual(cache.invalidate(Browser.CHROME, 'Profile 1'), 1)
+        self.assertEqual(cache.invalidate(profile_name=''), 2)
+        self.assertEqual(cache.get_stats()['bytes'], 0)
+        cache.put(Browser.FIREFOX, 'a', (1,), build_session())
+        cache.put(Browser.FIREFOX, 'b', (1,), build_session())
+        self.assertEqual(cache.invalidate('firefox'), 2)
+        cache.put(Browser.FIREFOX, 'a', (1,), build_session())
+        self.assertEqual(cache.invalidate(), 1)
+        self.assertEqual(len(cache), 0)
+
+    def test_invalid_arguments(self):
+        for kwargs in ({'ttl': 0}, {'ttl': -1}, {'max_bytes': 0}, {'max_bytes': 1.5}):
+            with self.subTest(**kwargs):
+                with self.assertRaises(ValueError):
+                    SessionCache(**kwargs)
+
+
+class SessionCacheFingerprintTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp(prefix='wawebsession-test-')
+        self.profile_dirs = {}
+        for browser, fixture_name in ((Browser.CHROME, 'chrome_profile'), (Browser.FIREFOX, 'firefox_profile')):
+            self.profile_dirs[browser] = os.path.join(self.tmp_dir, fixture_name)
+            shutil.copytree(os.path.join(FIXTURES_DIR, fixture_name), self.profile_dirs[browser])
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def get_idb_file(self, browser: Browser) -> str:
+        if browser == Browser.CHROME:
+            return os.path.join(OfflineSessionReader.find_chrome_idb_dir(self.profile_dirs[browser]), '000006.log')
+        return OfflineSessionReader.find_firefox_idb_files(self.profile_dirs[browser])[-1]
+
+    def cache_profile(self, cache: SessionCache, browser: Browser) -> list[dict]:
+        wa_profile_obj = OfflineSessionReader.read_profile(browser, self.profile_dirs[browser])
+        self.assertTrue(cache.put(browser, '', OfflineSessionReader.get_idb_fingerprint(
+            browser, self.profile_dirs[browser]), wa_profile_obj))
+        return wa_profile_obj
+
+    def cached_profile(self, cache: SessionCache, browser: Browser) -> list[dict]:
+        return cache.get(browser, '', OfflineSessionReader.get_idb_fingerprint(browser, self.profile_dirs[browser]))
+
+    def test_mtime_change(self):
+        for browser in (Browser.CHROME, Browser.FIREFOX):
+            with self.subTest(browser=browser):
+                cache = SessionCache()
+                wa_profile_obj = self.cache_profile(cache, browser)
+                self.assertEqual(self.cached_profile(cache, browser), wa_profile_obj)
+
+                file_stat = os.stat(self.get_idb_file(browser))
+                os.utime(self.get_idb_file(browser), ns=(file_stat.st_atime_ns, file_stat.st_mtime_ns + 10 ** 9))
+                self.assertIsNone(self.cached_profile(cache, browser))
+
+    def test_size_change(self):
+        for browser in (Browser.CHROME, Browser.FIREFOX):
+            with self.subTest(browser=browser):
+                cache = SessionCache()
+                self.cache_profile(cache, browser)
+                # keep the mtime, so only the size tells the files apart
+                idb_file = self.get_idb_file(browser)
+                file_stat = os.stat(idb_file)
+                with open(idb_file, 'ab') as file:
+                    file.write(b'\x00')
+                os.utime(idb_file, ns=(file_stat.st_atime_ns, file_stat.st_mtime_ns))
+                self.assertIsNone(self.cached_profile(cache, browser))
+
+    def test_new_file(self):
+        cache = SessionCache()
+        self.cache_profile(cache, Browser.FIREFOX)
+        # a write-ahead log next to the database is part of the fingerprint
+        open(self.get_idb_file(Browser.FIREFOX) + '-wal', 'wb').close()
+        self.assertIsNone(self.cached_profile(cache, Browser.FIREFOX))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(TESTS_DIR))
+
+import WaWebSession  # noqa: E402
+from WaWebSession import SessionFileFormat, SessionHandler  # noqa: E402
+
+COMPRESSIONS = (None, 'zlib', 'lzma')
+
+
+def build_session(key_count: int = 50) -> list[dict]:
+    wa_profile_obj = [
+        {'key': 'WASecretBundle', 'value': json.dumps({'key': 'k' * 44, 'encKey': 'e' * 44, 'macKey': 'm' * 44})},
+        {'key': 'last-wid-md', 'value': '"491700000000:1@c.us"'},
+        {'key': 'unicode', 'value': 'Grüße ✓ 😀'},
+        {'key': 'empty', 'value': ''},
+        # values that are no strings and records that don't look like IDB user objects are kept as they are
+        {'key': 'storage-version', 'value': 5},
+        {'key': 'nested', 'value': {'list': [1, None, True]}},
+        {'key': 'extra', 'value': 'x', 'version': 2},
+    ]
+    for i in range(key_count):
+        wa_profile_obj.append({'key': 'key-%05d' % i, 'value': ('value-%05d' % i) * (i % 40)})
+    return wa_profile_obj
+
+
+class CompactSessionFileTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp(prefix='wawebsession-test-')
+        self.file_path = os.path.join(self.tmp_dir, 'session')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def write_compact(self, wa_profile_obj: list[dict], compression) -> bytes:
+        SessionHandler.write_profile_file(wa_profile_obj, self.file_path, SessionFileFormat.COMPACT, compression)
+        with open(self.file_path, 'rb') as file:
+            return file.read()
+
+    def write_raw(self, data: bytes) -> None:
+        with open(self.file_path, 'wb') as file:
+            file.write(data)
+
+    def test_round_trip(self):
+        for compression in COMPRESSIONS:
+            for wa_profile_obj in (build_session(), build_session(0), build_session(3000), []):
+                with self.subTest(compression=compression, records=len(wa_profile_obj)):
+                    self.write_compact(wa_profile_obj, compression)
+                    self.assertEqual(SessionHandler.load_profile(self.file_path), wa_profile_obj)
+                    self.assertEqual(list(SessionHandler.iter_profile_file(self.file_path)), wa_profile_obj)
+                    self.assertEqual(SessionHandler.get_profile_file_format(self.file_path),
+                                     (SessionFileFormat.COMPACT, compression))
+
+    def test_session_object(self):
+        wa_profile_obj = build_session()
+        SessionHandler.write_profile_file(WaWebSession.SessionObject(wa_profile_obj), self.file_path,
+                                          SessionFileFormat.COMPACT, 'zlib')
+        self.assertEqual(SessionHandler.load_profile(self.file_path), wa_profile_obj)
+
+    def test_compression_reduces_size(self):
+        wa_profile_obj = build_session(2000)
+        uncompressed_size = len(self.write_compact(wa_profile_obj, None))
+        for compression in ('zlib', 'lzma'):
+            with self.subTest(compression=compression):
+                self.assertLess(len(self.write_compact(wa_profile_obj, compression)), uncompressed_size)
+
+    def test_convert_json_round_trip(self):
+        wa_profile_obj = build_session()
+        json_path = os.path.join(self.tmp_dir, 'session.json')
+        SessionHandler.write_profile_file(wa_profile_obj, json_path)
+        for compression in COMPRESSIONS:
+            with self.subTest(compression=compression):
+                self.assertEqual(SessionHandler.convert_profile_file(json_path, self.file_path,
+                                                                     SessionFileFormat.COMPACT, compression),
+                                 len(wa_profile_obj))
+                back_path = os.path.join(self.tmp_dir, 'back.json')
+                SessionHandler.convert_profile_file(self.file_path, back_path, SessionFileFormat.JSON)
+                with open(back_path, 'r') as file:
+                    self.assertEqual(json.load(file), wa_profile_obj)
+
+    def test_truncated(self):
+        for compression in COMPRESSIONS:
+            data = self.write_compact(build_session(200), compression)
+            for length in (0, 4, 9, 10, 11, len(data) // 2, len(data) - 1):
+                with self.subTest(compression=compression, length=length):
+                    self.write_raw(data[:length])
+                    with self.assertRaises(ValueError):
+                        SessionHandler.load_profile(self.file_path)
+
+    def test_garbage_body(self):
+        for compression in COMPRESSIONS:
+            data = self.write_compact(build_session(200), compression)
+            with self.subTest(compression=compression):
+                self.write_raw(data[:10] + b'\xff\x00garbage' * 100)
+                with self.assertRaisesRegex(ValueError, 'session file'):
+                    SessionHandler.load_profile(self.file_path)
+
+    def test_unknown_header_values(self):
+        data = bytearray(self.write_compact(build_session(), None))
+        for position, value in ((4, WaWebSession._COMPACT_VERSION + 1), (5, 9)):
+            with self.subTest(position=position):
+                changed = bytearray(data)
+                changed[position] = value
+                self.write_raw(bytes(changed))
+                with self.assertRaises(ValueError):
+                    SessionHandler.load_profile(self.file_path)
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(ValueError):
+            self.write_compact(build_session(), 'gzip')
+        with self.assertRaises(ValueError):
+            SessionHandler.write_profile_file(build_session(), self.file_path, SessionFileFormat.JSON, 'zlib')
+
+    def test_multiple_profiles_rejected(self):
+        for wa_profile_obj in ({'a': build_session()}, ['a'], 'a'):
+            with self.subTest(wa_profile_obj=type(wa_profile_obj).__name__):
+                with self.assertRaises(TypeError):
+                    self.write_compact(wa_profile_obj, 'zlib')
+                self.assertFalse(os.path.exists(self.file_path))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,208 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(TESTS_DIR))
+
+import WaWebSession  # noqa: E402
+from WaWebSession import Browser, SessionFileFormat, SessionHandler, SessionStore  # noqa: E402
+
+
+def build_session(phone_number: str = None, token: str = 'token') -> list[dict]:
+    wa_profile_obj = [
+        {'key': 'WASecretBundle', 'value': json.dumps({'key': 'k' * 44, 'encKey': 'e' * 44, 'macKey': 'm' * 44})},
+        {'key': 'WAToken1', 'value': '"%s"' % token},
+    ]
+    if phone_number is not None:
+        wa_profile_obj.append({'key': 'last-wid-md', 'value': '"%s:1@c.us"' % phone_number})
+    return wa_profile_obj
+
+
+class SessionStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.store_dir = tempfile.mkdtemp(prefix='wawebsession-test-')
+        self.index_path = os.path.join(self.store_dir, 'index.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.store_dir)
+
+    def open_store(self, file_format: SessionFileFormat = SessionFileFormat.COMPACT) -> SessionStore:
+        return SessionStore(self.store_dir, file_format)
+
+    def read_index(self) -> dict:
+        with open(self.index_path, 'r') as file:
+            return json.load(file)
+
+    def test_empty_store(self):
+        store = self.open_store()
+        self.assertEqual(len(store), 0)
+        self.assertEqual(self.read_index(), {'version': 1, 'entries': {}})
+
+    def test_save_and_load(self):
+        for file_format in SessionFileFormat:
+            with self.subTest(file_format=file_format):
+                store = self.open_store(file_format)
+                wa_profile_obj = build_session('491700000000')
+                entry_id = store.save(wa_profile_obj, Browser.CHROME, 'Default')
+                self.assertEqual(store.load(entry_id), wa_profile_obj)
+                self.assertEqual(SessionHandler.get_profile_file_format(store.get_file_path(entry_id))[0],
+                                 file_format)
+                entry = store.get_entry(entry_id)
+                self.assertEqual((entry['account_id'], entry['browser'], entry['profile'], entry['records']),
+                                 ('491700000000@c.us', 'chrome', 'Default', len(wa_profile_obj)))
+                self.assertIsNone(entry['refreshed_at'])
+                store.remove(entry_id)
+
+    def test_find_by_account(self):
+        store = self.open_store()
+        entry_id = store.save(build_session('491700000000', 'first'))
+        saved_at = store.get_entry(entry_id)['saved_at']
+        store.save(build_session('491711111111'))
+
+        # a newer session of the same account replaces the stored one
+        self.assertEqual(store.save(build_session('491700000000', 'second')), entry_id)
+        self.assertEqual(len(store), 2)
+        entry = store.find_by_account('491700000000@c.us')
+        self.assertEqual(entry['id'], entry_id)
+        self.assertEqual(entry['saved_at'], saved_at)
+        self.assertIsNotNone(entry['refreshed_at'])
+        self.assertEqual(store.load(entry_id), build_session('491700000000', 'second'))
+        self.assertIsNone(store.find_by_account('491722222222@c.us'))
+
+    def test_find_by_hash(self):
+        store = self.open_store()
+        wa_profile_obj = build_session()
+        entry_id = store.save(wa_profile_obj)
+        self.assertIsNone(store.get_entry(entry_id)['account_id'])
+        self.assertEqual(store.find_by_hash(SessionHandler.get_content_hash(wa_profile_obj))['id'], entry_id)
+        # sessions without an account id are only matched by their content
+        self.assertEqual(store.save(wa_profile_obj), entry_id)
+        self.assertNotEqual(store.save(build_session(token='other')), entry_id)
+        self.assertEqual(len(store), 2)
+
+    def test_index_lookup_after_reopen(self):
+        store = self.open_store()
+        entry_id = store.save(build_session('491700000000'), 'firefox', 'default-release')
+        self.assertEqual(list(self.read_index()['entries']), [entry_id])
+
+        reopened_store = self.open_store()
+        self.assertEqual(reopened_store.rebuild_index(), 0)
+        self.assertEqual(reopened_store.list_entries(), store.list_entries())
+        self.assertEqual(reopened_store.find_by_account('491700000000@c.us')['profile'], 'default-release')
+
+    def test_unreadable_index_is_rebuilt(self):
+        store = self.open_store()
+        entry_id = store.save(build_session('491700000000'))
+        for index_data in ('{"version": 1, "entries": ', '{"version": 99, "entries": {}}'):
+            with self.subTest(index_data=index_data):
+                with open(self.index_path, 'w') as file:
+                    file.write(index_data)
+                with self.assertLogs('WaWebSession:SessionStore', 'DEBUG'):
+                    reopened_store = self.open_store()
+                self.assertEqual(reopened_store.find_by_account('491700000000@c.us')['id'], entry_id)
+                self.assertEqual(list(self.read_index()['entries']), [entry_id])
+
+    def test_atomic_save(self):
+        store = self.open_store()
+        wa_profile_obj = build_session('491700000000', 'first')
+        entry_id = store.save(wa_profile_obj)
+        file_path = store.get_file_path(entry_id)
+        with open(file_path, 'rb') as file:
+            file_data = file.read()
+
+        def failing_write(wa_profile_obj, file_path, *args):
+            with open(file_path, 'w') as file:
+                file.write('partial')
+            raise OSError('disk full')
+
+        with mock.patch.object(SessionHandler, 'write_profile_file', failing_write):
+            with self.assertRaises(OSError):
+                store.save(build_session('491700000000', 'second'))
+
+        # the stored file and the index are unchanged and no temporary file is left behind
+        with open(file_path, 'rb') as file:
+            self.assertEqual(file.read(), file_data)
+        self.assertEqual(store.load(entry_id), wa_profile_obj)
+        self.assertEqual(sorted(os.listdir(self.store_dir)), sorted(['index.json', entry_id + '.wasession']))
+
+    def test_save_removes_stale_delta(self):
+        store = self.open_store(SessionFileFormat.JSON)
+        entry_id = store.save(build_session('491700000000', 'first'))
+        delta_path = store.get_file_path(entry_id) + WaWebSession._DELTA_SUFFIX
+        with open(delta_path, 'w') as file:
+            file.write('{}\n')
+        store.save(build_session('491700000000', 'second'))
+        self.assertFalse(os.path.exists(delta_path))
+
+    def test_rebuild_skips_corrupt_files(self):
+        store = self.open_store()
+        entry_id = store.save(build_session('491700000000'))
+        with open(os.path.join(self.store_dir, 'garbage.wasession'), 'wb') as file:
+            file.write(b'WAWS\x01\x01\xff\x00garbage')
+        # a valid JSON file that holds a whole profile dict instead of a single session
+        SessionHandler.write_profile_file({'Default': build_session()},
+                                          os.path.join(self.store_dir, 'profiles.wasession'))
+        with open(os.path.join(self.store_dir, 'notes.txt'), 'w') as file:
+            file.write('not a session')
+
+        with self.assertLogs('WaWebSession:SessionStore', 'WARNING') as logs:
+            self.assertEqual(store.rebuild_index(), 0)
+        self.assertEqual(len(logs.records), 2)
+        self.assertEqual([entry['id'] for entry in store.list_entries()], [entry_id])
+
+        with self.assertLogs('WaWebSession:SessionStore', 'WARNING'):
+            reopened_store = self.open_store()
+        self.assertEqual([entry['id'] for entry in reopened_store.list_entries()], [entry_id])
+
+    def test_rebuild_picks_up_external_changes(self):
+        store = self.open_store()
+        removed_id = store.save(build_session('491700000000'))
+        kept_id = store.save(build_session('491711111111'))
+        os.remove(store.get_file_path(removed_id))
+        SessionHandler.write_profile_file(build_session('491722222222'),
+                                          os.path.join(self.store_dir, 'copied.wasession'))
+
+        self.assertEqual(store.rebuild_index(), 2)
+        self.assertEqual(sorted(entry['id'] for entry in store.list_entries()), sorted([kept_id, 'copied']))
+        self.assertIsNone(store.find_by_account('491700000000@c.us'))
+        self.assertEqual(store.find_by_account('491722222222@c.us')['id'], 'copied')
+        self.assertEqual(sorted(self.read_index()['entries']), sorted([kept_id, 'copied']))
+
+    def test_remove(self):
+        store = self.open_store()
+        entry_id = store.save(build_session('491700000000'))
+        file_path = store.get_file_path(entry_id)
+        store.remove(entry_id)
+        self.assertFalse(os.path.exists(file_path))
+        self.assertEqual(self.read_index()['entries'], {})
+        for method in (store.load, store.remove, store.get_file_path, store.mark_refreshed):
+            with self.subTest(method=method.__name__):
+                with self.assertRaises(KeyError):
+                    method(entry_id)
+
+    def test_find_older_than(self):
+        store = self.open_store()
+        entry_id = store.save(build_session('491700000000'))
+        self.assertEqual(store.find_older_than(1), [])
+        with mock.patch.object(time, 'time', return_value=time.time() + 2 * 86400):
+            self.assertEqual([entry['id'] for entry in store.find_older_than(1)], [entry_id])
+            store.mark_refreshed(entry_id)
+            self.assertEqual(store.find_older_than(1), [])
+            self.assertEqual(len(store.find_older_than(1, use_refreshed_at=False)), 1)
+
+    def test_invalid_session(self):
+        store = self.open_store()
+        with self.assertRaises(TypeError):
+            store.save([{'key': 'WAToken1', 'value': '"token"'}])
+        self.assertEqual(store.save_all({'Default': build_session('491700000000'), 'Empty': []}, Browser.CHROME),
+                         [store.find_by_account('491700000000@c.us')['id']])
+
+
+if __name__ == '__main__':
+    unittest.main()